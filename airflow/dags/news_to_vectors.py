@@ -1,5 +1,6 @@
 # Using the raw News Articles, extract news summary, Named Entities, and
 # sentence-piece vectors to be saved in chromadb
+import sys
 import pendulum
 from pathlib import Path
 from chromadb import HttpClient
@@ -7,7 +8,6 @@ from airflow import DAG
 from airflow.models import Variable
 from airflow.operators.empty import EmptyOperator
 from airflow.operators.python import PythonOperator
-from airflow.operators.python import get_current_context
 
 
 def check_document_count():
@@ -22,45 +22,33 @@ def check_document_count():
     Variable.set(key='vectordb-document-count', value=(previous_count + added_document_count))
 
 
-def execute_notebook():
-    import papermill as pm
+def enrich_articles():
+    sys.path.append(str(Path(__file__).parents[1]))
+    from enrichment.worker import EnrichmentWorker
 
-    pm.execute_notebook(
-        input_path=Path.joinpath(Path(__file__).parents[1], "notebooks/News Summary.ipynb"),
-        output_path=Path.joinpath(Path(__file__).parents[1], "notebooks/News-Summary-Executed.ipynb"),
-        parameters={"batch_date": {'$gte': start_date_str, '$lte': end_date_str}}
-    )
+    # enrich the articles stored since the last checkpoint of the change feed rather than the data interval
+    EnrichmentWorker().run(follow=False)
 
 
 with DAG(
         dag_id="news-summary",
         description='Summarize news articles and extract named entities for use in RAG',
         start_date=pendulum.datetime(2024, 5, 28),
-        catchup=True,
-        schedule_interval='@daily'
+        catchup=False,
+        max_active_runs=1,
+        schedule_interval='*/15 * * * *'
 ) as dag:
     """
     Summarize news article, extract named entities, and vectorize the text to be saved into chromadb.
-    This is done by running a jupyter notebook `News Summary.ipnb` located in ../notebooks using Papermill
-    https://papermill.readthedocs.io/en/latest/
+    This is done by draining the enrichment change feed through the batched stages of ../enrichment
     :return:
     """
 
-    context = get_current_context()
-    start_date_str = str(context['data_interval_start'])
-    end_date_str = str(context['data_interval_end'])
-
     start = EmptyOperator(task_id='start')
 
-    # execute_notebook = PapermillOperator(
-    #     task_id="run_summarize_notebook",
-    #     input_nb=Path.joinpath(Path(__file__).parents[2], "notebooks/News Summary.ipynb"),
-    #     parameters={"batch_date": {'$gte': start_date_str, '$lte': end_date_str}},
-    # )
-
-    execute_notebook = PythonOperator(
-        task_id='run_summarize_notebook',
-        python_callable=execute_notebook
+    enrich = PythonOperator(
+        task_id='enrich_articles',
+        python_callable=enrich_articles
     )
 
     document_count_qa = PythonOperator(
@@ -70,4 +58,4 @@ with DAG(
 
     end = EmptyOperator(task_id='end')
 
-    start >> execute_notebook >> document_count_qa >> end
+    start >> enrich >> document_count_qa >> end
@@ -1,9 +1,11 @@
+import json
 import logging
-import asyncio
+from typing import AsyncIterator
 from util.chat_util import LLMUtil
 from fastapi import APIRouter, WebSocket
 from fastapi import Request, HTTPException, Path
 from fastapi.responses import StreamingResponse
+from langchain_core.documents import Document
 from langchain_core.runnables.history import RunnableWithMessageHistory
 
 logging.basicConfig(level=logging.INFO)
@@ -27,17 +29,46 @@ def init_llm():
     rag_llm = LLMUtil.init_llm()
 
 
+def sources(documents: list[Document]) -> list[dict]:
+    """
+    Description of the documents an answer is generated from
+    :param documents: retrieved documents
+    :return: list of dicts with the id, source, publication date and summary of an article
+    """
+    return [{'id': document.metadata.get('parent_id') or document.metadata.get('id'),
+             'source': document.metadata.get('source'),
+             'publication_date': document.metadata.get('publication_date'),
+             'summary': document.metadata.get('summary')} for document in documents]
+
+
+async def stream_answer(message: str, session_id: str) -> AsyncIterator[dict]:
+    """
+    Streams the answer to a chat message as events: the `sources` of the answer once retrieved, then every
+    `token` as the LLM generates it
+    :param message: user question
+    :param session_id: chat session
+    :return: async iterator of dicts with a `type` of sources or token
+    """
+    async for chunk in rag_llm.astream({"input": message}, config={"configurable": {"session_id": session_id}}):
+        if 'context' in chunk:
+            yield {'type': 'sources', 'sources': sources(chunk['context'])}
+        if chunk.get('answer'):
+            yield {'type': 'token', 'text': chunk['answer']}
+
+
 @router.websocket('/{session_id}')
 async def chat(websocket: WebSocket, session_id: str):
+    """
+    Chat over a websocket. Every message gets its answer as JSON events: `sources`, `token`s, then `end`
+    """
     await websocket.accept()
 
     try:
         while True:
             message = await websocket.receive_text()
-            chat_response = rag_llm.invoke(
-                {"input": message},
-                config={"configurable": {"session_id": session_id}})
-            await websocket.send_text(chat_response['answer'])
+            async for event in stream_answer(message, session_id):
+                await websocket.send_json(event)
+            await websocket.send_json({'type': 'end'})
     except Exception as e:
         logger.info(f"WebSocket connection closed: {e}")
 
@@ -47,22 +78,22 @@ async def http_chat(
         request: Request,
         session_id: str = Path(..., description='The session ID')
 ):
+    """
+    Chat over server-sent events: a `sources` event, then the tokens of the answer as JSON strings, then [END]
+    """
     data = await request.json()
     message = data.get("message")
 
     if not message:
         return HTTPException(status_code=400, detail='No input message received.')
 
-    chat_response = rag_llm.invoke(
-        {"input": message},
-        config={"configurable": {"session_id": session_id}})
-
-    chat_answer = ' '.join(chat_response['answer'].split('\n\n'))
-
     async def stream_response():
-        for word in chat_answer.split():
-            yield f"data: {word}\n\n"
-            await asyncio.sleep(0.05)
+        async for event in stream_answer(message, session_id):
+            if event['type'] == 'sources':
+                yield f"event: sources\ndata: {json.dumps(event['sources'])}\n\n"
+            else:
+                # JSON keeps the newlines of a token from ending the event
+                yield f"data: {json.dumps(event['text'])}\n\n"
         yield "data: [END]\n\n"
 
     return StreamingResponse(stream_response(), media_type="text/event-stream")
@@ -0,0 +1,64 @@
+# Throughput of the article text extraction over the saved outlet fixtures, in articles/sec.
+#   legacy     - `p::text` fragments through a scrapy selector, joined later as the summary notebook did
+#   spider     - full paragraph texts through a scrapy selector and the outlet ArticleExtractor
+#   soup       - single pass of the configured HTML backend and the outlet ArticleExtractor
+#   extractor  - the ArticleExtractor alone, on paragraphs extracted beforehand
+#
+#   python -m benchmarks.article_extraction --repeat 50
+import time
+import argparse
+from pathlib import Path
+from scrapy import Selector
+from config import config
+from scraper.parsers import get_backend
+from scraper.spiders.base import SpidersEnum
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+OUTLETS = {
+    'cnn': ('https://edition.cnn.com/politics/', SpidersEnum.CNNSpider),
+    'foxnews': ('https://www.foxnews.com/politics/', SpidersEnum.FoxNewsSpider),
+    'npr': ('https://www.npr.org/sections/politics/', SpidersEnum.NPRNewsSpider),
+    'politico': ('https://www.politico.com/', SpidersEnum.PoliticoSpider),
+}
+
+
+def legacy_extract(html):
+    fragments = Selector(text=html).css('p::text').getall()
+    return ''.join(fragment.strip() for fragment in fragments).replace('\xa0', ' ')
+
+
+def measure(extract, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        extract()
+    return repeat / (time.perf_counter() - started)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the article text extraction')
+    arg_parser.add_argument('--repeat', type=int, default=50, help='extractions per outlet and method')
+    args = arg_parser.parse_args()
+
+    backend = get_backend(config.HTML_PARSER_BACKEND)
+    print(f"soup backend: {backend.name}")
+    print(f"{'outlet':<10}{'method':<12}{'articles/s':>12}{'chars':>10}")
+
+    for outlet, (url, spider) in OUTLETS.items():
+        html = (FIXTURES / f'{outlet}.html').read_text(encoding='utf-8')
+        extractor = spider.extractor
+        paragraphs = backend.parse(html, url).paragraphs
+
+        methods = {
+            'legacy': lambda: legacy_extract(html),
+            'spider': lambda: extractor.extract(node.text_content() for node in Selector(text=html).root.iter('p')),
+            'soup': lambda: extractor.extract(backend.parse(html, url).paragraphs),
+            'extractor': lambda: extractor.extract(paragraphs),
+        }
+        for name, extract in methods.items():
+            rate = measure(extract, args.repeat)
+            print(f"{outlet:<10}{name:<12}{rate:>12.1f}{len(extract()):>10}")
+
+
+if __name__ == '__main__':
+    main()
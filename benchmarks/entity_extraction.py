@@ -0,0 +1,61 @@
+# Throughput of the named entity extraction over the saved outlet fixtures, in docs/sec.
+#   legacy     - the notebook path: the spaCy model loaded for every article and its full pipeline run
+#   resident   - EntityStage in a single process: model loaded once, parser and lemmatizer disabled, nlp.pipe
+#   processes  - EntityStage over a resident pool of --processes processes
+#
+#   python -m benchmarks.entity_extraction --copies 50 --processes 4
+import os
+import time
+import argparse
+from pathlib import Path
+from config import config
+from scraper.parsers import get_backend
+from enrichment.stages import EntityStage
+from util.entities import postprocess_entities
+from benchmarks.article_extraction import OUTLETS
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+def legacy_entities(model_name, texts):
+    import spacy
+
+    for text in texts:
+        nlp = spacy.load(model_name)
+        postprocess_entities([(ent.text, ent.label_) for ent in nlp(text).ents])
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the named entity extraction')
+    arg_parser.add_argument('--copies', type=int, default=50, help='copies of every outlet fixture')
+    arg_parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='processes of the pool')
+    arg_parser.add_argument('--legacy-docs', type=int, default=8, help='docs run through the legacy path')
+    args = arg_parser.parse_args()
+
+    backend = get_backend(config.HTML_PARSER_BACKEND)
+    texts = []
+    for outlet, (url, spider) in OUTLETS.items():
+        html = (FIXTURES / f'{outlet}.html').read_text(encoding='utf-8')
+        texts += [spider.extractor.extract(backend.parse(html, url).paragraphs)] * args.copies
+
+    print(f"model: {config.ENRICHMENT_NER_MODEL}, {len(texts)} docs")
+    print(f"{'method':<12}{'docs/s':>10}{'load s':>10}")
+
+    started = time.perf_counter()
+    legacy_entities(config.ENRICHMENT_NER_MODEL, texts[:args.legacy_docs])
+    print(f"{'legacy':<12}{args.legacy_docs / (time.perf_counter() - started):>10.1f}{'-':>10}")
+
+    for name, n_process in (('resident', 1), ('processes', args.processes)):
+        stage = EntityStage(n_process=n_process)
+        started = time.perf_counter()
+        stage.load()
+        loaded = time.perf_counter() - started
+
+        started = time.perf_counter()
+        stage.entities(texts)
+        print(f"{name:<12}{len(texts) / (time.perf_counter() - started):>10.1f}{loaded:>10.1f}")
+        stage.close()
+
+
+if __name__ == '__main__':
+    main()
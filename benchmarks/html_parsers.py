@@ -0,0 +1,65 @@
+# Micro-benchmark of the HTML extraction backends over the saved outlet fixtures. `legacy` is the
+# previous approach: two full BeautifulSoup html.parser trees, one for the links and one for the article.
+#
+#   python -m benchmarks.html_parsers --repeat 20
+import time
+import argparse
+from pathlib import Path
+from bs4 import BeautifulSoup
+from scraper.parsers import BACKENDS, get_backend
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+# timestamp selector and attribute of each outlet
+OUTLETS = {
+    'cnn': ('https://edition.cnn.com/politics/', 'div.timestamp', None),
+    'foxnews': ('https://www.foxnews.com/politics/', 'span.article-date time', None),
+    'npr': ('https://www.npr.org/sections/politics/', 'time', 'datetime'),
+    'politico': ('https://www.politico.com/', 'time', 'datetime'),
+}
+
+
+def legacy_parse(html, url):
+    links = [a['href'] for a in BeautifulSoup(html, 'html.parser').find_all('a', href=True)]
+    soup = BeautifulSoup(html, 'html.parser')
+    return soup.title, [p.text for p in soup.find_all('p')], soup.find('div', class_='timestamp'), links
+
+
+def measure(parse, html, url, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        parse(html, url)
+    return repeat / (time.perf_counter() - started)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the HTML extraction backends')
+    arg_parser.add_argument('--repeat', type=int, default=20, help='parses per outlet and backend')
+    args = arg_parser.parse_args()
+
+    backends = []
+    for name in BACKENDS:
+        try:
+            get_backend(name)
+            backends.append(name)
+        except ValueError:
+            print(f"skipping '{name}', it is not installed")
+
+    print(f"{'outlet':<10}{'backend':<12}{'pages/s':>10}{'speedup':>10}")
+    for outlet, (url, timestamp_selector, timestamp_attribute) in OUTLETS.items():
+        html = (FIXTURES / f'{outlet}.html').read_text(encoding='utf-8')
+
+        baseline = measure(legacy_parse, html, url, args.repeat)
+        print(f"{outlet:<10}{'legacy':<12}{baseline:>10.1f}{1:>9.1f}x")
+
+        for name in backends:
+            backend = get_backend(name, timestamp_selector, timestamp_attribute)
+            page = backend.parse(html, url)
+            assert page.paragraphs and page.links and page.timestamp, f'{name} failed to extract {outlet}'
+
+            rate = measure(backend.parse, html, url, args.repeat)
+            print(f"{outlet:<10}{name:<12}{rate:>10.1f}{rate / baseline:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
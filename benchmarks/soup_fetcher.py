@@ -0,0 +1,78 @@
+# Compare the serial `requests.get` + sleep loop the soup crawlers used to run with the asyncio
+# AsyncFetcher, against a local HTTP server that adds a fixed latency to every response.
+#
+#   python -m benchmarks.soup_fetcher --urls 200 --latency 0.2
+import time
+import asyncio
+import argparse
+import threading
+import requests
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from scraper.soups.fetcher import AsyncFetcher
+
+ARTICLE = ('<html><head><title>Article {n}</title></head><body>'
+           + '<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>' * 60
+           + '</body></html>')
+
+
+def start_fixture_server(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            body = ARTICLE.format(n=self.path).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_serial(urls, delay):
+    started = time.perf_counter()
+    for url in urls:
+        requests.get(url, timeout=30).raise_for_status()
+        time.sleep(delay)
+    return time.perf_counter() - started
+
+
+async def run_async(urls, requests_per_second, concurrency):
+    started = time.perf_counter()
+    async with AsyncFetcher(requests_per_second=requests_per_second, burst=concurrency,
+                            concurrency_per_host=concurrency) as fetcher:
+        results = await asyncio.gather(*(fetcher.fetch(url) for url in urls))
+    assert all(content for _, content in results)
+    return time.perf_counter() - started
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the soup crawler fetchers')
+    arg_parser.add_argument('--urls', type=int, default=100)
+    arg_parser.add_argument('--latency', type=float, default=0.2, help='server latency per request in seconds')
+    arg_parser.add_argument('--serial-delay', type=float, default=0.0,
+                            help='sleep between serial requests (the crawlers used 5s)')
+    arg_parser.add_argument('--rate', type=float, default=50.0, help='token bucket requests per second')
+    arg_parser.add_argument('--concurrency', type=int, default=16)
+    args = arg_parser.parse_args()
+
+    server = start_fixture_server(args.latency)
+    urls = [f'http://127.0.0.1:{server.server_port}/article/{n}' for n in range(args.urls)]
+
+    serial = run_serial(urls, args.serial_delay)
+    concurrent = asyncio.run(run_async(urls, args.rate, args.concurrency))
+    server.shutdown()
+
+    print(f"{'fetcher':<12}{'seconds':>10}{'pages/s':>10}")
+    print(f"{'serial':<12}{serial:>10.2f}{args.urls / serial:>10.1f}")
+    print(f"{'async':<12}{concurrent:>10.2f}{args.urls / concurrent:>10.1f}")
+    print(f"speedup: {serial / concurrent:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Throughput of the article summarization over the saved outlet fixtures, in articles/sec.
+#   legacy   - the notebook path: ~1000 character chunks generated one at a time with 4 beams
+#   batched  - BartSummarizer: token chunks of all the articles generated in length-bucketed padded batches
+#
+#   python -m benchmarks.summarization --copies 4
+import time
+import argparse
+from pathlib import Path
+from config import config
+from scraper.parsers import get_backend
+from enrichment.summarizer import BartSummarizer
+from benchmarks.article_extraction import OUTLETS
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+def legacy_split(text, max_length=1000):
+    chunks, current_chunk = [], []
+    for line in text.split('.'):
+        if len('.'.join(current_chunk)) + len(line) < max_length:
+            current_chunk.append(line)
+        else:
+            chunks.append('.'.join(current_chunk))
+            current_chunk = [line]
+    if current_chunk:
+        chunks.append('.'.join(current_chunk))
+    return chunks
+
+
+def legacy_summarize(summarizer, texts):
+    tokenizer, model = summarizer._tokenizer, summarizer._model
+    for text in texts:
+        for chunk in legacy_split(text):
+            inputs = tokenizer([chunk], return_tensors='pt', truncation=True, max_length=1024)
+            model.generate(inputs.input_ids, num_beams=4, length_penalty=2.0, early_stopping=True)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the article summarization')
+    arg_parser.add_argument('--copies', type=int, default=4, help='copies of every outlet fixture in the batch')
+    args = arg_parser.parse_args()
+
+    backend = get_backend(config.HTML_PARSER_BACKEND)
+    texts = []
+    for outlet, (url, spider) in OUTLETS.items():
+        html = (FIXTURES / f'{outlet}.html').read_text(encoding='utf-8')
+        texts += [spider.extractor.extract(backend.parse(html, url).paragraphs)] * args.copies
+
+    summarizer = BartSummarizer()
+    summarizer.load()
+    chunks = sum(len(summarizer.chunk(text)) for text in texts)
+    print(f"{len(texts)} articles, {chunks} token chunks, {sum(len(legacy_split(t)) for t in texts)} legacy chunks")
+
+    methods = {
+        'legacy': lambda: legacy_summarize(summarizer, texts),
+        'batched': lambda: summarizer.summarize(texts),
+    }
+    print(f"{'method':<10}{'articles/s':>12}{'seconds':>10}")
+    for name, summarize in methods.items():
+        started = time.perf_counter()
+        summarize()
+        elapsed = time.perf_counter() - started
+        print(f"{name:<10}{len(texts) / elapsed:>12.2f}{elapsed:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,30 @@ REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
 REDIS_URL = os.getenv("REDIS_URL")
 REDIS_PORT = os.getenv("REDIS_PORT")
 
+# Visited-url Bloom filter
+VISITED_BLOOM_CAPACITY = int(os.getenv('VISITED_BLOOM_CAPACITY') or 1_000_000)
+VISITED_BLOOM_ERROR_RATE = float(os.getenv('VISITED_BLOOM_ERROR_RATE') or 0.001)
+VISITED_BLOOM_MAX_BYTES = int(os.getenv('VISITED_BLOOM_MAX_BYTES') or 4 * 1024 * 1024)
+VISITED_BLOOM_SYNC_INTERVAL = int(os.getenv('VISITED_BLOOM_SYNC_INTERVAL') or 600)
+
+# BeautifulSoup crawlers
+SOUP_REQUESTS_PER_SECOND = float(os.getenv('SOUP_REQUESTS_PER_SECOND') or 2)
+SOUP_CONCURRENCY_PER_HOST = int(os.getenv('SOUP_CONCURRENCY_PER_HOST') or 4)
+SOUP_PARSE_WORKERS = int(os.getenv('SOUP_PARSE_WORKERS') or os.cpu_count() or 1)
+SOUP_MAX_URLS = int(os.getenv('SOUP_MAX_URLS') or 500)
+# HTML extraction backend: auto, selectolax, lxml or bs4
+HTML_PARSER_BACKEND = os.getenv('HTML_PARSER_BACKEND') or 'auto'
+
+# Oldest article (by the date in its url) the crawlers accept
+ARTICLE_MAX_AGE_DAYS = int(os.getenv('ARTICLE_MAX_AGE_DAYS') or 365)
+
+# Conditional GET cache shared by the spiders and the soup crawlers
+HTTP_CACHE_ENABLED = os.getenv('HTTP_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+HTTP_CACHE_DIR = os.getenv('HTTP_CACHE_DIR') or '.httpcache'
+
+# Persistent crawl frontiers of the spiders and the soup crawlers, one SQLite database per crawler
+FRONTIER_DIR = os.getenv('FRONTIER_DIR') or '.frontier'
+
 # ScrapyD Config
 SCRAPYD_SERVER = os.getenv("SCRAPYD_SERVER")
 SCRAPYD_PROJECT_NAME = 'scraper'
@@ -22,6 +46,84 @@ KAFKA_TOPIC = os.getenv('KAFKA_TOPIC')
 MONGO_URL = os.getenv('MONGO_CONNECTION_STRING')
 DB_NAME = os.getenv('DB_NAME')
 
+# Enrichment change feed over the raw news collection
+ENRICHMENT_COLLECTION = os.getenv('ENRICHMENT_COLLECTION') or 'raw-news'
+# auto (change streams when mongo runs as a replica set, else a cursor over the pending articles), changestream
+# or cursor
+ENRICHMENT_CDC_MODE = os.getenv('ENRICHMENT_CDC_MODE') or 'auto'
+ENRICHMENT_BATCH_SIZE = int(os.getenv('ENRICHMENT_BATCH_SIZE') or 32)
+# Longest an article waits for its batch to fill up, in seconds
+ENRICHMENT_MAX_WAIT = float(os.getenv('ENRICHMENT_MAX_WAIT') or 30)
+# Seconds between two polls of the pending articles when the cursor is caught up
+ENRICHMENT_POLL_INTERVAL = float(os.getenv('ENRICHMENT_POLL_INTERVAL') or 10)
+
+# Enrichment stages, models are loaded once per worker and every stage runs on whole batches
+ENRICHMENT_SUMMARY_MODEL = os.getenv('ENRICHMENT_SUMMARY_MODEL') or 'facebook/bart-large-cnn'
+ENRICHMENT_SUMMARY_BATCH_SIZE = int(os.getenv('ENRICHMENT_SUMMARY_BATCH_SIZE') or 8)
+# Summary tiers by chunk length, max_tokens:num_beams:max_length:min_length separated by commas. A chunk is
+# generated with the first tier holding its token count; the largest max_tokens caps the chunk size.
+ENRICHMENT_SUMMARY_TIERS = os.getenv('ENRICHMENT_SUMMARY_TIERS') or '256:2:64:16,512:4:100:30,1024:4:142:56'
+# hierarchical (chunk summaries are summarized again until they fit ENRICHMENT_SUMMARY_MAX_TOKENS) or concat
+ENRICHMENT_SUMMARY_MODE = os.getenv('ENRICHMENT_SUMMARY_MODE') or 'hierarchical'
+ENRICHMENT_SUMMARY_MAX_TOKENS = int(os.getenv('ENRICHMENT_SUMMARY_MAX_TOKENS') or 200)
+# Seconds chunk summaries stay cached in redis, 0 disables the cache
+ENRICHMENT_SUMMARY_CACHE_TTL = int(os.getenv('ENRICHMENT_SUMMARY_CACHE_TTL') or 30 * 24 * 3600)
+ENRICHMENT_NER_MODEL = os.getenv('ENRICHMENT_NER_MODEL') or 'en_core_web_sm'
+ENRICHMENT_NER_BATCH_SIZE = int(os.getenv('ENRICHMENT_NER_BATCH_SIZE') or 32)
+ENRICHMENT_NER_PROCESSES = int(os.getenv('ENRICHMENT_NER_PROCESSES') or os.cpu_count() or 1)
+# cpu, cuda or auto (cuda when available)
+ENRICHMENT_DEVICE = os.getenv('ENRICHMENT_DEVICE') or 'auto'
+
+# Embedding service shared by the enrichment pipeline and the chat API
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL') or 'all-MiniLM-L6-v2'
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE') or 64)
+# Longer texts are truncated to this many tokens
+EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv('EMBEDDING_MAX_SEQ_LENGTH') or 256)
+# torch or onnx; EMBEDDING_ONNX_FILE picks an export of the model repository, e.g. onnx/model_qint8_avx512.onnx
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND') or 'torch'
+EMBEDDING_ONNX_FILE = os.getenv('EMBEDDING_ONNX_FILE')
+# Entries of the in-process LRU cache, and seconds embeddings stay cached in redis (0 disables either cache)
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE') or 10_000)
+EMBEDDING_CACHE_TTL = int(os.getenv('EMBEDDING_CACHE_TTL') or 30 * 24 * 3600)
+
+# passages: articles are also indexed as overlapping passages, which the chat retriever searches before expanding
+# the best ones to their parent article or neighbouring passages; articles: one vector per article only
+VECTOR_INDEX_MODE = os.getenv('VECTOR_INDEX_MODE') or 'passages'
+PASSAGE_COLLECTION = os.getenv('PASSAGE_COLLECTION') or f'{DB_NAME}-passages'
+# Passage length, under EMBEDDING_MAX_SEQ_LENGTH so passages are embedded whole, and tokens shared by neighbours
+PASSAGE_MAX_TOKENS = int(os.getenv('PASSAGE_MAX_TOKENS') or 200)
+PASSAGE_OVERLAP_TOKENS = int(os.getenv('PASSAGE_OVERLAP_TOKENS') or 40)
+# Passages searched per question, and tokens of article text the retriever puts in the LLM context
+RETRIEVAL_PASSAGES = int(os.getenv('RETRIEVAL_PASSAGES') or 12)
+RETRIEVAL_CONTEXT_TOKENS = int(os.getenv('RETRIEVAL_CONTEXT_TOKENS') or 1500)
+# Hybrid retrieval: documents ranked by each of the dense and BM25 searches, reciprocal-rank fusion constant,
+# seconds between two checks for an ingest that the BM25 index has not picked up yet, and the entity prefilter
+RETRIEVAL_HYBRID = os.getenv('RETRIEVAL_HYBRID', 'true').lower() in ('1', 'true', 'yes')
+RETRIEVAL_CANDIDATES = int(os.getenv('RETRIEVAL_CANDIDATES') or 50)
+RETRIEVAL_RRF_K = int(os.getenv('RETRIEVAL_RRF_K') or 60)
+RETRIEVAL_BM25_REFRESH = float(os.getenv('RETRIEVAL_BM25_REFRESH') or 60)
+RETRIEVAL_ENTITY_FILTER = os.getenv('RETRIEVAL_ENTITY_FILTER', 'true').lower() in ('1', 'true', 'yes')
+# Cross-encoder reranking of RERANK_CANDIDATES retrieved documents, falling back to the retrieval order when
+# scoring takes longer than RERANK_TIME_BUDGET seconds
+RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RERANK_MODEL = os.getenv('RERANK_MODEL') or 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES') or 20)
+RERANK_MAX_LENGTH = int(os.getenv('RERANK_MAX_LENGTH') or 256)
+RERANK_BATCH_SIZE = int(os.getenv('RERANK_BATCH_SIZE') or 32)
+RERANK_TIME_BUDGET = float(os.getenv('RERANK_TIME_BUDGET') or 0.5)
+RERANK_CACHE_SIZE = int(os.getenv('RERANK_CACHE_SIZE') or 10_000)
+# Semantic cache of chat answers: cosine similarity above which two standalone questions retrieving the same
+# documents share an answer, lifetime in seconds (answers are also retired by every ingest) and LRU capacity
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD') or 0.95)
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL') or 6 * 3600)
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES') or 5000)
+# Questions of at least QUESTION_REWRITE_MIN_WORDS words with no reference to the conversation are retrieved
+# as they are instead of being rewritten by the LLM; rewrites are cached for QUESTION_REWRITE_CACHE_TTL seconds
+QUESTION_REWRITE_HEURISTIC = os.getenv('QUESTION_REWRITE_HEURISTIC', 'true').lower() in ('1', 'true', 'yes')
+QUESTION_REWRITE_MIN_WORDS = int(os.getenv('QUESTION_REWRITE_MIN_WORDS') or 4)
+QUESTION_REWRITE_CACHE_TTL = int(os.getenv('QUESTION_REWRITE_CACHE_TTL') or 24 * 3600)
+
 # Model Name
 MODEL_NAME = os.getenv('MODEL_NAME')
 
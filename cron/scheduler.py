@@ -18,12 +18,14 @@ def run_script(script_name):
 def main():
     scheduler = BlockingScheduler()
 
-    # Schedule news summary to run daily at 2:00 AM
+    # Enrich newly stored articles every 15 minutes, the change feed resumes from its last checkpoint
     scheduler.add_job(
         lambda: run_script('news_summary.py'),
-        CronTrigger.from_crontab('0 2 * * *'),
+        CronTrigger.from_crontab('*/15 * * * *'),
         id='news_summary',
-        name='Run daily news summary'
+        name='Run news summary on new articles',
+        max_instances=1,
+        coalesce=True
     )
 
     # Schedule spider to run daily at 3:00 AM
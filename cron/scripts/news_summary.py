@@ -2,7 +2,8 @@ import logging
 import os
 from dbservices.redisservice import RedisService
 from dbservices.chromaservice import ChromaService
-from datetime import datetime, timedelta
+from enrichment.worker import EnrichmentWorker
+from datetime import datetime
 
 redis_client = RedisService.get_client()
 chroma_client = ChromaService.get_client()
@@ -13,22 +14,14 @@ logger = logging.getLogger("Run News Summary")
 logging.basicConfig(level=logging.INFO)
 
 
-def execute_notebook():
-    import papermill as pm
-
+def enrich_articles():
     news_count = int(redis_client.get(redis_key)) if redis_client.get(redis_key) is not None else 0
 
-    end_date, start_date = datetime.now(), datetime.now() - timedelta(days=1)
-    end_date_str = end_date.strftime("%Y-%m-%d %H:%M:%S")
-    start_date_str = start_date.strftime("%Y-%m-%d %H:%M:%S")
-
-    logger.info(f"Started News Summary Cron {end_date}")
+    logger.info(f"Started News Summary Cron {datetime.now()}")
 
-    pm.execute_notebook(
-        input_path="/app/notebooks/News-Summary.ipynb",
-        output_path="/app/notebooks/News-Summary-Executed.ipynb",
-        parameters={"batch_date": {'$gte': start_date_str, '$lte': end_date_str}}
-    )
+    # enrich every article stored since the last checkpoint of the change feed, instead of a date window
+    stats = EnrichmentWorker().run(follow=False)
+    logger.info(f"Enriched {stats['articles']} articles in {stats['batches']} batches")
 
     updated_count = chroma_client.get_collection(os.getenv('DB_NAME')).count()
 
@@ -37,3 +30,7 @@ def execute_notebook():
 
     # update news count
     redis_client.set(redis_key, updated_count)
+
+
+if __name__ == '__main__':
+    enrich_articles()
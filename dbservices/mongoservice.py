@@ -1,7 +1,8 @@
 import logging
+from typing import Optional
 
 from config import config
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from pymongo.errors import PyMongoError
 
 logging.basicConfig(level=logging.INFO)
@@ -25,18 +26,107 @@ class MongoService:
         return cls._client, cls._mongo_db
 
     @classmethod
-    def insert_data(cls, collection_name: str, data: list[dict]) -> bool:
+    def insert_data(cls, collection_name: str, data: list[dict], ordered: bool = True) -> bool:
         """
         Inserts data into a mongo collection
         :param collection_name:
         :param data:
+        :param ordered: if False, the server keeps inserting the remaining documents when one of them fails
         :return: bool -> True if insert is successful
         """
         try:
             _, db = cls.get_client_and_db()
-            inserts = db.get_collection(collection_name).insert_many(data)
+            inserts = db.get_collection(collection_name).insert_many(data, ordered=ordered)
             cls._logger.info(f"Insert into {collection_name} successful!")
             return inserts.acknowledged
         except PyMongoError as e:
             cls._logger.error(f"Insert failed with error {e}")
             raise e
+
+    @classmethod
+    def create_index(cls, collection_name: str, keys, **kwargs) -> str:
+        """
+        Creates an index on a mongo collection if it does not exist yet
+        :param collection_name:
+        :param keys: field name or list of (field, direction) pairs
+        :param kwargs: index options e.g. unique, partialFilterExpression
+        :return: str -> name of the index
+        """
+        try:
+            _, db = cls.get_client_and_db()
+            return db.get_collection(collection_name).create_index(keys, **kwargs)
+        except PyMongoError as e:
+            cls._logger.error(f"Creating index on {collection_name} failed with error {e}")
+            raise e
+
+    @classmethod
+    def get_collection(cls, collection_name: str):
+        """
+        Returns a mongo collection, for callers that need cursors or change streams
+        :param collection_name:
+        :return: Collection
+        """
+        _, db = cls.get_client_and_db()
+        return db.get_collection(collection_name)
+
+    @classmethod
+    def find_one(cls, collection_name: str, query: dict) -> Optional[dict]:
+        """
+        Returns the first document of a mongo collection matching the query
+        :param collection_name:
+        :param query:
+        :return: dict or None
+        """
+        try:
+            return cls.get_collection(collection_name).find_one(query)
+        except PyMongoError as e:
+            cls._logger.error(f"Find on {collection_name} failed with error {e}")
+            raise e
+
+    @classmethod
+    def upsert_one(cls, collection_name: str, query: dict, values: dict) -> None:
+        """
+        Sets fields on the document matching the query, creating it if it does not exist
+        :param collection_name:
+        :param query:
+        :param values: fields to be set
+        :return: None
+        """
+        try:
+            cls.get_collection(collection_name).update_one(query, {'$set': values}, upsert=True)
+        except PyMongoError as e:
+            cls._logger.error(f"Upsert into {collection_name} failed with error {e}")
+            raise e
+
+    @classmethod
+    def update_many(cls, collection_name: str, query: dict, values: dict) -> int:
+        """
+        Sets fields on every document of a mongo collection matching the query
+        :param collection_name:
+        :param query:
+        :param values: fields to be set
+        :return: int -> number of modified documents
+        """
+        try:
+            return cls.get_collection(collection_name).update_many(query, {'$set': values}).modified_count
+        except PyMongoError as e:
+            cls._logger.error(f"Update of {collection_name} failed with error {e}")
+            raise e
+
+    @classmethod
+    def update_by_id(cls, collection_name: str, updates: dict) -> int:
+        """
+        Sets fields on many documents of a mongo collection in a single bulk write
+        :param collection_name:
+        :param updates: dict of document _id to the fields to be set on it
+        :return: int -> number of modified documents
+        """
+        if not updates:
+            return 0
+        try:
+            result = cls.get_collection(collection_name).bulk_write(
+                [UpdateOne({'_id': _id}, {'$set': values}) for _id, values in updates.items()], ordered=False)
+            return result.modified_count
+        except PyMongoError as e:
+            cls._logger.error(f"Bulk update of {collection_name} failed with error {e}")
+            raise e
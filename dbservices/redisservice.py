@@ -26,3 +26,36 @@ class RedisService:
             except Exception as e:
                 raise e
         return cls.redis_client
+
+    @classmethod
+    def are_visited(cls, redis_key: str, urls: list[str]) -> list[bool]:
+        """
+        Checks which of the urls are members of a redis set in a single round trip
+        :param redis_key: key of the redis set holding the visited urls
+        :param urls: urls to be checked
+        :return: list[bool] -> membership flags in the same order as `urls`
+        """
+        if not urls:
+            return []
+
+        client = cls.get_client()
+        try:
+            return [bool(member) for member in client.smismember(redis_key, urls)]
+        except redis.ResponseError:
+            # SMISMEMBER requires redis >= 6.2, fall back to a pipeline of SISMEMBER commands
+            pipe = client.pipeline(transaction=False)
+            for url in urls:
+                pipe.sismember(redis_key, url)
+            return [bool(member) for member in pipe.execute()]
+
+    @classmethod
+    def mark_visited(cls, redis_key: str, urls: list[str]) -> int:
+        """
+        Adds the urls to a redis set in a single round trip
+        :param redis_key: key of the redis set holding the visited urls
+        :param urls: urls to be marked
+        :return: int -> number of urls that were not already in the set
+        """
+        if not urls:
+            return 0
+        return cls.get_client().sadd(redis_key, *urls)
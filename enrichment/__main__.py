@@ -0,0 +1,3 @@
+from enrichment.worker import main
+
+main()
@@ -0,0 +1,216 @@
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+from config import config
+from dbservices.mongoservice import MongoService
+
+logging.basicConfig(level=logging.INFO)
+
+CHECKPOINT_COLLECTION = 'enrichment-checkpoints'
+
+# articles that still need enriching: linked near-duplicates reuse the enrichment of their canonical article
+PENDING = {'enriched_at': {'$exists': False}, 'duplicate_of': {'$exists': False}}
+
+# articles enriched by the notebook before the enrichment worker existed, which did not set `enriched_at`
+ENRICHED_BY_NOTEBOOK = {'enriched_at': {'$exists': False}, 'news_summary': {'$exists': True},
+                        'entities': {'$exists': True}}
+
+
+class ArticleChangeFeed:
+    """
+    Feeds newly stored news articles to the enrichment stage in batches, replacing date-window polling.
+
+    With a replica set the feed tails a MongoDB change stream of inserts; on a standalone server (or with
+    `mode='cursor'`) it polls the `PENDING` articles in `_id` order, on an index of `enriched_at`. The `_id`s
+    are set by the clients that insert the articles, so an article can commit after articles with a greater
+    `_id`: a cursor that drained its scan starts over from the lowest pending `_id` to pick it up. A change
+    stream opened without a resume token first catches up with the cursor on every article stored up to its
+    opening. A batch is handed over when it holds
+    `batch_size` articles or its oldest article has waited `max_wait` seconds.
+
+    The position of the feed (change stream resume token and last `_id`) is checkpointed in MongoDB once the
+    consumer calls `commit()` after a batch, so a restarted worker resumes from the last processed batch.
+    Articles are re-read with the `PENDING` filter right before they are handed over, so an article enriched
+    by a batch that was processed but not committed is not enriched again.
+
+    Usage:
+        feed = ArticleChangeFeed()
+        for articles in feed.batches():
+            enrich(articles)
+            feed.commit()
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, name: str = 'enrichment', collection_name: str = config.ENRICHMENT_COLLECTION,
+                 mode: str = config.ENRICHMENT_CDC_MODE, batch_size: int = config.ENRICHMENT_BATCH_SIZE,
+                 max_wait: float = config.ENRICHMENT_MAX_WAIT,
+                 poll_interval: float = config.ENRICHMENT_POLL_INTERVAL):
+        if mode not in ('auto', 'changestream', 'cursor'):
+            raise ValueError(f"Unknown change feed mode '{mode}'")
+
+        self.name = name
+        self.collection_name = collection_name
+        self.mode = mode
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.stats = {'batches': 0, 'articles': 0, 'skipped': 0, 'max_latency': 0.0}
+
+        self._checkpoint = {}
+        self._uncommitted = None
+        self._stream_opened_at = None
+
+    def batches(self, follow: bool = True) -> Iterator[list[dict]]:
+        """
+        Yield batches of articles that still need enriching, in insertion order
+        :param follow: keep waiting for new articles; when False, stop once the backlog is drained
+        :return: Iterator of lists of article documents
+        """
+        self._checkpoint = MongoService.find_one(CHECKPOINT_COLLECTION, {'_id': self.name}) or {}
+        if not self._checkpoint.get('backfilled'):
+            self._backfill()
+        collection = MongoService.get_collection(self.collection_name)
+        MongoService.create_index(self.collection_name, [('enriched_at', 1), ('_id', 1)])
+
+        stream = self._open_stream(collection) if self.mode != 'cursor' else None
+        if stream is None:
+            yield from self._cursor_batches(collection, follow)
+            return
+
+        with stream:
+            if not self._checkpoint.get('resume_token'):
+                # the stream only sees inserts from its opening on, catch up on the backlog with the cursor first.
+                # Up to the end of the opening second: articles seen by both are skipped by PENDING
+                until = self._stream_opened_at + timedelta(seconds=1)
+                yield from self._cursor_batches(collection, follow=False, until=until)
+            yield from self._stream_batches(collection, stream, follow)
+
+    def commit(self) -> None:
+        """
+        Checkpoint the position after the last yielded batch, once it has been processed
+        :return: None
+        """
+        if self._uncommitted is None:
+            return
+
+        self._checkpoint.update(self._uncommitted)
+        MongoService.upsert_one(CHECKPOINT_COLLECTION, {'_id': self.name},
+                                {**self._uncommitted, 'updated_at': datetime.now(timezone.utc)})
+        self._uncommitted = None
+
+    def _backfill(self):
+        """
+        One-off marking of the articles the notebook already enriched, so the first run does not summarize,
+        extract and embed the whole history again
+        """
+        marked = MongoService.update_many(self.collection_name, ENRICHED_BY_NOTEBOOK,
+                                          {'enriched_at': datetime.now(timezone.utc).isoformat()})
+        MongoService.upsert_one(CHECKPOINT_COLLECTION, {'_id': self.name}, {'backfilled': True})
+        self._checkpoint['backfilled'] = True
+        self.logger.info(f"Marked {marked} articles enriched by the notebook as enriched")
+
+    def _open_stream(self, collection):
+        pipeline = [{'$match': {'operationType': 'insert'}}]
+        self._stream_opened_at = datetime.now(timezone.utc)
+        try:
+            return collection.watch(pipeline, resume_after=self._checkpoint.get('resume_token'),
+                                     max_await_time_ms=1000)
+        except OperationFailure as e:
+            if self._checkpoint.get('resume_token'):
+                # the resume token fell off the oplog, start a new stream and catch up from the last _id
+                self.logger.warning(f"Unable to resume the change stream ({e}), catching up from the last _id")
+                self._checkpoint.pop('resume_token')
+                return self._open_stream(collection)
+            if self.mode == 'changestream':
+                raise e
+            # change streams need a replica set
+            self.logger.warning(f"Change stream unavailable ({e}), polling '{self.collection_name}' by _id")
+            return None
+
+    def _cursor_batches(self, collection, follow, until=None):
+        """
+        Batches of the `PENDING` articles in `_id` order, up to the `until` datetime when it is given. The scan
+        resumes after the checkpointed `last_id` and, once drained, starts over from the lowest pending `_id`
+        for the articles that committed behind it. Without `follow` it starts over once and stops when drained.
+        """
+        after = self._checkpoint.get('last_id')
+        ids, first_seen, rescanned = [], None, False
+
+        while True:
+            query = dict(PENDING)
+            if until is not None:
+                query['_id'] = {'$lt': ObjectId.from_datetime(until)}
+            if after is not None:
+                query.setdefault('_id', {})['$gt'] = after
+            if ids:
+                query.setdefault('_id', {})['$nin'] = ids
+
+            scanned = [doc['_id'] for doc in collection.find(query, {'_id': 1}).sort('_id', 1)
+                       .limit(self.batch_size - len(ids))]
+            if scanned:
+                after = scanned[-1]
+                ids += scanned
+                first_seen = first_seen or time.monotonic()
+
+            if not scanned and after is not None and (follow or not rescanned):
+                # start over from the lowest pending _id, for the articles that committed behind the scan
+                after, rescanned = None, True
+                continue
+
+            full = len(ids) >= self.batch_size
+            waited = first_seen is not None and time.monotonic() - first_seen >= self.max_wait
+            drained = not scanned
+            if ids and (full or waited or (drained and not follow)):
+                yield from self._hand_over(collection, ids, {'last_id': after})
+                ids, first_seen = [], None
+                continue
+
+            if drained:
+                if not follow:
+                    return
+                remaining = self.max_wait - (time.monotonic() - first_seen) if ids else self.poll_interval
+                time.sleep(max(0.0, min(self.poll_interval, remaining)))
+
+    def _stream_batches(self, collection, stream, follow):
+        ids, first_seen = [], None
+
+        while stream.alive:
+            try:
+                change = stream.try_next()
+            except PyMongoError as e:
+                self.logger.error(f"Change stream of '{self.collection_name}' failed: {e}")
+                raise e
+
+            if change is not None:
+                ids.append(change['documentKey']['_id'])
+                first_seen = first_seen or time.monotonic()
+
+            full = len(ids) >= self.batch_size
+            waited = first_seen is not None and time.monotonic() - first_seen >= self.max_wait
+            if ids and (full or waited or (change is None and not follow)):
+                position = {'resume_token': stream.resume_token, 'last_id': ids[-1]}
+                yield from self._hand_over(collection, ids, position)
+                ids, first_seen = [], None
+            elif change is None and not follow:
+                return
+
+    def _hand_over(self, collection, ids, position):
+        articles = list(collection.find({'_id': {'$in': ids}, **PENDING}).sort('_id', 1))
+        self.stats['skipped'] += len(ids) - len(articles)
+        self._uncommitted = position
+
+        if not articles:
+            # nothing to process, move the checkpoint past the skipped articles right away
+            self.commit()
+            return
+
+        latency = (datetime.now(timezone.utc) - articles[0]['_id'].generation_time).total_seconds()
+        self.stats['batches'] += 1
+        self.stats['articles'] += len(articles)
+        self.stats['max_latency'] = max(self.stats['max_latency'], latency)
+        self.logger.info(f"Handing over {len(articles)} articles, oldest stored {latency:.1f}s ago")
+        yield articles
@@ -0,0 +1,87 @@
+import time
+import logging
+from config import config
+from enrichment.stages import Stage, PreprocessStage, SummarizeStage, EntityStage, EmbedStage, PassageStage, \
+    StoreStage
+
+logging.basicConfig(level=logging.INFO)
+
+
+class EnrichmentPipeline:
+    """
+    Summarizes, extracts the named entities of and embeds batches of news articles, then stores them in
+    chroma and marks them as enriched in mongo. Replaces the papermill run of the News Summary notebook.
+
+    The stage models are loaded on the first batch and stay resident for the life of the worker, every stage
+    processes the whole batch at once, and the time spent in each stage is tracked to report its throughput.
+
+    Usage:
+        pipeline = EnrichmentPipeline()
+        pipeline(articles)
+        pipeline.throughput()
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, stages: list[Stage] = None):
+        if stages is None:
+            stages = [PreprocessStage(), SummarizeStage(), EntityStage(), EmbedStage()]
+            if config.VECTOR_INDEX_MODE == 'passages':
+                stages.append(PassageStage())
+            stages.append(StoreStage())
+        self.stages = stages
+        self.stats = {stage.name: {'articles': 0, 'seconds': 0.0, 'load_seconds': 0.0} for stage in self.stages}
+        self._loaded = False
+
+    def load(self) -> None:
+        """
+        Load the models of every stage, once
+        :return: None
+        """
+        if self._loaded:
+            return
+
+        for stage in self.stages:
+            started = time.perf_counter()
+            stage.load()
+            self.stats[stage.name]['load_seconds'] = time.perf_counter() - started
+        self._loaded = True
+        self.logger.info("Loaded enrichment stages in " + ', '.join(
+            f"{name} {stats['load_seconds']:.1f}s" for name, stats in self.stats.items()))
+
+    def __call__(self, articles: list[dict]) -> None:
+        """
+        Enrich a batch of articles, stage by stage
+        :param articles: raw news documents
+        :return: None
+        """
+        self.load()
+
+        rates = []
+        for stage in self.stages:
+            started = time.perf_counter()
+            stage.process(articles)
+            elapsed = time.perf_counter() - started
+
+            self.stats[stage.name]['articles'] += len(articles)
+            self.stats[stage.name]['seconds'] += elapsed
+            rates.append(f"{stage.name} {len(articles) / elapsed if elapsed else 0:.1f}/s")
+
+        self.logger.info(f"Enriched {len(articles)} articles: " + ', '.join(rates))
+
+    def close(self) -> None:
+        """
+        Release the resources of the stages, e.g. process pools
+        :return: None
+        """
+        for stage in self.stages:
+            stage.close()
+        self._loaded = False
+
+    def throughput(self) -> dict[str, float]:
+        """
+        Articles per second of every stage over all the processed batches
+        :return: dict of stage name to articles/sec
+        """
+        return {name: stats['articles'] / stats['seconds'] if stats['seconds'] else 0.0
+                for name, stats in self.stats.items()}
@@ -0,0 +1,284 @@
+import json
+import math
+import logging
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from redis import RedisError
+from config import config
+from dbservices.mongoservice import MongoService
+from dbservices.chromaservice import ChromaService
+from enrichment.summarizer import BartSummarizer
+from util.embeddings import EmbeddingService
+from util.passages import split_passages
+from util.ingest import mark_ingest
+from util.entities import DISABLED, load_nlp, postprocess_entities, entity_fields
+
+logging.basicConfig(level=logging.INFO)
+
+PARAGRAPH_SEPARATOR = '\n\n'
+
+
+def resolve_device(device: str = config.ENRICHMENT_DEVICE) -> str:
+    """
+    torch device of the enrichment models, `auto` picks cuda when it is available
+    """
+    if device != 'auto':
+        return device
+
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+class Stage:
+    """
+    One step of the enrichment pipeline. `load` brings the stage model into memory once per worker and
+    `process` enriches a whole batch of articles in place.
+    """
+
+    name: str = None
+    logger = logging.getLogger(__name__)
+
+    def load(self) -> None:
+        pass
+
+    def process(self, articles: list[dict]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class PreprocessStage(Stage):
+    """
+    Sets the `text` of every article from its `raw_content`. Articles stored by the older spiders keep their
+    content as a list of paragraph fragments, which are joined.
+    """
+
+    name = 'preprocess'
+
+    def process(self, articles: list[dict]) -> None:
+        for article in articles:
+            content = article.get('raw_content') or ''
+            if isinstance(content, list):
+                content = PARAGRAPH_SEPARATOR.join(fragment.strip() for fragment in content if fragment)
+            article['text'] = content.strip()
+
+
+class SummarizeStage(Stage):
+    """
+    Summarizes the articles with BART, the chunks of the whole batch being generated together in length buckets
+    """
+
+    name = 'summarize'
+
+    def __init__(self, model_name: str = config.ENRICHMENT_SUMMARY_MODEL,
+                 batch_size: int = config.ENRICHMENT_SUMMARY_BATCH_SIZE, device: str = config.ENRICHMENT_DEVICE):
+        self.summarizer = BartSummarizer(model_name, batch_size)
+        self.device = device
+
+    def load(self) -> None:
+        self.summarizer.device = resolve_device(self.device)
+        self.summarizer.load()
+
+    def process(self, articles: list[dict]) -> None:
+        summaries = self.summarizer.summarize([article['text'] for article in articles])
+        for article, summary in zip(articles, summaries):
+            article['news_summary'] = summary
+
+
+# spaCy model of an entity pool process
+_process_nlp = None
+
+
+def _init_entity_process(model_name, disabled):
+    global _process_nlp
+    _process_nlp = load_nlp(model_name, disabled)
+
+
+def _extract_entities(texts, batch_size, nlp=None):
+    docs = (nlp or _process_nlp).pipe(texts, batch_size=batch_size)
+    return [postprocess_entities([(ent.text, ent.label_) for ent in doc.ents]) for doc in docs]
+
+
+class EntityStage(Stage):
+    """
+    Extracts the `REQUIRED_FIELDS` named entities of the articles with spaCy. The model is loaded once with
+    the components NER does not need disabled, and texts are streamed through `nlp.pipe`.
+
+    With `n_process` above 1 the model is loaded once in each process of a resident process pool and every
+    batch is split across the processes, instead of `nlp.pipe(n_process=...)` starting and pickling the
+    model into new processes on every call.
+    """
+
+    name = 'ner'
+
+    def __init__(self, model_name: str = config.ENRICHMENT_NER_MODEL,
+                 batch_size: int = config.ENRICHMENT_NER_BATCH_SIZE, n_process: int = config.ENRICHMENT_NER_PROCESSES):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self._nlp, self._executor = None, None
+
+    def load(self) -> None:
+        if self.n_process > 1:
+            # spawned, the parent process already holds the torch thread pools of the other stages
+            self._executor = ProcessPoolExecutor(max_workers=self.n_process, mp_context=get_context('spawn'),
+                                                 initializer=_init_entity_process,
+                                                 initargs=(self.model_name, DISABLED))
+            # load the model in every process now rather than on the first batch
+            list(self._executor.map(_extract_entities, [[]] * self.n_process, [self.batch_size] * self.n_process))
+        else:
+            self._nlp = load_nlp(self.model_name)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def entities(self, texts: list[str]) -> list[dict[str, list[str]]]:
+        """
+        Named entities of many texts
+        :param texts:
+        :return: list of dicts of label to unique entity texts, see `postprocess_entities`
+        """
+        if self._executor is None:
+            return _extract_entities(texts, self.batch_size, self._nlp)
+
+        size = math.ceil(len(texts) / self.n_process) or 1
+        slices = [texts[start:start + size] for start in range(0, len(texts), size)]
+        return [entities for result in self._executor.map(_extract_entities, slices, [self.batch_size] * len(slices))
+                for entities in result]
+
+    def process(self, articles: list[dict]) -> None:
+        for article, entities in zip(articles, self.entities([article['text'] for article in articles])):
+            article['entities'] = entities
+
+
+class EmbedStage(Stage):
+    """
+    Embeds the article texts with the embedding service shared with the chat API
+    """
+
+    name = 'embed'
+
+    def __init__(self, device: str = config.ENRICHMENT_DEVICE):
+        self.device = device
+        self.embeddings = None
+
+    def load(self) -> None:
+        self.embeddings = EmbeddingService.get(device=resolve_device(self.device))
+        self.embeddings.load()
+
+    def process(self, articles: list[dict]) -> None:
+        for article, embedding in zip(articles, self.embeddings.embed([article['text'] for article in articles])):
+            article['embedding'] = embedding
+
+
+class PassageStage(Stage):
+    """
+    Splits the article texts into overlapping passages the embedding model sees whole and embeds the passages
+    of the whole batch together, for small-to-big retrieval
+    """
+
+    name = 'passages'
+
+    def __init__(self, max_tokens: int = config.PASSAGE_MAX_TOKENS, overlap: int = config.PASSAGE_OVERLAP_TOKENS,
+                 device: str = config.ENRICHMENT_DEVICE):
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.device = device
+        self.embeddings = None
+
+    def load(self) -> None:
+        self.embeddings = EmbeddingService.get(device=resolve_device(self.device))
+        self.embeddings.load()
+
+    def process(self, articles: list[dict]) -> None:
+        for article in articles:
+            passages = split_passages(self.embeddings.tokenizer, article['text'], self.max_tokens, self.overlap)
+            article['parent_tokens'] = sum(passage.tokens for passage in passages) - \
+                self.overlap * max(0, len(passages) - 1)
+            article['passages'] = [{'index': index, 'start': passage.start, 'end': passage.end,
+                                    'tokens': passage.tokens, 'text': article['text'][passage.start:passage.end]}
+                                   for index, passage in enumerate(passages)]
+
+        passages = [passage for article in articles for passage in article['passages']]
+        for passage, embedding in zip(passages, self.embeddings.embed([passage['text'] for passage in passages])):
+            passage['embedding'] = embedding
+
+
+class StoreStage(Stage):
+    """
+    Adds the enriched articles to the chroma collection in one upsert, and their passages, if any, to the
+    passage collection under `<article id>:<passage index>` with a `parent_id`, replacing the passages they had.
+    It then sets the summary, entities and `enriched_at` on the mongo documents in one bulk write. Upserting
+    keeps a batch replayed after a crash between the writes from duplicating vectors. Articles without text are only marked as enriched.
+    Storing new vectors records the ingest and the ids stored, which retires the answers cached by the chat API
+    and updates its BM25 indexes.
+    """
+
+    name = 'store'
+
+    def __init__(self, collection_name: str = config.ENRICHMENT_COLLECTION, vector_collection: str = config.DB_NAME,
+                 passage_collection: str = config.PASSAGE_COLLECTION):
+        self.collection_name = collection_name
+        self.vector_collection = vector_collection
+        self.passage_collection = passage_collection
+
+    def process(self, articles: list[dict]) -> None:
+        indexed = [article for article in articles if article['text']]
+        if indexed:
+            collection = ChromaService.get_client().get_or_create_collection(self.vector_collection)
+            collection.upsert(
+                ids=[str(article['_id']) for article in indexed],
+                documents=[article['text'] for article in indexed],
+                embeddings=[article['embedding'] for article in indexed],
+                metadatas=[self._metadata(article) for article in indexed]
+            )
+
+        split = [str(article['_id']) for article in indexed if 'passages' in article]
+        passages = [(article, passage) for article in indexed for passage in article.get('passages', ())]
+        if split:
+            collection = ChromaService.get_client().get_or_create_collection(self.passage_collection)
+            # a re-enriched article can have fewer passages than before, drop its old ones so none is orphaned
+            collection.delete(where={'parent_id': {'$in': split}})
+        if passages:
+            collection.upsert(
+                ids=[f"{article['_id']}:{passage['index']}" for article, passage in passages],
+                documents=[passage['text'] for _, passage in passages],
+                embeddings=[passage['embedding'] for _, passage in passages],
+                metadatas=[{**self._metadata(article), 'parent_id': str(article['_id']),
+                            'passage': passage['index'], 'start': passage['start'], 'end': passage['end'],
+                            'tokens': passage['tokens'], 'parent_tokens': article['parent_tokens'],
+                            'n_passages': len(article['passages'])} for article, passage in passages]
+            )
+
+        enriched_at = datetime.now(timezone.utc).isoformat()
+        MongoService.update_by_id(self.collection_name, {
+            article['_id']: {
+                'news_summary': article.get('news_summary', ''),
+                'entities': article.get('entities', {}),
+                'enriched_at': enriched_at
+            } for article in articles
+        })
+
+        if indexed:
+            try:
+                mark_ingest([str(article['_id']) for article in indexed] +
+                            [f"{article['_id']}:{passage['index']}" for article, passage in passages])
+            except RedisError as e:
+                self.logger.warning(f"Could not record the ingest, cached answers and BM25 indexes stay stale: {e}")
+
+    @staticmethod
+    def _metadata(article):
+        # chroma metadata values are scalars, dates included, and every entity is a filterable boolean field
+        publication_date = article.get('publication_date')
+        return {
+            **entity_fields(article.get('entities', {})),
+            'entities': json.dumps(article.get('entities', {})),
+            'summary': article.get('news_summary', ''),
+            'source': article.get('source') or '',
+            'publication_date': publication_date.isoformat() if isinstance(publication_date, datetime)
+            else str(publication_date or '')
+        }
@@ -0,0 +1,261 @@
+import re
+import hashlib
+import logging
+from array import array
+from typing import NamedTuple
+from redis import RedisError
+from config import config
+from dbservices.redisservice import RedisService
+
+logging.basicConfig(level=logging.INFO)
+
+# sentence boundaries a paragraph longer than a chunk is cut at
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+
+class SummaryTier(NamedTuple):
+    # longest chunk, in tokens, summarized with this tier
+    max_tokens: int
+    num_beams: int
+    max_length: int
+    min_length: int
+
+
+def parse_tiers(value: str) -> list[SummaryTier]:
+    """
+    Parse summary tiers from `max_tokens:num_beams:max_length:min_length` entries separated by commas
+    :param value: e.g. '256:2:64:16,1024:4:142:56'
+    :return: list of SummaryTier, by increasing max_tokens
+    """
+    tiers = [SummaryTier(*(int(field) for field in entry.split(':'))) for entry in value.split(',') if entry.strip()]
+    if not tiers:
+        raise ValueError(f"No summary tiers in '{value}'")
+    return sorted(tiers)
+
+
+class BartSummarizer:
+    """
+    Summarizes many texts at once with a BART model.
+
+    Texts are cut into token chunks of whole paragraphs that fit the model input window. Where a chunk ends is
+    anchored to the content: after a paragraph whose hash is a multiple of `boundary_every`, which happens every
+    `boundary_every` paragraphs on average, or before a paragraph that would overflow the window. Editing a
+    paragraph then only moves the boundaries up to the next anchored one, instead of shifting every later chunk.
+    A paragraph longer than the window is cut into chunks of its own, on sentence boundaries where possible.
+    The chunks of all the texts are sorted by length and generated in batches of similar lengths, so padding is
+    dynamic and small, under `torch.inference_mode()`. A chunk is generated with the beam count and summary
+    length of the first tier holding its token count, short chunks getting fewer beams and shorter summaries.
+    The chunk summaries of a text are joined in chunk order and, in hierarchical mode, summarized again until
+    they fit in `max_summary_tokens`.
+
+    Chunk summaries, intermediate ones included, are cached in redis under `<cache_key>:<chunk hash>` for
+    `cache_ttl` seconds, so an updated article mostly has its changed chunks summarized again. The chunk
+    summaries of a level are the paragraphs of the next one. Redis errors count as cache misses.
+
+    Usage:
+        summarizer = BartSummarizer()
+        summarizer.load()
+        summaries = summarizer.summarize(texts)
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, model_name: str = config.ENRICHMENT_SUMMARY_MODEL,
+                 batch_size: int = config.ENRICHMENT_SUMMARY_BATCH_SIZE,
+                 tiers: list[SummaryTier] = None, device: str = 'cpu', length_penalty: float = 2.0,
+                 hierarchical: bool = config.ENRICHMENT_SUMMARY_MODE == 'hierarchical',
+                 max_summary_tokens: int = config.ENRICHMENT_SUMMARY_MAX_TOKENS, max_levels: int = 4,
+                 cache_key: str = 'summary-cache', cache_ttl: int = config.ENRICHMENT_SUMMARY_CACHE_TTL,
+                 boundary_every: int = 4):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.tiers = tiers or parse_tiers(config.ENRICHMENT_SUMMARY_TIERS)
+        self.device = device
+        self.length_penalty = length_penalty
+        self.hierarchical = hierarchical
+        self.max_summary_tokens = max_summary_tokens
+        self.max_levels = max_levels
+        self.cache_key = cache_key
+        self.cache_ttl = cache_ttl
+        self.boundary_every = boundary_every
+        self.stats = {'chunks': 0, 'cached': 0, 'levels': 0}
+        self._tokenizer, self._model = None, None
+
+    @property
+    def max_chunk_tokens(self) -> int:
+        """
+        longest chunk in tokens, the input window of the model less the special tokens
+        """
+        window = min(self._tokenizer.model_max_length, self.tiers[-1].max_tokens)
+        return window - self._tokenizer.num_special_tokens_to_add()
+
+    def load(self) -> None:
+        from transformers import BartTokenizerFast, BartForConditionalGeneration
+
+        self._tokenizer = BartTokenizerFast.from_pretrained(self.model_name)
+        self._model = BartForConditionalGeneration.from_pretrained(self.model_name).to(self.device).eval()
+
+    def chunk(self, text: str) -> list[list[int]]:
+        """
+        Cut a text into chunks of at most `max_chunk_tokens` token ids, packing whole paragraphs into a chunk up
+        to a content-anchored boundary, and cutting a paragraph only when it is longer than a chunk on its own
+        :param text: article text, paragraphs separated by blank lines
+        :return: list of token id lists, without special tokens
+        """
+        paragraphs = [paragraph.strip() for paragraph in PARAGRAPH_BREAK.split(text) if paragraph.strip()]
+        if not paragraphs:
+            return []
+
+        limit = self.max_chunk_tokens
+        encoded = self._tokenizer([' ' + paragraph for paragraph in paragraphs],
+                                  add_special_tokens=False)['input_ids']
+
+        chunks, current = [], []
+        for paragraph, ids in zip(paragraphs, encoded):
+            if len(ids) > limit:
+                if current:
+                    chunks.append(current)
+                    current = []
+                chunks += self._split_paragraph(paragraph, limit)
+                continue
+
+            if current and len(current) + len(ids) > limit:
+                chunks.append(current)
+                current = []
+            current = current + ids
+            if self._is_boundary(paragraph):
+                chunks.append(current)
+                current = []
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _split_paragraph(self, paragraph, limit):
+        sentences = [sentence for sentence in SENTENCE_END.split(paragraph) if sentence.strip()]
+        encoded = self._tokenizer([' ' + sentence for sentence in sentences], add_special_tokens=False)['input_ids']
+
+        chunks, current = [], []
+        for ids in encoded:
+            if len(current) + len(ids) > limit and current:
+                chunks.append(current)
+                current = []
+            while len(ids) > limit:
+                chunks.append(ids[:limit])
+                ids = ids[limit:]
+            current = current + ids
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _is_boundary(self, paragraph):
+        digest = hashlib.blake2b(paragraph.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') % self.boundary_every == 0
+
+    def summarize(self, texts: list[str]) -> list[str]:
+        """
+        Summarize a batch of texts. In hierarchical mode the joined chunk summaries of a text are summarized
+        again, map-reduce style, until they fit in `max_summary_tokens`; otherwise they are returned joined.
+        :param texts: article texts
+        :return: list of summaries, empty for an empty text
+        """
+        levels = {index: self.chunk(text) for index, text in enumerate(texts)}
+        results = {index: '' for index, chunks in levels.items() if not chunks}
+        levels = {index: chunks for index, chunks in levels.items() if chunks}
+
+        for level in range(self.max_levels):
+            if not levels:
+                break
+            self.stats['levels'] = max(self.stats['levels'], level + 1)
+
+            summaries = self._summarize_chunks([chunk for chunks in levels.values() for chunk in chunks])
+            reduced = {}
+            for index, chunks in levels.items():
+                parts, summaries = summaries[:len(chunks)], summaries[len(chunks):]
+                summary = ' '.join(parts)
+
+                # every chunk summary is a paragraph of the next level, so its boundaries stay anchored too
+                next_chunks = self.chunk('\n\n'.join(parts)) if self.hierarchical else []
+                tokens = sum(len(chunk) for chunk in next_chunks)
+                # stop when the summary fits, or stops getting shorter
+                if not self.hierarchical or tokens <= self.max_summary_tokens or \
+                        tokens >= sum(len(chunk) for chunk in chunks):
+                    results[index] = summary
+                else:
+                    reduced[index] = next_chunks
+            levels = reduced
+
+        for index, chunks in levels.items():
+            # still over budget after max_levels, keep the summary of the last level
+            results[index] = self._tokenizer.decode([token for chunk in chunks for token in chunk]).strip()
+        return [results[index] for index in range(len(texts))]
+
+    def _summarize_chunks(self, chunks):
+        import torch
+
+        keys = [self._cache_key(chunk) for chunk in chunks]
+        summaries = self._cached(keys)
+        self.stats['chunks'] += len(chunks)
+        self.stats['cached'] += sum(summary is not None for summary in summaries)
+
+        # length buckets: consecutive chunks of the length order that fall in the same tier
+        missing = sorted((i for i, summary in enumerate(summaries) if summary is None), key=lambda i: len(chunks[i]))
+        for tier, batch in self._batches(missing, chunks):
+            inputs = self._tokenizer.pad(
+                {'input_ids': [self._tokenizer.build_inputs_with_special_tokens(chunks[i]) for i in batch]},
+                return_tensors='pt').to(self.device)
+            with torch.inference_mode():
+                summary_ids = self._model.generate(**inputs, num_beams=tier.num_beams, max_length=tier.max_length,
+                                                   min_length=tier.min_length, length_penalty=self.length_penalty,
+                                                   early_stopping=True)
+            for i, summary in zip(batch, self._tokenizer.batch_decode(summary_ids, skip_special_tokens=True)):
+                summaries[i] = summary.strip()
+
+        self._cache({keys[i]: summaries[i] for i in missing})
+        return summaries
+
+    def _cache_key(self, chunk):
+        # the model and the generation settings of the chunk tier are part of the key
+        tier = self._tier(len(chunk))
+        digest = hashlib.blake2b(f'{self.model_name}|{tuple(tier)}|{self.length_penalty}|'.encode('utf-8'),
+                                 digest_size=16)
+        digest.update(array('I', chunk).tobytes())
+        return f'{self.cache_key}:{digest.hexdigest()}'
+
+    def _cached(self, keys):
+        if not self.cache_ttl or not keys:
+            return [None] * len(keys)
+        try:
+            values = RedisService.get_client().mget(keys)
+        except RedisError as e:
+            self.logger.warning(f"Summary cache unavailable, generating every chunk: {e}")
+            return [None] * len(keys)
+        return [value.decode('utf-8') if value is not None else None for value in values]
+
+    def _cache(self, summaries):
+        if not self.cache_ttl or not summaries:
+            return
+        try:
+            pipe = RedisService.get_client().pipeline(transaction=False)
+            for key, summary in summaries.items():
+                pipe.set(key, summary, ex=self.cache_ttl)
+            pipe.execute()
+        except RedisError as e:
+            self.logger.warning(f"Summary cache unavailable, {len(summaries)} chunk summaries not cached: {e}")
+
+    def _tier(self, n_tokens):
+        n_tokens += self._tokenizer.num_special_tokens_to_add()
+        return next((tier for tier in self.tiers if n_tokens <= tier.max_tokens), self.tiers[-1])
+
+    def _batches(self, order, chunks):
+        batch, batch_tier = [], None
+        for i in order:
+            tier = self._tier(len(chunks[i]))
+            if batch and (tier != batch_tier or len(batch) == self.batch_size):
+                yield batch_tier, batch
+                batch = []
+            batch.append(i)
+            batch_tier = tier
+        if batch:
+            yield batch_tier, batch
@@ -0,0 +1,57 @@
+# Streaming enrichment worker: consumes newly stored articles from the change feed of the raw news
+# collection and enriches them batch by batch, checkpointing after every batch.
+#
+#   python -m enrichment.worker            # tail the feed, enriching articles as they are stored
+#   python -m enrichment.worker --drain    # enrich the backlog and exit
+import logging
+import argparse
+from typing import Callable
+from enrichment.changefeed import ArticleChangeFeed
+from enrichment.pipeline import EnrichmentPipeline
+
+logging.basicConfig(level=logging.INFO)
+
+
+class EnrichmentWorker:
+    """
+    Runs `process` on every batch of the article change feed and commits the feed position once the batch
+    is processed. A batch that fails is not committed and is handed over again after a restart.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, process: Callable[[list[dict]], None] = None, feed: ArticleChangeFeed = None):
+        self.process = process or EnrichmentPipeline()
+        self.feed = feed or ArticleChangeFeed()
+
+    def run(self, follow: bool = True) -> dict:
+        """
+        Enrich articles as they are stored
+        :param follow: keep tailing the feed; when False, return once the backlog is processed
+        :return: dict of feed stats
+        """
+        try:
+            for articles in self.feed.batches(follow=follow):
+                self.process(articles)
+                self.feed.commit()
+        finally:
+            if isinstance(self.process, EnrichmentPipeline):
+                self.process.close()
+
+        self.logger.info(f"Enrichment feed stats: {self.feed.stats}")
+        if isinstance(self.process, EnrichmentPipeline):
+            self.logger.info("Enrichment throughput (articles/s): " + ', '.join(
+                f"{name} {rate:.1f}" for name, rate in self.process.throughput().items()))
+        return self.feed.stats
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Enrich newly stored news articles')
+    arg_parser.add_argument('--drain', action='store_true', help='process the backlog and exit')
+    args = arg_parser.parse_args()
+
+    EnrichmentWorker().run(follow=not args.drain)
+
+
+if __name__ == '__main__':
+    main()
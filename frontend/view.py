@@ -1,3 +1,4 @@
+import json
 import uuid
 import http
 import asyncio
@@ -20,11 +21,23 @@ async def websocket_handler():
 
             # send the message to llm fastapi websocket
             await websocket.send(prompt)
-            reply = await websocket.recv()
 
-            # append reply to the session_state message and write to chat interface
+            # write the reply to the chat interface token by token as the llm generates it
+            message = st.chat_message("assistant")
+            placeholder = message.empty()
+            reply, sources = '', []
+            while (event := json.loads(await websocket.recv()))['type'] != 'end':
+                if event['type'] == 'sources':
+                    sources = event['sources']
+                elif event['type'] == 'token':
+                    reply += event['text']
+                    placeholder.write(reply)
+            if sources:
+                message.caption('Sources: ' + ', '.join(f"{source['source']} ({source['publication_date']})"
+                                                        for source in sources))
+
+            # append reply to the session_state message
             st.session_state.messages.append({"role": "assistant", "content": reply})
-            st.chat_message("assistant").write(reply)
 
 
 async def main():
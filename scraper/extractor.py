@@ -0,0 +1,57 @@
+import re
+from typing import Iterable, Iterator
+
+# zero-width characters are not whitespace to str.split and are dropped before splitting
+ZERO_WIDTH = re.compile('[\u200b\u200c\u200d\ufeff]')
+
+PARAGRAPH_SEPARATOR = '\n\n'
+
+
+class ArticleExtractor:
+    """
+    Turns the paragraph texts of an article page into clean article text in a single pass. Every paragraph is
+    whitespace-normalized and stripped; empty paragraphs, exact repeats and paragraphs starting with one of the
+    outlet `boilerplate` patterns (footers, app promotions, transcript notices) are dropped. The patterns are
+    compiled once into a single regex.
+
+    Usage:
+        extractor = ArticleExtractor([r'© \\d{4} POLITICO'])
+        text = extractor.extract(page.paragraphs)
+    """
+
+    def __init__(self, boilerplate: list[str] = None):
+        self.boilerplate = list(boilerplate or [])
+        self._boilerplate = re.compile('|'.join(f'(?:{pattern})' for pattern in self.boilerplate)) \
+            if self.boilerplate else None
+
+    def paragraphs(self, fragments: Iterable[str]) -> Iterator[str]:
+        """
+        Lazily yield the clean paragraphs of an article
+        :param fragments: paragraph texts in document order
+        :return: Iterator of str
+        """
+        seen = set()
+        for fragment in fragments:
+            if not fragment:
+                continue
+
+            if ZERO_WIDTH.search(fragment):
+                fragment = ZERO_WIDTH.sub('', fragment)
+
+            # collapse runs of whitespace, non-breaking spaces and newlines included, to single spaces
+            paragraph = ' '.join(fragment.split())
+            if not paragraph or paragraph in seen:
+                continue
+            if self._boilerplate is not None and self._boilerplate.match(paragraph):
+                continue
+
+            seen.add(paragraph)
+            yield paragraph
+
+    def extract(self, fragments: Iterable[str]) -> str:
+        """
+        Clean article text, paragraphs separated by a blank line
+        :param fragments: paragraph texts in document order
+        :return: str
+        """
+        return PARAGRAPH_SEPARATOR.join(self.paragraphs(fragments))
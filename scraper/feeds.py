@@ -0,0 +1,100 @@
+import logging
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+from xml.etree import ElementTree
+from dateutil import parser as date_parser
+from dbservices.redisservice import RedisService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FeedEntry(NamedTuple):
+    url: str
+    lastmod: Optional[datetime]
+
+
+class Feed(NamedTuple):
+    # article urls of a news sitemap or an RSS/Atom feed
+    entries: list[FeedEntry]
+    # child sitemaps of a sitemap index
+    sitemaps: list[FeedEntry]
+
+
+def parse_feed(content: str | bytes) -> Feed:
+    """
+    Parse a sitemap, sitemap index, RSS or Atom document. The modification time of an entry is read from
+    `lastmod`, `news:publication_date`, `pubDate`, `updated` or `published`, whichever it has.
+    :param content: raw document
+    :return: Feed, empty when the document is not valid XML
+    """
+    try:
+        root = ElementTree.fromstring(content)
+    except ElementTree.ParseError as e:
+        logger.error(f"Unable to parse feed: {e}")
+        return Feed([], [])
+
+    entries, sitemaps = [], []
+    for node in root.iter():
+        tag = _local_name(node.tag)
+        if tag not in ('url', 'sitemap', 'item', 'entry'):
+            continue
+
+        url, lastmod = None, None
+        # image and video extensions of a sitemap entry carry their own nested <loc>
+        direct_children = set(node)
+        for child in node.iter():
+            child_tag = _local_name(child.tag)
+            if child not in direct_children and child_tag in ('loc', 'link'):
+                continue
+
+            if child_tag == 'loc' or (child_tag == 'link' and tag == 'item'):
+                url = url or (child.text or '').strip()
+            elif child_tag == 'link' and tag == 'entry' and child.get('rel', 'alternate') == 'alternate':
+                url = url or child.get('href')
+            elif child_tag in ('lastmod', 'publication_date', 'pubDate', 'updated', 'published'):
+                lastmod = max(filter(None, (lastmod, _parse_date(child.text))), default=None)
+
+        if url:
+            (sitemaps if tag == 'sitemap' else entries).append(FeedEntry(url, lastmod))
+
+    return Feed(entries, sitemaps)
+
+
+def is_fresh(entry: FeedEntry, since: Optional[datetime]) -> bool:
+    """
+    check if a feed entry changed after `since`. Entries without a modification time are always fresh,
+    the visited-url store filters the ones already crawled.
+    """
+    return since is None or entry.lastmod is None or entry.lastmod >= since
+
+
+class CrawlCheckpoint:
+    """
+    Start time of the last successful crawl of an outlet, kept in redis under `<redis_key>:last-crawl`.
+    Feed entries not modified since then are skipped.
+    """
+
+    def __init__(self, redis_key: str):
+        self.redis_key = f'{redis_key}:last-crawl'
+
+    def get(self) -> Optional[datetime]:
+        value = RedisService.get_client().get(self.redis_key)
+        return datetime.fromtimestamp(float(value), tz=timezone.utc) if value else None
+
+    def set(self, started: datetime) -> None:
+        RedisService.get_client().set(self.redis_key, started.timestamp())
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def _parse_date(value):
+    if not value or not value.strip():
+        return None
+    try:
+        parsed = date_parser.parse(value.strip())
+    except (ValueError, OverflowError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
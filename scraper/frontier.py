@@ -0,0 +1,150 @@
+import re
+import sqlite3
+import logging
+from datetime import date
+from pathlib import Path
+from urllib.parse import urlsplit
+from config import config
+from scraper.urls import url_fingerprint
+
+logging.basicConfig(level=logging.INFO)
+
+PENDING, IN_PROGRESS, DONE = 0, 1, 2
+
+DATE_IN_PATH = re.compile(r'/(20\d{2})/(\d{2})/(\d{2})/')
+
+# depth only orders urls published on the same day
+MAX_DEPTH_PENALTY = 9
+
+
+class CrawlFrontier:
+    """
+    Persistent priority queue of the urls a crawler still has to fetch, stored in a local SQLite database
+    so a killed or redeployed job resumes where it left off. Urls are popped freshest first: by the
+    publication date in their path (undated urls count as published the day they were queued), then by
+    crawl depth. Every url the frontier has seen is kept in memory by fingerprint for O(1) membership.
+
+    Entries move from pending to in progress when popped and to done once processed; `resume()` puts the
+    entries a previous run left in progress back in the queue and forgets the done ones, which the
+    visited-url store already covers.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, name: str, directory: str = config.FRONTIER_DIR):
+        self.path = Path(directory) / f'{name}.sqlite3'
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # callers may use the frontier from a thread other than the one that opened it, one thread at a time
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS frontier ('
+            'fingerprint BLOB PRIMARY KEY, url TEXT NOT NULL, priority INTEGER NOT NULL, '
+            'depth INTEGER NOT NULL, state INTEGER NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS frontier_queue ON frontier (state, priority DESC)')
+        self._db.commit()
+
+        self._known = {row[0] for row in self._db.execute('SELECT fingerprint FROM frontier')}
+
+    @staticmethod
+    def priority(url: str, depth: int = 0) -> int:
+        """
+        Priority of a url, higher is fetched first. Usable as a scrapy Request priority.
+        :param url: canonical web url
+        :param depth: number of links followed from the start url
+        :return: int
+        """
+        match = DATE_IN_PATH.search(urlsplit(url).path)
+        published = date.today()
+        if match:
+            try:
+                published = date(int(match[1]), int(match[2]), int(match[3]))
+            except ValueError:
+                pass
+        return published.toordinal() * (MAX_DEPTH_PENALTY + 1) - min(depth, MAX_DEPTH_PENALTY)
+
+    def __contains__(self, url: str) -> bool:
+        return url_fingerprint(url) in self._known
+
+    def __len__(self) -> int:
+        return self.count(PENDING)
+
+    def count(self, state: int = PENDING) -> int:
+        return self._db.execute('SELECT COUNT(*) FROM frontier WHERE state = ?', (state,)).fetchone()[0]
+
+    def push(self, urls: list[str], depth: int = 0) -> list[str]:
+        """
+        Queue the urls the frontier has not seen yet
+        :param urls: canonical web urls
+        :param depth: crawl depth of the urls
+        :return: list of the urls that were queued, in their original order
+        """
+        added, rows = [], []
+        for url in urls:
+            fingerprint = url_fingerprint(url)
+            if fingerprint in self._known:
+                continue
+            self._known.add(fingerprint)
+            added.append(url)
+            rows.append((fingerprint, url, self.priority(url, depth), depth, PENDING))
+
+        if rows:
+            with self._db:
+                self._db.executemany('INSERT OR IGNORE INTO frontier VALUES (?, ?, ?, ?, ?)', rows)
+        return added
+
+    def pop(self, n: int = 1) -> list[tuple[str, int]]:
+        """
+        Take the highest priority pending urls and mark them in progress
+        :param n: maximum number of urls
+        :return: list of (url, depth) tuples
+        """
+        rows = self._db.execute(
+            'SELECT fingerprint, url, depth FROM frontier WHERE state = ? ORDER BY priority DESC LIMIT ?',
+            (PENDING, n)
+        ).fetchall()
+
+        if rows:
+            with self._db:
+                self._db.executemany('UPDATE frontier SET state = ? WHERE fingerprint = ?',
+                                     [(IN_PROGRESS, row[0]) for row in rows])
+        return [(url, depth) for _, url, depth in rows]
+
+    def pending(self) -> list[tuple[str, int]]:
+        """
+        Mark every pending url in progress and return them by priority, for crawlers that schedule
+        the whole queue at once
+        :return: list of (url, depth) tuples
+        """
+        return self.pop(self.count(PENDING))
+
+    def done(self, urls: list[str]) -> None:
+        """
+        Mark urls as processed, whether they were saved, skipped or failed
+        :param urls: canonical web urls
+        :return: None
+        """
+        with self._db:
+            self._db.executemany('UPDATE frontier SET state = ? WHERE fingerprint = ?',
+                                 [(DONE, url_fingerprint(url)) for url in urls])
+
+    def resume(self) -> int:
+        """
+        Requeue the urls a previous run left in progress and forget the processed ones
+        :return: number of pending urls
+        """
+        with self._db:
+            self._db.execute('DELETE FROM frontier WHERE state = ?', (DONE,))
+            self._db.execute('UPDATE frontier SET state = ? WHERE state = ?', (PENDING, IN_PROGRESS))
+        self._known = {row[0] for row in self._db.execute('SELECT fingerprint FROM frontier')}
+
+        pending = self.count(PENDING)
+        if pending:
+            self.logger.info(f"Resuming crawl frontier {self.path} with {pending} pending urls")
+        return pending
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,115 @@
+import os
+import gzip
+import json
+import logging
+import tempfile
+from pathlib import Path
+from config import config
+from scraper.urls import url_fingerprint
+
+logging.basicConfig(level=logging.INFO)
+
+
+class RevalidationCache:
+    """
+    On-disk cache of page bodies and their `ETag`/`Last-Modified` validators, keyed by the fingerprint of
+    the canonical url. Cached pages are revalidated with a conditional GET; a `304 Not Modified` answer lets
+    the crawler reuse the stored body, and skip re-parsing the page, without downloading it again.
+
+    Layout: <cache_dir>/<fp[:2]>/<fp>.json holds the validators, <fp>.gz the gzip-compressed body.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, cache_dir: str = config.HTTP_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.stats = {'conditional_requests': 0, 'revalidated': 0, 'stored': 0, 'bytes_saved': 0}
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        share of conditional requests answered with 304 Not Modified
+        """
+        if not self.stats['conditional_requests']:
+            return 0.0
+        return self.stats['revalidated'] / self.stats['conditional_requests']
+
+    def conditional_headers(self, url: str) -> dict:
+        """
+        Headers that revalidate the cached copy of a url, empty when nothing is cached
+        :param url: web url about to be requested
+        :return: dict
+        """
+        meta = self._load_meta(url)
+        if not meta:
+            return {}
+
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        if headers:
+            self.stats['conditional_requests'] += 1
+        return headers
+
+    def load(self, url: str) -> tuple[dict, bytes] | None:
+        """
+        Return the validators and body cached for a url after the server answered 304 Not Modified
+        :param url: web url
+        :return: tuple of (meta, body) or None when the url is not cached
+        """
+        meta = self._load_meta(url)
+        if not meta:
+            return None
+
+        try:
+            body = gzip.decompress(self._path(url, '.gz').read_bytes())
+        except (OSError, EOFError):
+            return None
+
+        self.stats['revalidated'] += 1
+        self.stats['bytes_saved'] += len(body)
+        return meta, body
+
+    def store(self, url: str, etag: str | None, last_modified: str | None, body: bytes,
+              content_type: str = None) -> None:
+        """
+        Cache a page that came with validators. Pages without `ETag` and `Last-Modified` are not cached.
+        :param url: web url of the page
+        :param etag: value of the ETag header
+        :param last_modified: value of the Last-Modified header
+        :param body: raw page body
+        :param content_type: value of the Content-Type header
+        :return: None
+        """
+        if not etag and not last_modified:
+            return
+
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified, 'content_type': content_type}
+        try:
+            self._write(self._path(url, '.gz'), gzip.compress(body))
+            self._write(self._path(url, '.json'), json.dumps(meta).encode('utf-8'))
+            self.stats['stored'] += 1
+        except OSError as e:
+            self.logger.error(f"Unable to cache {url}: {e}")
+
+    def _load_meta(self, url):
+        try:
+            return json.loads(self._path(url, '.json').read_bytes())
+        except (OSError, ValueError):
+            return None
+
+    def _path(self, url, suffix):
+        fingerprint = url_fingerprint(url).hex()
+        return self.cache_dir / fingerprint[:2] / f'{fingerprint}{suffix}'
+
+    @staticmethod
+    def _write(path, data):
+        # write to a temporary file first so concurrent readers never see a partial entry
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
@@ -11,5 +11,6 @@ class NewsItem(scrapy.Item):
     raw_content = scrapy.Field()
     publication_date = scrapy.Field()
     url = scrapy.Field()
+    url_fingerprint = scrapy.Field()
     source = scrapy.Field()
     created_at = scrapy.Field()
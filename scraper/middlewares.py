@@ -3,7 +3,15 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+from config import config
+from scraper.urls import canonicalize_url
+from scraper.httpcache import RevalidationCache
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
@@ -101,3 +109,234 @@ class ScraperDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class RevalidationCacheMiddleware:
+    """
+    Revalidates pages cached by `RevalidationCache` with If-None-Match / If-Modified-Since. A 304 answer is
+    turned back into the cached page flagged 'revalidated', which spiders use to skip unchanged hub pages.
+
+    Only hub pages, the urls the outlet url classifier rejects, are cached and revalidated. An article is
+    skipped as visited once it is stored, so caching it would only grow the cache, and a 304 for it would
+    hide an article whose insert failed on the previous run.
+    """
+
+    def __init__(self, cache, stats):
+        self.cache = cache
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('REVALIDATION_CACHE_ENABLED', config.HTTP_CACHE_ENABLED):
+            raise NotConfigured
+        s = cls(RevalidationCache(crawler.settings.get('REVALIDATION_CACHE_DIR', config.HTTP_CACHE_DIR)),
+                crawler.stats)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_request(self, request, spider):
+        url = canonicalize_url(request.url)
+        if not self._revalidates(request, url, spider):
+            return None
+
+        for header, value in self.cache.conditional_headers(url).items():
+            request.headers.setdefault(header, value)
+        return None
+
+    def process_response(self, request, response, spider):
+        url = canonicalize_url(request.url)
+        if not self._revalidates(request, url, spider):
+            return response
+
+        if response.status == 304:
+            cached = self.cache.load(url)
+            if cached is None:
+                return response
+
+            meta, body = cached
+            self.stats.inc_value('revalidation_cache/hit')
+            self.stats.inc_value('revalidation_cache/bytes_saved', len(body))
+            headers = {'Content-Type': meta['content_type']} if meta.get('content_type') else {}
+            return HtmlResponse(url=response.url, body=body, headers=headers, request=request,
+                                flags=response.flags + ['revalidated'])
+
+        if response.status == 200:
+            content_type = response.headers.get('Content-Type')
+            self.cache.store(url,
+                             etag=self._header(response, 'ETag'),
+                             last_modified=self._header(response, 'Last-Modified'),
+                             body=response.body,
+                             content_type=content_type.decode('latin-1') if content_type else None)
+            self.stats.inc_value('revalidation_cache/miss')
+        return response
+
+    def spider_closed(self, spider):
+        self.stats.set_value('revalidation_cache/hit_rate', round(self.cache.hit_rate, 4))
+        spider.logger.info(f"Revalidation cache stats: {self.cache.stats}, hit rate {self.cache.hit_rate:.2%}")
+
+    @staticmethod
+    def _revalidates(request, url, spider):
+        return (request.method == 'GET' and not request.meta.get('dont_revalidate')
+                and not spider.url_classifier.accepts(url))
+
+    @staticmethod
+    def _header(response, name):
+        value = response.headers.get(name)
+        return value.decode('latin-1') if value else None
+
+
+class DomainState:
+    """
+    Recent responses of one download slot and the concurrency and delay chosen for it
+    """
+
+    def __init__(self, concurrency, delay, window):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.latencies = deque(maxlen=window)
+        self.statuses = deque(maxlen=window)
+        self.since_adjustment = 0
+        self.retry_after_until = 0.0
+
+    def percentile(self, q):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def rate(self, predicate):
+        if not self.statuses:
+            return 0.0
+        return sum(1 for status in self.statuses if predicate(status)) / len(self.statuses)
+
+    def snapshot(self):
+        return {
+            'concurrency': self.concurrency,
+            'delay': round(self.delay, 3),
+            'p50': round(self.percentile(0.5), 3),
+            'p95': round(self.percentile(0.95), 3),
+            'throttled_rate': round(self.rate(lambda status: status == 429), 4),
+            'error_rate': round(self.rate(lambda status: status >= 500), 4),
+        }
+
+
+class AdaptiveConcurrencyMiddleware(ScraperDownloaderMiddleware):
+    """
+    Tunes the concurrency and download delay of every download slot (one per domain) from what the outlet
+    tolerates, replacing AutoThrottle's single target for all of them. Every `ADAPTIVE_CONCURRENCY_INTERVAL`
+    responses of a slot:
+
+    - 429 or 5xx responses (and download errors) above `ADAPTIVE_CONCURRENCY_ERROR_RATE` halve its concurrency
+      and double its delay
+    - a p95 latency above `ADAPTIVE_CONCURRENCY_TARGET_LATENCY`, or above `ADAPTIVE_CONCURRENCY_TAIL_RATIO`
+      times the p50 (requests queueing on the server), lowers the concurrency by one
+    - otherwise the concurrency grows by one and the delay shrinks
+
+    A `Retry-After` header raises the delay to the requested value at once and holds it until it expires.
+    The state of every slot is available from `state()` and in the crawl stats under
+    `adaptive_concurrency/<slot>/`.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.min_concurrency = settings.getint('ADAPTIVE_CONCURRENCY_MIN', 1)
+        self.max_concurrency = settings.getint('ADAPTIVE_CONCURRENCY_MAX', 16)
+        self.min_delay = settings.getfloat('ADAPTIVE_CONCURRENCY_MIN_DELAY', 0.0)
+        self.max_delay = settings.getfloat('ADAPTIVE_CONCURRENCY_MAX_DELAY', 60.0)
+        self.target_latency = settings.getfloat('ADAPTIVE_CONCURRENCY_TARGET_LATENCY', 2.0)
+        self.tail_ratio = settings.getfloat('ADAPTIVE_CONCURRENCY_TAIL_RATIO', 4.0)
+        self.error_rate = settings.getfloat('ADAPTIVE_CONCURRENCY_ERROR_RATE', 0.05)
+        self.window = settings.getint('ADAPTIVE_CONCURRENCY_WINDOW', 50)
+        self.interval = settings.getint('ADAPTIVE_CONCURRENCY_INTERVAL', 10)
+        self.domains = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('ADAPTIVE_CONCURRENCY_ENABLED'):
+            raise NotConfigured
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def state(self) -> dict:
+        """
+        current concurrency, delay, latency percentiles and error rates of every download slot
+        """
+        return {key: domain.snapshot() for key, domain in self.domains.items()}
+
+    def process_response(self, request, response, spider):
+        retry_after = self._retry_after(response) if response.status in (429, 503) else None
+        self._record(request, spider, response.status, request.meta.get('download_latency'), retry_after)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        # timeouts and dropped connections count as server errors
+        self._record(request, spider, 599, None, None)
+
+    def spider_closed(self, spider):
+        spider.logger.info(f"Adaptive concurrency state: {self.state()}")
+
+    def _record(self, request, spider, status, latency, retry_after):
+        key = request.meta.get('download_slot')
+        slot = self.crawler.engine.downloader.slots.get(key) if key else None
+        if slot is None:
+            return
+
+        domain = self.domains.get(key)
+        if domain is None:
+            domain = self.domains[key] = DomainState(slot.concurrency, slot.delay, self.window)
+
+        domain.statuses.append(status)
+        if latency is not None:
+            domain.latencies.append(latency)
+        if retry_after:
+            domain.retry_after_until = max(domain.retry_after_until, time.monotonic() + retry_after)
+            domain.delay = min(self.max_delay, max(domain.delay, retry_after))
+
+        domain.since_adjustment += 1
+        if domain.since_adjustment >= self.interval:
+            domain.since_adjustment = 0
+            self._adjust(key, domain, spider)
+
+        slot.concurrency, slot.delay = domain.concurrency, domain.delay
+
+    def _adjust(self, key, domain, spider):
+        previous = (domain.concurrency, domain.delay)
+        p50, p95 = domain.percentile(0.5), domain.percentile(0.95)
+        failure_rate = domain.rate(lambda status: status == 429 or status >= 500)
+
+        if failure_rate > self.error_rate:
+            domain.concurrency = max(self.min_concurrency, domain.concurrency // 2)
+            domain.delay = min(self.max_delay, max(domain.delay * 2, 0.5))
+            # judge the new setting on its own responses, not on the ones that triggered the decrease
+            domain.statuses.clear()
+            domain.latencies.clear()
+        elif p95 > self.target_latency or (p50 and p95 > self.tail_ratio * p50):
+            domain.concurrency = max(self.min_concurrency, domain.concurrency - 1)
+            domain.latencies.clear()
+        elif time.monotonic() >= domain.retry_after_until:
+            domain.concurrency = min(self.max_concurrency, domain.concurrency + 1)
+            domain.delay = max(self.min_delay, domain.delay * 0.5 if domain.delay > 0.05 else 0.0)
+
+        snapshot = domain.snapshot()
+        for name, value in snapshot.items():
+            self.stats.set_value(f'adaptive_concurrency/{key}/{name}', value, spider=spider)
+        if (domain.concurrency, domain.delay) != previous:
+            spider.logger.debug(f"Adaptive concurrency for {key}: {snapshot}")
+
+    @staticmethod
+    def _retry_after(response):
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+
+        value = value.decode('latin-1').strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
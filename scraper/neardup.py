@@ -0,0 +1,157 @@
+import re
+import hashlib
+import logging
+from dbservices.redisservice import RedisService
+
+logging.basicConfig(level=logging.INFO)
+
+WORD = re.compile(r'\w+')
+SIMHASH_BITS = 64
+
+
+def simhash(text: str, shingle_size: int = 4) -> tuple[int, int]:
+    """
+    64 bit SimHash of the word shingles of a text. Texts that share most of their shingles get fingerprints
+    that differ in few bits.
+    :param text: clean article text
+    :param shingle_size: number of words per shingle
+    :return: tuple of (fingerprint, number of shingles)
+    """
+    words = WORD.findall(text.lower())
+    shingles = [' '.join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))]
+    hashes = [hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).hexdigest() for shingle in shingles]
+
+    # majority vote of every bit position, counted column-wise over the binary strings of the shingle hashes
+    columns = zip(*(format(int(value, 16), '064b') for value in hashes))
+    bits = ''.join('1' if column.count('1') * 2 > len(hashes) else '0' for column in columns)
+    return int(bits, 2), len(shingles)
+
+
+class NearDuplicateIndex:
+    """
+    SimHash index of the stored articles, kept compactly in redis, that links syndicated and updated copies of
+    a story to the first stored article instead of having them summarized and embedded again.
+
+    Two fingerprints within `max_distance` differing bits are near-duplicates. The 64 bits are split into
+    `max_distance + 1` bands; near-duplicates agree on at least one band, so only the articles sharing a band
+    value are compared. Every band bucket is a redis string of packed 8 byte fingerprints under
+    `<redis_key>:<band>:<value>`, and `<redis_key>:canonical` maps a fingerprint to the url fingerprint of its
+    article.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, redis_key: str = 'near-duplicates', max_distance: int = 6, min_shingles: int = 50,
+                 shingle_size: int = 4):
+        self.redis_key = redis_key
+        self.max_distance = max_distance
+        self.min_shingles = min_shingles
+        self.shingle_size = shingle_size
+        self.stats = {'indexed': 0, 'near_duplicates': 0, 'too_short': 0}
+
+        bands = max_distance + 1
+        width, extra = divmod(SIMHASH_BITS, bands)
+        self._bands, offset = [], 0
+        for band in range(bands):
+            band_width = width + (band < extra)
+            self._bands.append((offset, (1 << band_width) - 1))
+            offset += band_width
+
+    @property
+    def similarity_threshold(self) -> float:
+        """
+        share of identical fingerprint bits above which two articles are near-duplicates
+        """
+        return 1 - self.max_distance / SIMHASH_BITS
+
+    def link(self, documents: list[dict]) -> None:
+        """
+        Fingerprint a batch of news documents and set `duplicate_of` to the url fingerprint of the canonical
+        article on the near-duplicates, comparing against the index and the earlier documents of the batch
+        in one redis round trip. Documents get a `simhash` field (hex) unless their text is too short.
+        :param documents: news documents with `raw_content` and `url_fingerprint`
+        :return: None
+        """
+        fingerprints = []
+        for document in documents:
+            content = document.get('raw_content')
+            fingerprint, shingles = simhash(content, self.shingle_size) if isinstance(content, str) else (0, 0)
+            if shingles < self.min_shingles:
+                self.stats['too_short'] += 1
+                fingerprints.append(None)
+                continue
+            document['simhash'] = f'{fingerprint:016x}'
+            fingerprints.append(fingerprint)
+
+        client = RedisService.get_client()
+        pipe = client.pipeline(transaction=False)
+        for fingerprint in fingerprints:
+            if fingerprint is None:
+                continue
+            for key in self._band_keys(fingerprint):
+                pipe.get(key)
+        buckets = iter(pipe.execute())
+
+        # earlier documents of the batch are candidates too, keyed by band like the redis buckets
+        batch_buckets, batch_canonical, matches = {}, {}, {}
+        for index, fingerprint in enumerate(fingerprints):
+            if fingerprint is None:
+                continue
+
+            keys = self._band_keys(fingerprint)
+            candidates = set()
+            for key in keys:
+                packed = next(buckets) or b''
+                candidates.update(int.from_bytes(packed[i:i + 8], 'big') for i in range(0, len(packed), 8))
+                candidates.update(batch_buckets.get(key, ()))
+
+            nearest = min(candidates, key=lambda candidate: (candidate ^ fingerprint).bit_count(), default=None)
+            if nearest is not None and (nearest ^ fingerprint).bit_count() <= self.max_distance:
+                matches[index] = nearest
+                continue
+
+            for key in keys:
+                batch_buckets.setdefault(key, []).append(fingerprint)
+            batch_canonical.setdefault(fingerprint, documents[index]['url_fingerprint'])
+
+        stored = list({nearest for nearest in matches.values() if nearest not in batch_canonical})
+        canonical = {}
+        if stored:
+            values = client.hmget(f'{self.redis_key}:canonical', [self._pack(nearest) for nearest in stored])
+            canonical = {nearest: value.decode() for nearest, value in zip(stored, values) if value}
+        canonical.update(batch_canonical)
+
+        for index, nearest in matches.items():
+            duplicate_of = canonical.get(nearest)
+            # a re-crawl of the same url is left to the unique url fingerprint index
+            if duplicate_of and duplicate_of != documents[index]['url_fingerprint']:
+                documents[index]['duplicate_of'] = duplicate_of
+                self.stats['near_duplicates'] += 1
+
+    def add(self, documents: list[dict]) -> None:
+        """
+        Index the fingerprinted canonical documents that were stored, in one redis round trip
+        :param documents: news documents processed by `link`
+        :return: None
+        """
+        documents = [document for document in documents
+                     if document.get('simhash') and not document.get('duplicate_of')]
+        if not documents:
+            return
+
+        pipe = RedisService.get_client().pipeline(transaction=False)
+        for document in documents:
+            fingerprint = int(document['simhash'], 16)
+            for key in self._band_keys(fingerprint):
+                pipe.append(key, self._pack(fingerprint))
+            pipe.hsetnx(f'{self.redis_key}:canonical', self._pack(fingerprint), document['url_fingerprint'])
+        pipe.execute()
+        self.stats['indexed'] += len(documents)
+
+    def _band_keys(self, fingerprint):
+        return [f'{self.redis_key}:{band}:{(fingerprint >> offset) & mask:x}'
+                for band, (offset, mask) in enumerate(self._bands)]
+
+    @staticmethod
+    def _pack(fingerprint):
+        return fingerprint.to_bytes(8, 'big')
@@ -0,0 +1,142 @@
+import logging
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from urllib.parse import urljoin
+from config import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ParsedPage(NamedTuple):
+    title: Optional[str]
+    paragraphs: list[str]
+    timestamp: Optional[str]
+    links: list[str]
+
+
+class HtmlBackend:
+    """
+    Extracts the title, paragraph texts, publication timestamp and absolute links of a webpage in a single
+    parse. `timestamp_selector` is a CSS selector; the timestamp is read from `timestamp_attribute` when it is
+    set and from the element text otherwise.
+    """
+    name = None
+
+    def __init__(self, timestamp_selector: str = None, timestamp_attribute: str = None):
+        self.timestamp_selector = timestamp_selector
+        self.timestamp_attribute = timestamp_attribute
+
+    def parse(self, html: str, url: str) -> ParsedPage:
+        raise NotImplementedError
+
+
+class SelectolaxBackend(HtmlBackend):
+    name = 'selectolax'
+
+    def __init__(self, timestamp_selector: str = None, timestamp_attribute: str = None):
+        from selectolax.lexbor import LexborHTMLParser
+        super().__init__(timestamp_selector, timestamp_attribute)
+        self._parser = LexborHTMLParser
+
+    def parse(self, html: str, url: str) -> ParsedPage:
+        tree = self._parser(html)
+
+        title = tree.css_first('title')
+        timestamp = None
+        if self.timestamp_selector:
+            node = tree.css_first(self.timestamp_selector)
+            if node is not None:
+                timestamp = node.attributes.get(self.timestamp_attribute) if self.timestamp_attribute \
+                    else node.text()
+
+        return ParsedPage(
+            title=title.text() if title is not None else None,
+            paragraphs=[node.text() for node in tree.css('p')],
+            timestamp=timestamp,
+            links=[urljoin(url, node.attributes['href']) for node in tree.css('a[href]')
+                   if node.attributes['href']]
+        )
+
+
+class LxmlBackend(HtmlBackend):
+    name = 'lxml'
+
+    def __init__(self, timestamp_selector: str = None, timestamp_attribute: str = None):
+        from lxml import etree, html as lxml_html
+        from cssselect import GenericTranslator
+        super().__init__(timestamp_selector, timestamp_attribute)
+        self._from_string = lxml_html.fromstring
+
+        # compile every selector once, they are reused for every page
+        self._title = etree.XPath('//title')
+        self._paragraphs = etree.XPath('//p')
+        self._links = etree.XPath('//a/@href')
+        self._timestamp = etree.XPath(GenericTranslator().css_to_xpath(timestamp_selector)) \
+            if timestamp_selector else None
+
+    def parse(self, html: str, url: str) -> ParsedPage:
+        try:
+            tree = self._from_string(html)
+        except ValueError:
+            # lxml refuses str input that carries an xml encoding declaration
+            tree = self._from_string(html.encode('utf-8'))
+
+        title = self._title(tree)
+        timestamp = None
+        if self._timestamp is not None:
+            nodes = self._timestamp(tree)
+            if nodes:
+                timestamp = nodes[0].get(self.timestamp_attribute) if self.timestamp_attribute \
+                    else nodes[0].text_content()
+
+        return ParsedPage(
+            title=title[0].text_content() if title else None,
+            paragraphs=[node.text_content() for node in self._paragraphs(tree)],
+            timestamp=timestamp,
+            links=[urljoin(url, str(href)) for href in self._links(tree) if href]
+        )
+
+
+class BeautifulSoupBackend(HtmlBackend):
+    name = 'bs4'
+
+    def parse(self, html: str, url: str) -> ParsedPage:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, 'html.parser')
+
+        timestamp = None
+        if self.timestamp_selector:
+            node = soup.select_one(self.timestamp_selector)
+            if node is not None:
+                timestamp = node.get(self.timestamp_attribute) if self.timestamp_attribute else node.text
+
+        return ParsedPage(
+            title=soup.title.text if soup.title else None,
+            paragraphs=[node.text for node in soup.find_all('p')],
+            timestamp=timestamp,
+            links=[urljoin(url, node['href']) for node in soup.find_all('a', href=True) if node['href']]
+        )
+
+
+BACKENDS = {backend.name: backend for backend in (SelectolaxBackend, LxmlBackend, BeautifulSoupBackend)}
+
+
+@lru_cache(maxsize=None)
+def get_backend(name: str = config.HTML_PARSER_BACKEND, timestamp_selector: str = None,
+                timestamp_attribute: str = None) -> HtmlBackend:
+    """
+    Returns a cached extraction backend. With `name='auto'` the fastest installed backend is used
+    (selectolax, then lxml, then BeautifulSoup's html.parser).
+    :param name: one of 'auto', 'selectolax', 'lxml', 'bs4'
+    :param timestamp_selector: CSS selector of the element holding the publication timestamp
+    :param timestamp_attribute: attribute holding the timestamp, the element text is used when None
+    :return: HtmlBackend
+    """
+    names = list(BACKENDS) if name == 'auto' else [name]
+    for backend_name in names:
+        try:
+            return BACKENDS[backend_name](timestamp_selector, timestamp_attribute)
+        except ImportError:
+            logger.warning(f"HTML parser backend '{backend_name}' is not installed")
+    raise ValueError(f"No usable HTML parser backend for '{name}'")
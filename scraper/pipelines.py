@@ -3,11 +3,183 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import logging
+from scrapy import signals
+from pymongo.errors import BulkWriteError
+from twisted.internet import defer, task, threads
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scraper.urls import url_fingerprint
+from scraper.neardup import NearDuplicateIndex
+from dbservices.mongoservice import MongoService
+
+logging.basicConfig(level=logging.INFO)
 
 
 class ScraperPipeline:
+    """
+    Buffers the news items yielded by the spiders and writes them to MongoDB in unordered `insert_many`
+    batches. A batch is flushed when it reaches `MONGO_PIPELINE_BATCH_SIZE` items, when the oldest buffered
+    item is older than `MONGO_PIPELINE_FLUSH_INTERVAL` seconds, and when the spider closes. Inserts run in
+    the reactor thread pool so a slow database never blocks the downloader. A unique index on the url
+    fingerprint keeps the same article from being stored twice, and a SimHash index of the content links
+    near-duplicates published under other urls to their canonical article with `duplicate_of`.
+    """
+
+    DUPLICATE_KEY_ERROR = 11000
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, collection_name: str, batch_size: int, flush_interval: float, max_pending: int,
+                 stats=None, near_duplicates: NearDuplicateIndex = None):
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.stats = stats
+        self.near_duplicates = near_duplicates
+
+        self._buffer = []
+        self._pending = set()
+        self._flush_loop = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pipeline = cls(
+            collection_name=settings.get('MONGO_PIPELINE_COLLECTION', 'raw-news'),
+            batch_size=settings.getint('MONGO_PIPELINE_BATCH_SIZE', 100),
+            flush_interval=settings.getfloat('MONGO_PIPELINE_FLUSH_INTERVAL', 10.0),
+            max_pending=settings.getint('MONGO_PIPELINE_MAX_PENDING_BATCHES', 4),
+            stats=crawler.stats,
+            near_duplicates=NearDuplicateIndex(
+                redis_key=settings.get('NEAR_DUPLICATE_REDIS_KEY', 'near-duplicates'),
+                max_distance=settings.getint('NEAR_DUPLICATE_MAX_DISTANCE', 6),
+                min_shingles=settings.getint('NEAR_DUPLICATE_MIN_SHINGLES', 50)
+            ) if settings.getbool('NEAR_DUPLICATE_ENABLED', True) else None
+        )
+        crawler.signals.connect(pipeline.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def spider_opened(self, spider):
+        collection_name = getattr(spider, 'db_collection_name', self.collection_name)
+        d = threads.deferToThread(
+            MongoService.create_index, collection_name, 'url_fingerprint', unique=True,
+            partialFilterExpression={'url_fingerprint': {'$exists': True}})
+        d.addErrback(
+            lambda failure: self.logger.error(f"Unable to create url_fingerprint index: {failure.getErrorMessage()}"))
+
+        self._flush_loop = task.LoopingCall(self._flush, spider)
+        self._flush_loop.start(self.flush_interval, now=False)
+
+        if self.near_duplicates and self.stats is not None:
+            self.stats.set_value('near_duplicates/max_distance', self.near_duplicates.max_distance)
+            self.stats.set_value('near_duplicates/threshold_similarity',
+                                 round(self.near_duplicates.similarity_threshold, 4))
+
+    def spider_closed(self, spider):
+        """
+        Stop the periodic flush and write whatever is left in the buffer. Scrapy waits on the returned
+        deferred before closing the spider.
+        """
+        if self._flush_loop and self._flush_loop.running:
+            self._flush_loop.stop()
+        self._flush(spider)
+        return defer.DeferredList(list(self._pending), consumeErrors=True)
+
     def process_item(self, item, spider):
+        document = ItemAdapter(item).asdict()
+        document['url_fingerprint'] = url_fingerprint(document['url']).hex()
+        self._buffer.append(document)
+
+        if len(self._buffer) >= self.batch_size:
+            self._flush(spider)
+
+        # apply back-pressure to the scraper when MongoDB cannot keep up with the crawl
+        if len(self._pending) >= self.max_pending:
+            self._inc_stat('mongo_pipeline/backpressure')
+            return defer.DeferredList(list(self._pending), consumeErrors=True).addCallback(lambda _: item)
+
         return item
+
+    def _flush(self, spider):
+        """
+        Hand the buffered documents to a worker thread for insertion
+        :param spider: spider that produced the items
+        :return: None
+        """
+        if not self._buffer:
+            return
+
+        batch, self._buffer = self._buffer, []
+        collection_name = getattr(spider, 'db_collection_name', self.collection_name)
+
+        d = threads.deferToThread(self._insert_batch, collection_name, batch)
+        d.addCallback(self._on_batch_inserted, batch, spider)
+        d.addErrback(self._on_batch_failed, batch, spider)
+        d.addBoth(self._on_batch_done, d)
+        self._pending.add(d)
+
+    def _insert_batch(self, collection_name, batch):
+        """
+        Link the near-duplicates of a batch, then insert it without stopping at the first failed document.
+        Returns the indexes of the documents that were rejected as duplicates and of the ones that failed
+        for any other reason.
+        """
+        if self.near_duplicates:
+            try:
+                self.near_duplicates.link(batch)
+            except Exception as e:
+                self.logger.error(f"Near-duplicate lookup of {len(batch)} items failed: {str(e)}")
+
+        duplicates, failed = set(), set()
+        try:
+            MongoService.insert_data(collection_name=collection_name, data=batch, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            duplicates = {error['index'] for error in errors
+                          if error.get('code') == ScraperPipeline.DUPLICATE_KEY_ERROR}
+            failed = {error['index'] for error in errors} - duplicates
+
+        if self.near_duplicates:
+            try:
+                self.near_duplicates.add([doc for index, doc in enumerate(batch)
+                                          if index not in duplicates and index not in failed])
+            except Exception as e:
+                self.logger.error(f"Near-duplicate indexing of {len(batch)} items failed: {str(e)}")
+        return duplicates, failed
+
+    def _on_batch_inserted(self, result, batch, spider):
+        duplicate_indexes, failed_indexes = result
+        stored = [doc for index, doc in enumerate(batch) if index not in failed_indexes]
+
+        self._inc_stat('mongo_pipeline/batches')
+        self._inc_stat('mongo_pipeline/inserted', len(stored) - len(duplicate_indexes))
+        self._inc_stat('mongo_pipeline/duplicates', len(duplicate_indexes))
+        self._inc_stat('mongo_pipeline/failed', len(failed_indexes))
+        self._inc_stat('near_duplicates/linked', sum(1 for index, doc in enumerate(batch)
+                                                     if 'duplicate_of' in doc and index not in failed_indexes))
+
+        # only urls that are in the database are marked as visited
+        d = threads.deferToThread(spider.mark_urls_visited, [doc['url'] for doc in stored])
+        d.addErrback(self._on_mark_visited_failed, stored)
+        return d
+
+    def _on_batch_failed(self, failure, batch, spider):
+        self.logger.error(f"Insert of {len(batch)} items into MongoDB failed: {failure.getErrorMessage()}")
+        self._inc_stat('mongo_pipeline/failed', len(batch))
+
+    def _on_mark_visited_failed(self, failure, stored):
+        # the batch is in MongoDB, the urls are only crawled again and rejected by the unique index
+        self.logger.error(f"Marking {len(stored)} stored urls as visited failed: {failure.getErrorMessage()}")
+        self._inc_stat('mongo_pipeline/mark_visited_failed', len(stored))
+
+    def _on_batch_done(self, result, d):
+        self._pending.discard(d)
+        return result
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
@@ -19,8 +19,9 @@ NEWSPIDER_MODULE = "scraper.spiders"
 # Obey robots.txt rules
 ROBOTSTXT_OBEY = True
 
-# Configure maximum concurrent requests performed by Scrapy (default: 16)
-#CONCURRENT_REQUESTS = 32
+# Configure maximum concurrent requests performed by Scrapy (default: 16). Leaves room for every
+# outlet to reach ADAPTIVE_CONCURRENCY_MAX at the same time.
+CONCURRENT_REQUESTS = 64
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
@@ -28,7 +29,8 @@ ROBOTSTXT_OBEY = True
 # DOWNLOAD_DELAY = 3
 
 # The download delay setting will honor only one of:
-# CONCURRENT_REQUESTS_PER_DOMAIN = 8
+# Starting concurrency of every domain, tuned from there by AdaptiveConcurrencyMiddleware
+CONCURRENT_REQUESTS_PER_DOMAIN = 4
 #CONCURRENT_REQUESTS_PER_IP = 16
 
 # Disable cookies (enabled by default)
@@ -51,9 +53,35 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "scraper.middlewares.ScraperDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+   # runs after HttpCompressionMiddleware (590) has decoded the body
+   "scraper.middlewares.RevalidationCacheMiddleware": 580,
+   # runs before RetryMiddleware (550) so it sees the 429 and 5xx responses that get retried
+   "scraper.middlewares.AdaptiveConcurrencyMiddleware": 560,
+}
+
+# Per-domain concurrency and delay driven by live latency and error rates, see AdaptiveConcurrencyMiddleware
+ADAPTIVE_CONCURRENCY_ENABLED = True
+ADAPTIVE_CONCURRENCY_MIN = 1
+ADAPTIVE_CONCURRENCY_MAX = 16
+# Bounds of the download delay in seconds
+ADAPTIVE_CONCURRENCY_MIN_DELAY = 0.0
+ADAPTIVE_CONCURRENCY_MAX_DELAY = 60.0
+# p95 download latency in seconds above which a domain is considered saturated
+ADAPTIVE_CONCURRENCY_TARGET_LATENCY = 2.0
+# p95/p50 latency ratio above which requests are considered queueing on the server
+ADAPTIVE_CONCURRENCY_TAIL_RATIO = 4.0
+# Share of 429/5xx responses above which concurrency is halved
+ADAPTIVE_CONCURRENCY_ERROR_RATE = 0.05
+# Number of recent responses the percentiles and rates are computed over
+ADAPTIVE_CONCURRENCY_WINDOW = 50
+# Number of responses between two adjustments of a domain
+ADAPTIVE_CONCURRENCY_INTERVAL = 10
+
+# ETag / Last-Modified revalidation cache shared with the soup crawlers. Overrides HTTP_CACHE_ENABLED
+# and HTTP_CACHE_DIR from the environment when set.
+#REVALIDATION_CACHE_ENABLED = True
+#REVALIDATION_CACHE_DIR = ".httpcache"
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -63,13 +91,31 @@ ROBOTSTXT_OBEY = True
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "scraper.pipelines.ScraperPipeline": 300,
-#}
+ITEM_PIPELINES = {
+   "scraper.pipelines.ScraperPipeline": 300,
+}
+
+# Batch MongoDB inserts made by the item pipeline
+MONGO_PIPELINE_COLLECTION = "raw-news"
+# Number of items written per insert_many call
+MONGO_PIPELINE_BATCH_SIZE = 100
+# Maximum number of seconds an item waits in the buffer before it is written
+MONGO_PIPELINE_FLUSH_INTERVAL = 10
+# Number of in-flight batches before the pipeline slows down the scraper
+MONGO_PIPELINE_MAX_PENDING_BATCHES = 4
+
+# Link near-duplicate articles (syndicated or updated copies under other urls) to their canonical article
+NEAR_DUPLICATE_ENABLED = True
+# Maximum number of differing SimHash bits between near-duplicates, 6 of 64 bits is ~90% similarity
+NEAR_DUPLICATE_MAX_DISTANCE = 6
+# Articles with fewer word shingles are too short for a reliable fingerprint
+NEAR_DUPLICATE_MIN_SHINGLES = 50
+NEAR_DUPLICATE_REDIS_KEY = "near-duplicates"
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
-AUTOTHROTTLE_ENABLED = True
+# Replaced by AdaptiveConcurrencyMiddleware, both would fight over the slot delays
+AUTOTHROTTLE_ENABLED = False
 # The initial download delay
 AUTOTHROTTLE_START_DELAY = 3
 # The maximum download delay to be set in case of high latencies
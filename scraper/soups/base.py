@@ -1,95 +1,314 @@
+import asyncio
 import logging
-import re
-import time
-import requests
-from bs4 import BeautifulSoup
-from collections import deque
-from urllib.parse import urljoin
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pymongo.errors import BulkWriteError
+from config import config
+from scraper.urls import canonicalize_url
+from scraper.parsers import ParsedPage, get_backend
+from scraper.visited import VisitedUrlStore
+from scraper.neardup import NearDuplicateIndex
+from scraper.frontier import CrawlFrontier
+from scraper.feeds import CrawlCheckpoint, parse_feed, is_fresh
+from scraper.httpcache import RevalidationCache
+from scraper.soups.fetcher import AsyncFetcher
+from scraper.spiders.base import SpidersEnum
+from dbservices.mongoservice import MongoService
 from dbservices.redisservice import RedisService
 
 logging.basicConfig(level=logging.INFO)
 
 
 class BaseSoup:
+    # outlet the crawler scrapes, which provides its url classifier, feeds and boilerplate rules
+    outlet: SpidersEnum = None
+    # where the extraction backend finds the publication timestamp of an article
+    timestamp_selector = None
+    timestamp_attribute = None
 
-    def __init__(self, delay_between_requests=5):
+    def __init__(self, requests_per_second=config.SOUP_REQUESTS_PER_SECOND,
+                 concurrency_per_host=config.SOUP_CONCURRENCY_PER_HOST,
+                 parse_workers=config.SOUP_PARSE_WORKERS):
         self.name = 'BaseSoup'
         self.base_url = ''
         self.db_collection_name = 'raw-news'
         self.redis_key = 'base-spider-topic'
         self.redis_client = RedisService.get_client()
-        self.politics_url_pattern = r''
         self.logger = logging.getLogger(__name__)
 
-        self.max_urls = 30
+        self.max_urls = config.SOUP_MAX_URLS
+        self.batch_size = 50
         self.processed_urls = 0
-        self.urls_to_scrape = deque()
-        self.delay_between_requests = delay_between_requests
+        self.requests_per_second = requests_per_second
+        self.concurrency_per_host = concurrency_per_host
+        self.parse_workers = parse_workers
+        self._visited_store = None
+        self._frontier = None
+        # the frontier database is used from one thread at a time, off the event loop
+        self._frontier_executor = None
+        self.near_duplicates = NearDuplicateIndex()
 
     def scrape(self):
         """
-        Start the scraping process
+        Start the scraping process. Runs the asyncio crawl to completion on the calling thread.
         """
-        raise NotImplementedError
+        asyncio.run(self._scrape())
 
-    def _get_page_content(self, url):
-        try:
-            self.logger.info(f"Fetching content from {url}")
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            return response.text
-        except requests.RequestException as e:
-            self.logger.error(f"Error fetching content from {url}: {str(e)}")
-            return None
+    async def _scrape(self):
+        cache = RevalidationCache() if config.HTTP_CACHE_ENABLED else None
+        async with AsyncFetcher(requests_per_second=self.requests_per_second,
+                                concurrency_per_host=self.concurrency_per_host, cache=cache) as fetcher:
+            self._frontier_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='frontier')
+            try:
+                started, feeds_read = datetime.now(timezone.utc), False
+
+                # an interrupted crawl resumes its queued urls instead of rediscovering them
+                if not await self._in_frontier_thread(self.frontier.resume):
+                    if self.outlet.discovery_mode == 'feeds':
+                        feeds_read = await self._discover_from_feeds(fetcher)
+                    if not feeds_read:
+                        await self._discover_urls(fetcher, self.base_url)
+
+                queued = await self._in_frontier_thread(self.frontier.count)
+                self.logger.info(f"Processing news URLs; length: {queued}")
+                await self._process_urls(fetcher)
+
+                if feeds_read:
+                    await asyncio.to_thread(CrawlCheckpoint(self.redis_key).set, started)
+            finally:
+                await self._in_frontier_thread(self.frontier.close)
+                self._frontier_executor.shutdown()
+                self._frontier = self._frontier_executor = None
+
+        if cache:
+            self.logger.info(f"Revalidation cache stats: {cache.stats}, hit rate {cache.hit_rate:.2%}")
+        self.logger.info(f"{self.name} processed {self.processed_urls} articles. Fetcher stats: {fetcher.stats}. "
+                         f"Visited-url Bloom filter stats: {self.visited_store.stats}. "
+                         f"Url classifier stats: {dict(self.url_classifier.stats)}. "
+                         f"Near-duplicate stats at {self.near_duplicates.similarity_threshold:.2%} similarity: "
+                         f"{self.near_duplicates.stats}")
+
+    async def _get_page_content(self, fetcher, url):
+        """
+        Fetch a webpage, following redirects
+        :param fetcher: AsyncFetcher used for the crawl
+        :param url: web url to be fetched
+        :return: tuple of the canonical url the page was served from and its content (None on error)
+        """
+        # only hub pages are revalidated: an article is skipped as visited once it is stored, and a 304 for it
+        # would hide an article whose insert failed on the previous run
+        final_url, content = await fetcher.fetch(url, revalidate=not self.url_classifier.accepts(url))
+        return self._normalize_url(final_url), content
 
-    def _discover_urls(self, url):
+    async def _discover_urls(self, fetcher, url):
         url = self._normalize_url(url)
         self.logger.info(f"Discovering URLs from: {url}")
 
-        content = self._get_page_content(url)
+        request_url = url
+        url, content = await self._get_page_content(fetcher, url)
         if not content:
             return
 
-        soup = BeautifulSoup(content, 'html.parser')
+        # an unchanged landing page links to nothing that was not discovered on the previous crawl
+        if request_url in fetcher.revalidated and not self.url_classifier.accepts(url):
+            self.logger.info(f"{url} not modified since the last crawl, skipping discovery")
+            return
+
+        page = await asyncio.to_thread(self._extract_page, url, content)
 
-        for link in soup.find_all('a', href=True):
-            full_url = link['href'] if link['href'].startswith('http') else urljoin(self.base_url, link['href'])
+        candidate_urls = []
+        for full_url in page.links:
             full_url = self._normalize_url(full_url)
 
             self.logger.debug(f"Discovered URL: {full_url}")
 
-            if re.match(self.politics_url_pattern, full_url) and not self._is_url_visited(
-                    full_url) and full_url not in self.urls_to_scrape:
-                self.urls_to_scrape.append(full_url)
-                self.logger.info(f"Added URL to scrape: {full_url}")
+            if self.url_classifier.accepts(full_url) and full_url not in self.frontier:
+                candidate_urls.append(full_url)
+
+        # a landing page that is also an article is saved from the same parse
+        if self.url_classifier.accepts(url):
+            candidate_urls.insert(0, url)
+
+        # resolve all the candidate links of the page in a single redis round trip
+        unvisited_urls = await asyncio.to_thread(self._filter_unvisited, candidate_urls)
+        if url in unvisited_urls:
+            unvisited_urls.remove(url)
+            await asyncio.to_thread(self._save_items, [self._build_item(url, page)])
+            self.processed_urls += 1
+
+        for full_url in await self._in_frontier_thread(self.frontier.push, unvisited_urls, 1):
+            self.logger.info(f"Added URL to scrape: {full_url}")
+
+        queued = await self._in_frontier_thread(self.frontier.count)
+        self.logger.info(f"Total URLs to scrape: {queued}")
+
+    async def _discover_from_feeds(self, fetcher):
+        """
+        Queue the articles of the outlet news sitemaps and RSS feeds that changed since the last successful
+        crawl, following fresh child sitemaps of sitemap indexes
+        :param fetcher: AsyncFetcher used for the crawl
+        :return: bool, whether any feed could be read
+        """
+        last_crawl = await asyncio.to_thread(CrawlCheckpoint(self.redis_key).get)
+        self.logger.info(f"Discovering {self.name} articles from feeds modified since {last_crawl}")
+
+        feed_urls, candidate_urls, read = list(self.outlet.feed_urls), [], False
+        while feed_urls:
+            results = await asyncio.gather(*(fetcher.fetch(feed_url) for feed_url in feed_urls))
+            feed_urls = []
+            for feed_url, content in results:
+                if not content:
+                    continue
+
+                feed = parse_feed(content)
+                read = read or bool(feed.entries or feed.sitemaps)
+                feed_urls += [sitemap.url for sitemap in feed.sitemaps if is_fresh(sitemap, last_crawl)]
+                candidate_urls += [self._normalize_url(entry.url) for entry in feed.entries
+                                   if is_fresh(entry, last_crawl)]
+
+        if not read:
+            self.logger.warning(f"No feed of {self.name} could be read, following links from {self.base_url}")
+            return False
 
-        self.logger.info(f"Total URLs to scrape: {len(self.urls_to_scrape)}")
+        candidate_urls = [url for url in candidate_urls
+                          if self.url_classifier.accepts(url) and url not in self.frontier]
+        unvisited_urls = await asyncio.to_thread(self._filter_unvisited, candidate_urls)
+        for full_url in await self._in_frontier_thread(self.frontier.push, unvisited_urls, 1):
+            self.logger.info(f"Added URL to scrape: {full_url}")
 
-    def _process_urls(self):
+        queued = await self._in_frontier_thread(self.frontier.count)
+        self.logger.info(f"Total URLs to scrape: {queued}")
+        return True
+
+    async def _process_urls(self, fetcher):
         """
-        Process the discovered URLs
+        Process the queued URLs, freshest first. Pages are fetched concurrently on the event loop, parsed in a
+        process pool (or the default thread pool when `parse_workers` is 0) and saved to MongoDB in batches.
+        Redis, MongoDB and frontier calls run in threads so they never block the fetches in flight.
+        Urls left in the frontier when `max_urls` is reached are crawled by the next run.
         """
-        while self.urls_to_scrape and self.processed_urls <= self.max_urls:
-            url = self.urls_to_scrape.popleft()
-            self._parse(url)
-            time.sleep(self.delay_between_requests)
+        loop = asyncio.get_running_loop()
+        executor = ProcessPoolExecutor(max_workers=self.parse_workers) if self.parse_workers else None
+        in_flight, batch = 0, []
+
+        async def worker():
+            nonlocal in_flight, batch
+            while self.processed_urls + in_flight < self.max_urls:
+                queued = await self._in_frontier_thread(self.frontier.pop)
+                if not queued:
+                    break
+
+                url, _ = queued[0]
+                in_flight += 1
+                try:
+                    news_item = await self._fetch_and_parse(fetcher, loop, executor, url)
+                finally:
+                    in_flight -= 1
+                await self._in_frontier_thread(self.frontier.done, [url])
+
+                if news_item:
+                    self.processed_urls += 1
+                    batch.append(news_item)
+
+                if len(batch) >= self.batch_size:
+                    items, batch = batch, []
+                    await asyncio.to_thread(self._save_items, items)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency_per_host)))
+            if batch:
+                await asyncio.to_thread(self._save_items, batch)
+        finally:
+            if executor:
+                executor.shutdown()
 
-    def _parse(self, url: str) -> None:
+    async def _fetch_and_parse(self, fetcher, loop, executor, url):
+        url = self._normalize_url(url)
+        self.logger.info(f"Scraping {self.name} article: {url}")
+
+        url, content = await self._get_page_content(fetcher, url)
+        if not content or await asyncio.to_thread(self._is_url_visited, url):
+            return None
+
+        try:
+            return await loop.run_in_executor(executor, self._parse, url, content)
+        except Exception as e:
+            self.logger.error(f"Error parsing {url}: {str(e)}")
+            return None
+
+    async def _in_frontier_thread(self, method, *args):
         """
-        Parse the scraped webpage for processing. The body of the webpage is only passed if it is a
-        politics webpage. Insert data into MongoDB and mark url as visited in the cache
+        Run a blocking frontier call on the frontier thread, so the event loop keeps fetching meanwhile
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._frontier_executor, method, *args)
+
+    @classmethod
+    def _parse(cls, url: str, content: str) -> dict | None:
+        """
+        Parse the scraped webpage into a news item dictionary. The body of the webpage is only passed if it
+        is a politics webpage. Runs in the parse worker pool, so it must not touch instance state.
+        """
+        return cls._build_item(url, cls._extract_page(url, content))
+
+    @classmethod
+    def _extract_page(cls, url: str, content: str) -> ParsedPage:
+        """
+        Extract title, paragraphs, timestamp and links of a webpage in one pass of the configured backend
+        """
+        return get_backend(config.HTML_PARSER_BACKEND, cls.timestamp_selector, cls.timestamp_attribute).parse(
+            content, url)
+
+    @classmethod
+    def _article_text(cls, page: ParsedPage) -> str:
+        """
+        Clean article text of an extracted page, with the outlet boilerplate removed
+        """
+        return cls.outlet.extractor.extract(page.paragraphs)
+
+    @classmethod
+    def _build_item(cls, url: str, page: ParsedPage) -> dict | None:
+        """
+        Build the news item dictionary of an article from its extracted page
         """
         raise NotImplementedError
 
+    def _save_items(self, items: list[dict]) -> None:
+        """
+        Insert a batch of news items into MongoDB, linking near-duplicates of stored articles with
+        `duplicate_of`, and mark the urls that were saved as visited in the cache
+        """
+        try:
+            self.near_duplicates.link(items)
+        except Exception as e:
+            self.logger.error(f"Near-duplicate lookup of {len(items)} items failed: {str(e)}")
+
+        failed_indexes, duplicate_indexes = set(), set()
+        try:
+            MongoService.insert_data(collection_name=self.db_collection_name, data=items, ordered=False)
+        except BulkWriteError as e:
+            # duplicates of stored articles are still marked as visited
+            errors = e.details.get('writeErrors', [])
+            duplicate_indexes = {error['index'] for error in errors if error.get('code') == 11000}
+            failed_indexes = {error['index'] for error in errors} - duplicate_indexes
+        except Exception as e:
+            self.logger.error(f"Insert of {len(items)} items into MongoDB failed: {str(e)}")
+            return
+
+        try:
+            self.near_duplicates.add([item for index, item in enumerate(items)
+                                      if index not in failed_indexes and index not in duplicate_indexes])
+        except Exception as e:
+            self.logger.error(f"Near-duplicate indexing of {len(items)} items failed: {str(e)}")
+
+        self._mark_urls_visited([item['url'] for index, item in enumerate(items) if index not in failed_indexes])
+
     def _is_url_visited(self, url):
         """
         check if a web url has been visited
         :param url: web url to be checked
         :return: bool (true or false)
         """
-        if self.redis_key == 'base-spider-topic':
-            raise ValueError(f"Redis key cannot be  '{self.redis_key}'. Change it to proceed.")
-        return self.redis_client.sismember(self.redis_key, url)
+        return self._filter_unvisited([url]) == []
 
     def _mark_url_visited(self, url):
         """
@@ -97,15 +316,58 @@ class BaseSoup:
         :param url: web url to be marked
         :return: None
         """
+        self._mark_urls_visited([url])
+
+    def _filter_unvisited(self, urls):
+        """
+        check a batch of web urls against the Bloom filter, confirming possible hits in a single redis round trip
+        :param urls: web urls to be checked
+        :return: list of the urls that have not been visited, in their original order
+        """
+        return self.visited_store.filter_unvisited(list(dict.fromkeys(urls)))
+
+    def _mark_urls_visited(self, urls):
+        """
+        mark a batch of web urls as visited in a single redis round trip
+        :param urls: web urls to be marked
+        :return: None
+        """
+        self.visited_store.mark_visited(list(urls))
+
+    @property
+    def frontier(self) -> CrawlFrontier:
+        """
+        Persistent queue of the urls still to be crawled. Created on first use because subclasses set `name`
+        after calling the base constructor.
+        """
+        if self._frontier is None:
+            self._frontier = CrawlFrontier(self.name)
+        return self._frontier
+
+    @property
+    def url_classifier(self):
+        return self.outlet.url_classifier
+
+    @property
+    def visited_store(self) -> VisitedUrlStore:
+        """
+        Bloom filter fronted visited-url set. Created on first use because subclasses set `redis_key`
+        after calling the base constructor.
+        """
+        if self._visited_store is None:
+            self._check_redis_key()
+            self._visited_store = VisitedUrlStore(self.redis_key)
+        return self._visited_store
+
+    def _check_redis_key(self):
         if self.redis_key == 'base-spider-topic':
             raise ValueError(f"Redis key cannot be  '{self.redis_key}'. Change it to proceed.")
-        self.redis_client.sadd(self.redis_key, url)
 
     @staticmethod
     def _normalize_url(url):
-        """Remove fragments from the URL"""
-        return url.split('#')[0]
+        """Canonicalize the URL: drop fragments and tracking parameters, sort the query, lowercase the host"""
+        return canonicalize_url(url)
 
     @staticmethod
-    def _get_publication_date(soup):
+    def _get_publication_date(timestamp):
         raise NotImplementedError
\ No newline at end of file
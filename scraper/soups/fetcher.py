@@ -0,0 +1,122 @@
+import time
+import asyncio
+import logging
+import aiohttp
+from functools import partial
+from urllib.parse import urlsplit
+from scraper.httpcache import RevalidationCache
+
+logging.basicConfig(level=logging.INFO)
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter: allows `burst` requests at once and refills at `rate` tokens per second
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncFetcher:
+    """
+    Pooled asyncio HTTP client for the soup crawlers. Connections are kept alive across requests, every
+    host gets its own concurrency limit and a token bucket that spaces out requests to it. With a
+    `RevalidationCache`, pages fetched before are revalidated with a conditional GET.
+
+    Use as an async context manager:
+        async with AsyncFetcher(requests_per_second=2) as fetcher:
+            url, content = await fetcher.fetch('https://edition.cnn.com/politics/')
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, requests_per_second: float = 2.0, burst: int = 2, concurrency_per_host: int = 4,
+                 max_connections: int = 100, timeout: int = 30, headers: dict = None,
+                 cache: RevalidationCache = None):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.concurrency_per_host = concurrency_per_host
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.cache = cache
+
+        # urls the server answered with 304 Not Modified, served from the revalidation cache
+        self.revalidated = set()
+
+        self.stats = {'requests': 0, 'errors': 0, 'bytes': 0}
+        self._session = None
+        self._host_limits = {}
+        self._host_buckets = {}
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=self.headers
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+
+    async def fetch(self, url: str, revalidate: bool = True) -> tuple[str, str | None]:
+        """
+        Fetch a webpage, following redirects, while respecting the per-host limits
+        :param url: web url to be fetched
+        :param revalidate: whether the page is cached and revalidated, when the fetcher has a cache
+        :return: tuple of the url the page was served from and its content (None on error)
+        """
+        cache = self.cache if revalidate else None
+        # the revalidation cache reads and writes gzip and json files, which runs in the default executor
+        loop = asyncio.get_running_loop()
+        host = urlsplit(url).hostname
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.concurrency_per_host)
+            self._host_buckets[host] = TokenBucket(self.requests_per_second, self.burst)
+
+        async with self._host_limits[host]:
+            await self._host_buckets[host].acquire()
+            self.stats['requests'] += 1
+
+            try:
+                self.logger.info(f"Fetching content from {url}")
+                headers = await loop.run_in_executor(None, cache.conditional_headers, url) if cache else {}
+                async with self._session.get(url, headers=headers) as response:
+                    if response.status == 304 and cache:
+                        cached = await loop.run_in_executor(None, cache.load, url)
+                        if cached:
+                            self.revalidated.add(url)
+                            return str(response.url), cached[1].decode('utf-8')
+
+                    response.raise_for_status()
+                    content = await response.text()
+                    self.stats['bytes'] += len(content)
+
+                    if cache:
+                        await loop.run_in_executor(None, partial(
+                            cache.store, url, etag=response.headers.get('ETag'),
+                            last_modified=response.headers.get('Last-Modified'), body=content.encode('utf-8'),
+                            content_type=response.headers.get('Content-Type')))
+                    return str(response.url), content
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.stats['errors'] += 1
+                self.logger.error(f"Error fetching content from {url}: {str(e)}")
+                return url, None
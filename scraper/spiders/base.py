@@ -2,7 +2,16 @@ import enum
 import scrapy
 import logging
 from typing import Any
+from datetime import datetime, timezone
+from scrapy import signals
 from scrapy.http import Response
+from config import config
+from scraper.urls import canonicalize_url
+from scraper.visited import VisitedUrlStore
+from scraper.frontier import CrawlFrontier
+from scraper.feeds import CrawlCheckpoint, parse_feed, is_fresh
+from scraper.urlclassifier import UrlClassifier, UrlRule
+from scraper.extractor import ArticleExtractor
 from dbservices.redisservice import RedisService
 
 logging.basicConfig(level=logging.INFO)
@@ -17,15 +26,176 @@ class SpidersEnum(enum.Enum):
     def __str__(self):
         return self.name
 
+    @property
+    def url_classifier(self) -> UrlClassifier:
+        """
+        Article url classifier of the outlet, built once per process from `OUTLET_URL_RULES`
+        """
+        if self not in _url_classifiers:
+            rules = OUTLET_URL_RULES[self]
+            _url_classifiers[self] = UrlClassifier(
+                hosts=rules['hosts'],
+                rules=[UrlRule(**rule) for rule in rules['rules']],
+                max_age_days=config.ARTICLE_MAX_AGE_DAYS
+            )
+        return _url_classifiers[self]
+
+    @property
+    def discovery_mode(self) -> str:
+        """
+        How the crawlers of the outlet find new articles: 'feeds' reads its news sitemaps and RSS feeds,
+        'links' follows links recursively from the base url
+        """
+        return OUTLET_FEEDS[self]['discovery']
+
+    @property
+    def feed_urls(self) -> list[str]:
+        return OUTLET_FEEDS[self]['feeds']
+
+    @property
+    def extractor(self) -> ArticleExtractor:
+        """
+        Article text extractor of the outlet, with its `OUTLET_BOILERPLATE` patterns compiled once per process
+        """
+        if self not in _extractors:
+            _extractors[self] = ArticleExtractor(OUTLET_BOILERPLATE[self])
+        return _extractors[self]
+
+
+# Article urls of every outlet. Patterns are matched against the canonical url path; `year`, `month` and
+# `day` groups are checked against ARTICLE_MAX_AGE_DAYS instead of hard-coding the accepted years.
+OUTLET_URL_RULES = {
+    SpidersEnum.CNNSpider: {
+        'hosts': ['edition.cnn.com', 'www.cnn.com'],
+        'rules': [{'name': 'article', 'path_prefix': '/20',
+                   'pattern': r'/(?P<year>\d{4})/(?P<month>\d{2})/(?P<day>\d{2})/politics/[\w-]+(?:/index\.html)?'}]
+    },
+    SpidersEnum.FoxNewsSpider: {
+        'hosts': ['www.foxnews.com'],
+        'rules': [{'name': 'article', 'path_prefix': '/politics/', 'pattern': r'/politics/[\w-]+'}]
+    },
+    SpidersEnum.NPRNewsSpider: {
+        'hosts': ['www.npr.org'],
+        'rules': [{'name': 'article', 'path_prefix': '/20',
+                   'pattern': r'/(?P<year>\d{4})/(?P<month>\d{2})/(?P<day>\d{2})/(?:[\w-]+/)?[\w-]+'}]
+    },
+    SpidersEnum.PoliticoSpider: {
+        'hosts': ['www.politico.com', 'politico.com'],
+        'rules': [{'name': 'article', 'path_prefix': '/news/20',
+                   'pattern': r'/news/(?P<year>\d{4})/(?P<month>\d{2})/(?P<day>\d{2})/[\w-]+-\d+'}]
+    },
+}
+_url_classifiers = {}
+
+# Paragraphs that are not part of the article text: copyright footers, app promotions, transcript notices.
+# Patterns are matched at the start of every whitespace-normalized paragraph.
+OUTLET_BOILERPLATE = {
+    SpidersEnum.CNNSpider: [
+        r'© \d{4} Cable News Network',
+        r'Cable News Network\.',
+        r'A Warner Bros\. Discovery Company',
+        r'All Rights Reserved\.',
+        r'CNN Sans ™',
+    ],
+    SpidersEnum.FoxNewsSpider: [
+        r'This material may not be published, broadcast, rewritten',
+        r'CLICK HERE TO',
+        r'Quotes displayed in real-time or delayed',
+        r'Market data provided by',
+        r'Legal Statement\.',
+    ],
+    SpidersEnum.NPRNewsSpider: [
+        r'© \d{4} npr',
+        r'Copyright © \d{4} NPR',
+        r'NPR transcripts are created on a rush deadline',
+        r'Sponsor Message',
+    ],
+    SpidersEnum.PoliticoSpider: [
+        r'© \d{4} POLITICO',
+        r'\d{2}/\d{2}/\d{4} \d{2}:\d{2} [AP]M E[SD]T$',
+        r'Link Copied',
+    ],
+}
+_extractors = {}
+
+# News sitemaps and RSS feeds of every outlet. With 'feeds' discovery a crawl fetches these instead of the
+# hub pages and falls back to following links from the base url when none of them can be read.
+OUTLET_FEEDS = {
+    SpidersEnum.CNNSpider: {
+        'discovery': 'feeds',
+        'feeds': ['https://edition.cnn.com/sitemaps/cnn/news.xml',
+                  'http://rss.cnn.com/rss/cnn_allpolitics.rss']
+    },
+    SpidersEnum.FoxNewsSpider: {
+        'discovery': 'feeds',
+        'feeds': ['https://www.foxnews.com/sitemap.xml?type=news',
+                  'https://moxie.foxnews.com/google-publisher/politics.xml']
+    },
+    SpidersEnum.NPRNewsSpider: {
+        'discovery': 'feeds',
+        'feeds': ['https://feeds.npr.org/1014/rss.xml']
+    },
+    SpidersEnum.PoliticoSpider: {
+        'discovery': 'feeds',
+        'feeds': ['https://rss.politico.com/politics-news.xml',
+                  'https://rss.politico.com/congress.xml']
+    },
+}
+
 
 class BaseSpider(scrapy.Spider):
     name = None
     base_url = None
     redis_key = 'base-spider-topic'
-    politics_url_pattern = ''
     logger = logging.getLogger(__name__)
     redis_client = RedisService.get_client()
     # producer = Producer({'bootstrap.servers': config.KAFKA_BROKER})
+    _visited_store = None
+    _frontier = None
+    # whether article pages are searched for links to follow; off when the outlet is discovered from feeds
+    follows_links = True
+    _crawl_started = None
+    _last_crawl = None
+    _feeds_pending = 0
+    _feeds_read = 0
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_opened, signal=signals.spider_opened)
+        return spider
+
+    def spider_opened(self, spider):
+        # warm the Bloom filter before the first link is checked
+        self.visited_store.warm()
+
+    def closed(self, reason):
+        # only a crawl that read the feeds moves the checkpoint, a resumed crawl did not see new entries
+        if reason == 'finished' and self._feeds_read:
+            CrawlCheckpoint(self.redis_key).set(self._crawl_started)
+        for key, value in self.visited_store.stats.items():
+            self.crawler.stats.set_value(f'visited_bloom/{key}', value)
+        for key, value in self.url_classifier.stats.items():
+            self.crawler.stats.set_value(f'url_classifier/{key}', value)
+        self.crawler.stats.set_value('frontier/pending', len(self.frontier))
+        self.frontier.close()
+
+    @property
+    def url_classifier(self) -> UrlClassifier:
+        return SpidersEnum[self.name].url_classifier
+
+    @property
+    def visited_store(self) -> VisitedUrlStore:
+        if self._visited_store is None:
+            self._check_redis_key()
+            self._visited_store = VisitedUrlStore(self.redis_key)
+        return self._visited_store
+
+    @property
+    def frontier(self) -> CrawlFrontier:
+        if self._frontier is None:
+            self._frontier = CrawlFrontier(self.name)
+        return self._frontier
 
     def is_url_visited(self, url):
         """
@@ -33,9 +203,7 @@ class BaseSpider(scrapy.Spider):
         :param url: web url to be checked
         :return: bool (true or false)
         """
-        if self.redis_key == 'base-spider-topic':
-            raise ValueError(f"Redis key cannot be  '{self.redis_key}'. Change it to proceed.")
-        return self.redis_client.sismember(self.redis_key, url)
+        return self.filter_unvisited([url]) == []
 
     def mark_url_visited(self, url):
         """
@@ -43,12 +211,150 @@ class BaseSpider(scrapy.Spider):
         :param url: web url to be marked
         :return: None
         """
+        self.mark_urls_visited([url])
+
+    def filter_unvisited(self, urls):
+        """
+        check a batch of web urls against the Bloom filter, confirming possible hits in a single redis round trip
+        :param urls: web urls to be checked
+        :return: list of the urls that have not been visited, in their original order
+        """
+        return self.visited_store.filter_unvisited(list(dict.fromkeys(urls)))
+
+    def mark_urls_visited(self, urls):
+        """
+        mark a batch of web urls as visited in a single redis round trip
+        :param urls: web urls to be marked
+        :return: None
+        """
+        self.visited_store.mark_visited(list(urls))
+
+    def _check_redis_key(self):
         if self.redis_key == 'base-spider-topic':
             raise ValueError(f"Redis key cannot be  '{self.redis_key}'. Change it to proceed.")
-        self.redis_client.sadd(self.redis_key, url)
+
+    def article_text(self, response: Response) -> str:
+        """
+        clean text of an article page: the full text of every paragraph, including the text of nested links
+        and emphasis, with the outlet boilerplate removed
+        :param response: response from the scraped web page
+        :return: str
+        """
+        # walk the lxml tree scrapy already parsed, without building a selector per paragraph
+        paragraphs = (node.text_content() for node in response.selector.root.iter('p'))
+        return SpidersEnum[self.name].extractor.extract(paragraphs)
+
+    @staticmethod
+    def canonical_url(response: Response) -> str:
+        """
+        canonical url of a scraped page. `response.url` is the url after redirects; a
+        `<link rel="canonical">` declared by the page takes precedence over it.
+        :param response: response from the scraped web page
+        :return: str
+        """
+        declared_url = response.css('link[rel="canonical"]::attr(href)').get()
+        return canonicalize_url(response.urljoin(declared_url) if declared_url else response.url)
+
+    @staticmethod
+    def is_unchanged(response: Response) -> bool:
+        """
+        check if the server answered 304 Not Modified and the page was served from the revalidation cache
+        :param response: response from the scraped web page
+        :return: bool
+        """
+        return 'revalidated' in response.flags
 
     def start_requests(self) -> Any:
-        raise NotImplementedError
+        """
+        Start the scraping process. A run resumes the links a previous, interrupted run queued but did
+        not crawl; otherwise it starts from the outlet feeds or from `base_url`, per its discovery mode.
+        :return: Generator
+        """
+        self._crawl_started = datetime.now(timezone.utc)
+        outlet = SpidersEnum[self.name]
+        self.follows_links = outlet.discovery_mode != 'feeds'
+
+        if self.frontier.resume():
+            for url, depth in self.frontier.pending():
+                yield self.frontier_request(url, depth)
+        elif outlet.discovery_mode == 'feeds':
+            yield from self.feed_requests(outlet.feed_urls)
+        else:
+            yield scrapy.Request(url=self.base_url, callback=self.parse)
+
+    def feed_requests(self, feed_urls: list[str]) -> Any:
+        """
+        Discover articles from the news sitemaps and RSS feeds of the outlet instead of its hub pages
+        :param feed_urls: sitemap and feed urls
+        :return: Generator
+        """
+        self._last_crawl = CrawlCheckpoint(self.redis_key).get()
+        self.logger.info(f"Discovering {self.name} articles from {len(feed_urls)} feeds modified since "
+                         f"{self._last_crawl}")
+
+        for url in feed_urls:
+            self._feeds_pending += 1
+            yield scrapy.Request(url=url, callback=self.parse_feed, errback=self.feed_failed, dont_filter=True)
+
+    def parse_feed(self, response: Response) -> Any:
+        """
+        queue the articles of a sitemap or feed that changed since the last successful crawl
+        :param response: response from the sitemap or feed
+        :return: Generator
+        """
+        feed = parse_feed(response.body)
+        yield from self._feed_done(read=bool(feed.entries or feed.sitemaps))
+
+        for sitemap in feed.sitemaps:
+            if is_fresh(sitemap, self._last_crawl):
+                self._feeds_pending += 1
+                yield scrapy.Request(url=sitemap.url, callback=self.parse_feed, errback=self.feed_failed)
+
+        links = [canonicalize_url(entry.url) for entry in feed.entries if is_fresh(entry, self._last_crawl)]
+        links = [link for link in links if self.url_classifier.accepts(link)]
+        self.crawler.stats.inc_value('feeds/entries', len(feed.entries))
+        self.crawler.stats.inc_value('feeds/fresh_articles', len(links))
+        yield from self.follow_links(response, links)
+
+    def feed_failed(self, failure) -> Any:
+        self.logger.error(f"Unable to read feed {failure.request.url}: {failure.value}")
+        yield from self._feed_done(read=False)
+
+    def _feed_done(self, read):
+        self._feeds_pending -= 1
+        self._feeds_read += read
+
+        if not self._feeds_pending and not self._feeds_read:
+            self.logger.warning(f"No feed of {self.name} could be read, following links from {self.base_url}")
+            self.follows_links = True
+            yield scrapy.Request(url=self.base_url, callback=self.parse)
+
+    def follow_links(self, response: Response, links: list[str]) -> Any:
+        """
+        queue the unvisited links of a page in the crawl frontier and request them, freshest first
+        :param response: response from the scraped web page
+        :param links: canonical article urls found on the page
+        :return: Generator
+        """
+        depth = response.meta.get('depth', 0) + 1
+        for link in self.frontier.push(self.filter_unvisited(links), depth):
+            yield self.frontier_request(link, depth)
+
+    def frontier_request(self, url: str, depth: int) -> scrapy.Request:
+        return scrapy.Request(url=url, callback=self.parse, errback=self.request_failed,
+                              priority=self.frontier.priority(url, depth), meta={'depth': depth})
+
+    def mark_crawled(self, response: Response) -> None:
+        """
+        mark the frontier entry of a page as processed, under every url it was redirected through
+        :param response: response from the scraped web page
+        :return: None
+        """
+        self.frontier.done([canonicalize_url(url) for url in response.meta.get('redirect_urls', [])] +
+                           [canonicalize_url(response.url)])
+
+    def request_failed(self, failure) -> None:
+        self.frontier.done([failure.request.url])
 
     def parse(self, response: Response, **kwargs: Any) -> Any:
         raise NotImplementedError
@@ -1,12 +1,10 @@
-import re
-import scrapy
 from typing import Any
 from config import config
 from .base import BaseSpider
 from datetime import datetime
 from scrapy.http import Response
 from scraper.items import NewsItem
-from dbservices.mongoservice import MongoService
+from scraper.urls import canonicalize_url
 
 
 class PoliticoSpider(BaseSpider):
@@ -15,14 +13,6 @@ class PoliticoSpider(BaseSpider):
     db_collection_name = 'raw-news'
     redis_key = f'politico-visited'
     kafka_topic = config.KAFKA_TOPIC
-    politics_url_pattern = r'https:\/\/politico\.com\/news\/(?:2024|2023)\/\d{2}\/\d{2}\/(?:\w|-)+-\d+'
-
-    def start_requests(self):
-        """
-        Start the scraping process
-        :return:
-        """
-        yield scrapy.Request(url=self.base_url, callback=self.parse)
 
     def parse(self, response: Response, **kwargs: Any) -> Any:
         """
@@ -34,15 +24,24 @@ class PoliticoSpider(BaseSpider):
         """
         self.logger.info(f"Scraping {__name__} article: {response.url}")
 
-        # Check whether the webpage url matches the `politics` regex
-        if re.match(self.politics_url_pattern, response.url):
+        self.mark_crawled(response)
+
+        url = self.canonical_url(response)
+
+        # a hub page the server reports as not modified has nothing new to extract or follow. Articles are never
+        # revalidated, an article that was not stored is parsed again
+        if self.is_unchanged(response) and not self.url_classifier.accepts(url):
+            return
+
+        # Check whether the webpage is an article of the outlet
+        if self.url_classifier.accepts(url):
 
             # If the url hasn't been visited yet
-            if not self.is_url_visited(response.url):
+            if not self.is_url_visited(url):
 
                 # Extract data from the current page
                 title = response.css('h2.headline::text').get()
-                content = response.css('p::text').getall()
+                content = self.article_text(response)
 
                 # Send data to Kafka topic
                 # self.producer.produce(self.kafka_topic, ...)
@@ -53,23 +52,19 @@ class PoliticoSpider(BaseSpider):
                 news_item['title'] = title
                 news_item['raw_content'] = content
                 news_item['publication_date'] = self.get_publication_date(response)
-                news_item['url'] = response.url
+                news_item['url'] = url
                 news_item['source'] = 'Politico'
                 news_item['created_at'] = datetime.utcnow().isoformat()
 
-                # Save to MongoDB database
-                MongoService.insert_data(
-                    collection_name=self.db_collection_name,
-                    data=[dict(news_item)]
-                )
-
-                # Mark url as visited
-                self.mark_url_visited(response.url)
+                # Hand over to the item pipeline, which batches the inserts into MongoDB
+                # and marks the url as visited once the article is saved
+                yield news_item
 
-        # Follow links to other pages recursively
-        for link in response.css('a::attr(href)').getall():
-            if re.match(self.politics_url_pattern, link):
-                yield response.follow(link, callback=self.parse)
+        # Follow links to other pages recursively, checking all candidate links in one redis round trip
+        if self.follows_links:
+            links = [canonicalize_url(response.urljoin(link)) for link in response.css('a::attr(href)').getall()]
+            links = [link for link in links if self.url_classifier.accepts(link)]
+            yield from self.follow_links(response, links)
 
     @staticmethod
     def get_publication_date(response):
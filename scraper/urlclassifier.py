@@ -0,0 +1,79 @@
+import re
+from collections import Counter
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+
+class UrlRule:
+    """
+    One shape of article url of an outlet. `pattern` is matched against the url path and may capture
+    `year`, `month` and `day` groups, which are then checked against the classifier's date range.
+    """
+
+    def __init__(self, name: str, path_prefix: str, pattern: str):
+        self.name = name
+        self.path_prefix = path_prefix
+        self.pattern = re.compile(pattern)
+
+
+class UrlClassifier:
+    """
+    Decides whether a canonical url is an article of an outlet. A cheap host and path prefix check runs
+    before any regex, and every decision is counted by reason in `stats`:
+        accepted/<rule>, rejected/host, rejected/prefix, rejected/pattern, rejected/date, rejected/too_old,
+        rejected/future
+    """
+
+    def __init__(self, hosts: list[str], rules: list[UrlRule], max_age_days: int = None):
+        self.hosts = tuple(hosts)
+        self.rules = rules
+        self.max_age_days = max_age_days
+        self.stats = Counter()
+
+        self._host_prefixes = tuple(f'https://{host}/' for host in self.hosts)
+        self._rule_prefixes = tuple(f'https://{host}{rule.path_prefix}' for host in self.hosts for rule in rules)
+
+    def accepts(self, url: str) -> bool:
+        return self.classify(url)[0]
+
+    def classify(self, url: str) -> tuple[bool, str]:
+        """
+        Classify a url
+        :param url: canonical web url
+        :return: tuple of (accepted, reason)
+        """
+        accepted, reason = self._classify(url)
+        self.stats[f"{'accepted' if accepted else 'rejected'}/{reason}"] += 1
+        return accepted, reason
+
+    def _classify(self, url):
+        if not url.startswith(self._host_prefixes):
+            return False, 'host'
+        if not url.startswith(self._rule_prefixes):
+            return False, 'prefix'
+
+        path = urlsplit(url).path
+        for rule in self.rules:
+            if not path.startswith(rule.path_prefix):
+                continue
+
+            match = rule.pattern.fullmatch(path)
+            if not match:
+                continue
+
+            if 'year' not in rule.pattern.groupindex:
+                return True, rule.name
+
+            try:
+                published = date(int(match['year']), int(match['month']), int(match['day']))
+            except ValueError:
+                return False, 'date'
+
+            today = date.today()
+            if published > today + timedelta(days=1):
+                return False, 'future'
+            if self.max_age_days is not None and published < today - timedelta(days=self.max_age_days):
+                return False, 'too_old'
+            return True, rule.name
+
+        return False, 'pattern'
@@ -0,0 +1,58 @@
+import re
+import hashlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# query parameters that only track where a click came from and never change the article served
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', 'cmpid', 'ocid', 'icid', 'intcmp', 'ftag',
+    'hpt', 'iid', 'taid', 'dicbo', 'ref', 'ref_src', 'cid', 's_cid', 'nc', 'sr_share', 'fromrss'
+}
+TRACKING_PREFIXES = ('utm_', 'at_', 'ns_', 'pk_')
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+_MULTIPLE_SLASHES = re.compile(r'/{2,}')
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Rewrite a url into its canonical, still fetchable, form: https scheme, lowercase host without the
+    default port, no fragment, no tracking query parameters, sorted query and no trailing slash.
+    :param url: absolute web url
+    :return: canonical url
+    """
+    parts = urlsplit(url.strip())
+
+    scheme = parts.scheme.lower()
+    if scheme in _DEFAULT_PORTS:
+        scheme = 'https'
+
+    host = (parts.hostname or '').rstrip('.')
+    if parts.port and parts.port not in _DEFAULT_PORTS.values():
+        host = f'{host}:{parts.port}'
+
+    path = _MULTIPLE_SLASHES.sub('/', parts.path) or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                             if not _is_tracking_param(key)))
+
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+def url_fingerprint(url: str) -> bytes:
+    """
+    Fixed size (16 byte) fingerprint of a url. Urls that only differ by scheme, `www.` prefix, tracking
+    parameters, query order, fragment or trailing slash share a fingerprint.
+    :param url: absolute web url
+    :return: bytes
+    """
+    parts = urlsplit(canonicalize_url(url))
+    host = parts.netloc[4:] if parts.netloc.startswith('www.') else parts.netloc
+    key = urlunsplit(('', host, parts.path, parts.query, ''))
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+
+def _is_tracking_param(key: str) -> bool:
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
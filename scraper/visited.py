@@ -0,0 +1,247 @@
+import math
+import time
+import hashlib
+import logging
+import threading
+from config import config
+from scraper.urls import url_fingerprint
+from dbservices.redisservice import RedisService
+
+logging.basicConfig(level=logging.INFO)
+
+
+class BloomFilter:
+    """
+    A fixed size Bloom filter backed by a bytearray. Membership tests can return false positives
+    but never false negatives.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, max_bytes: int = None):
+        num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        if max_bytes:
+            num_bits = min(num_bits, max_bytes * 8)
+
+        self.capacity = capacity
+        self.num_bits = max(num_bits, 8)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def add(self, value) -> None:
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
+
+    @property
+    def estimated_error_rate(self) -> float:
+        """
+        false positive rate expected for the number of values added so far
+        """
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def _positions(self, value):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+
+        # double hashing: derive all the bit positions from a single 128 bit digest
+        digest = hashlib.blake2b(value, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+
+class VisitedUrlStore:
+    """
+    Visited-url set kept in redis, fronted by an in-process Bloom filter. Urls are stored as 16 byte
+    fingerprints of their canonical form under `<redis_key>:fp`, so tracking parameters, scheme and `www.`
+    variants of an article collapse into a single entry. The filter is warmed from the redis set once, at
+    startup. Every marked batch is also appended to the capped redis stream `<redis_key>:log`, which is read
+    every `VISITED_BLOOM_SYNC_INTERVAL` seconds to pick up the urls added by other crawlers without scanning
+    the set. When the stream was trimmed past the last entry read, the filter is rebuilt from the set on a
+    background thread. Urls the filter has never seen are reported unvisited without going to redis;
+    possible hits are confirmed against the redis set.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, redis_key: str,
+                 capacity: int = config.VISITED_BLOOM_CAPACITY,
+                 error_rate: float = config.VISITED_BLOOM_ERROR_RATE,
+                 max_bytes: int = config.VISITED_BLOOM_MAX_BYTES,
+                 sync_interval: int = config.VISITED_BLOOM_SYNC_INTERVAL,
+                 log_length: int = 100_000):
+        self.legacy_redis_key = redis_key
+        self.redis_key = f'{redis_key}:fp'
+        self.log_key = f'{redis_key}:log'
+        self.sync_interval = sync_interval
+        self.log_length = log_length
+        self.capacity, self.error_rate, self.max_bytes = capacity, error_rate, max_bytes
+        self.bloom = BloomFilter(capacity, error_rate, max_bytes)
+        self.stats = {
+            'lookups': 0,
+            'bloom_negatives': 0,
+            'redis_lookups': 0,
+            'redis_round_trips': 0,
+            'redis_round_trips_skipped': 0,
+            'false_positives': 0,
+            'log_entries_synced': 0,
+            'rebuilds': 0,
+        }
+        self._last_sync = None
+        self._log_id = '0-0'
+        self._migrated = False
+        self._rebuilding = threading.Lock()
+
+    def warm(self) -> None:
+        """
+        Migrate the legacy raw-url set, once, and build the Bloom filter from every member of the redis set
+        :return: None
+        """
+        if not self._migrated:
+            self._migrate_legacy_set()
+            self._migrated = True
+        with self._rebuilding:
+            self._rebuild()
+
+    def _rebuild(self):
+        started = time.monotonic()
+        client = RedisService.get_client()
+        # urls marked while the set is scanned are replayed from the log by the next sync
+        latest = client.xrevrange(self.log_key, count=1)
+        log_id = latest[0][0].decode() if latest else '0-0'
+
+        bloom = BloomFilter(self.capacity, self.error_rate, self.max_bytes)
+        for member in client.sscan_iter(self.redis_key, count=1000):
+            bloom.add(member)
+
+        self.bloom, self._log_id, loaded = bloom, log_id, bloom.count
+        self._last_sync = time.monotonic()
+        self.stats['rebuilds'] += 1
+
+        if self.bloom.count > self.bloom.capacity:
+            self.logger.warning(f"Bloom filter for '{self.redis_key}' holds {self.bloom.count} urls, above its "
+                                f"capacity of {self.bloom.capacity}. False positive rate is now "
+                                f"{self.bloom.estimated_error_rate:.4f}")
+        self.logger.info(f"Synced {loaded} urls from '{self.redis_key}' into a {self.bloom.size_bytes} byte "
+                         f"Bloom filter in {time.monotonic() - started:.2f}s")
+
+    def filter_unvisited(self, urls: list[str]) -> list[str]:
+        """
+        Return the urls that have not been visited, in their original order
+        :param urls: web urls to be checked
+        :return: list[str]
+        """
+        self._sync_if_stale()
+        self.stats['lookups'] += len(urls)
+
+        # keep the first url of every fingerprint, so variants of the same page are only returned once
+        fingerprints = {}
+        for url in urls:
+            fingerprints.setdefault(url_fingerprint(url), url)
+
+        maybe_visited = [fingerprint for fingerprint in fingerprints if fingerprint in self.bloom]
+        self.stats['bloom_negatives'] += len(fingerprints) - len(maybe_visited)
+
+        if not maybe_visited:
+            if fingerprints:
+                self.stats['redis_round_trips_skipped'] += 1
+            return list(fingerprints.values())
+
+        self.stats['redis_lookups'] += len(maybe_visited)
+        self.stats['redis_round_trips'] += 1
+        confirmed = {fingerprint for fingerprint, is_visited in zip(maybe_visited, RedisService.are_visited(
+            self.redis_key, maybe_visited)) if is_visited}
+        self.stats['false_positives'] += len(maybe_visited) - len(confirmed)
+
+        return [url for fingerprint, url in fingerprints.items() if fingerprint not in confirmed]
+
+    def mark_visited(self, urls: list[str]) -> None:
+        """
+        Add the url fingerprints to the redis set and to the Bloom filter
+        :param urls: web urls to be marked
+        :return: None
+        """
+        if not urls:
+            return
+
+        fingerprints = list({url_fingerprint(url) for url in urls})
+        RedisService.mark_visited(self.redis_key, fingerprints)
+        RedisService.get_client().xadd(self.log_key, {'fp': b''.join(fingerprints)},
+                                       maxlen=self.log_length, approximate=True)
+        for fingerprint in fingerprints:
+            self.bloom.add(fingerprint)
+
+    def _sync_if_stale(self):
+        if self._last_sync is None:
+            self.warm()
+        elif time.monotonic() - self._last_sync > self.sync_interval:
+            self._sync()
+
+    def _sync(self, count: int = 1000):
+        """
+        Add the fingerprints logged since the last sync to the Bloom filter, or rebuild it on a background
+        thread when the log no longer holds them
+        """
+        self._last_sync = time.monotonic()
+        if self._rebuilding.locked():
+            return
+
+        client = RedisService.get_client()
+        oldest = client.xrange(self.log_key, count=1)
+        if oldest and self._log_id != '0-0' and self._id_key(oldest[0][0].decode()) > self._id_key(self._log_id):
+            self.logger.info(f"'{self.log_key}' was trimmed past the last synced entry, rebuilding the filter")
+            threading.Thread(target=self._rebuild_in_background, name='visited-bloom-rebuild', daemon=True).start()
+            return
+
+        while True:
+            entries = client.xread({self.log_key: self._log_id}, count=count)
+            entries = entries[0][1] if entries else []
+            for entry_id, fields in entries:
+                packed = fields.get(b'fp', b'')
+                for start in range(0, len(packed), 16):
+                    self.bloom.add(packed[start:start + 16])
+                self._log_id = entry_id.decode()
+            self.stats['log_entries_synced'] += len(entries)
+            if len(entries) < count:
+                break
+
+    def _rebuild_in_background(self):
+        if not self._rebuilding.acquire(blocking=False):
+            return
+        try:
+            self._rebuild()
+        except Exception as e:
+            self.logger.error(f"Rebuilding the Bloom filter of '{self.redis_key}' failed: {str(e)}")
+        finally:
+            self._rebuilding.release()
+
+    @staticmethod
+    def _id_key(entry_id):
+        milliseconds, sequence = entry_id.split('-')
+        return int(milliseconds), int(sequence)
+
+    def _migrate_legacy_set(self):
+        """
+        One-off conversion of the old raw-url set into fingerprints. The raw-url set is left untouched.
+        """
+        client = RedisService.get_client()
+        if client.exists(self.redis_key) or not client.exists(self.legacy_redis_key):
+            return
+
+        migrated, batch = 0, []
+        for member in client.sscan_iter(self.legacy_redis_key, count=1000):
+            batch.append(url_fingerprint(member.decode('utf-8')))
+            if len(batch) == 1000:
+                migrated += len(batch)
+                RedisService.mark_visited(self.redis_key, batch)
+                batch = []
+        migrated += len(batch)
+        RedisService.mark_visited(self.redis_key, batch)
+        self.logger.info(f"Migrated {migrated} urls from '{self.legacy_redis_key}' to '{self.redis_key}'")
@@ -0,0 +1,74 @@
+class FakeRedis:
+    """
+    In-memory stand-in for the redis commands the tests use
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    @staticmethod
+    def _bytes(value):
+        return value if isinstance(value, bytes) else str(value).encode('utf-8')
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(self._bytes(member) for member in members)
+
+    def srem(self, key, *members):
+        self.data.get(key, set()).difference_update(self._bytes(member) for member in members)
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update({self._bytes(field): self._bytes(value)
+                                              for field, value in mapping.items()})
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(self._bytes(field))
+
+    def hmget(self, key, fields, *more):
+        fields = fields if isinstance(fields, list) else [fields, *more]
+        return [self.data.get(key, {}).get(self._bytes(field)) for field in fields]
+
+    def hsetnx(self, key, field, value):
+        self.data.setdefault(key, {}).setdefault(self._bytes(field), self._bytes(value))
+
+    def append(self, key, value):
+        self.data[key] = self.data.get(key, b'') + self._bytes(value)
+
+    def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update({self._bytes(member): score for member, score in mapping.items()})
+
+    def zcard(self, key):
+        return len(self.data.get(key, {}))
+
+    def zpopmin(self, key, count):
+        popped = sorted(self.data[key].items(), key=lambda item: item[1])[:count]
+        for member, _ in popped:
+            del self.data[key][member]
+        return popped
+
+    def expire(self, key, ttl):
+        pass
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client, self.commands = client, []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        results = [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+        self.commands = []
+        return results
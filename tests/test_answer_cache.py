@@ -0,0 +1,16 @@
+from dbservices.redisservice import RedisService
+from util.answer_cache import SemanticAnswerCache
+from tests.fake_redis import FakeRedis
+
+
+def test_same_question_from_two_document_sets_keeps_both_answers(monkeypatch):
+    monkeypatch.setattr(RedisService, 'redis_client', FakeRedis())
+    cache = SemanticAnswerCache(threshold=0.95, max_entries=10)
+    embedding = [0.1, 0.7, 0.2]
+
+    cache.put('Who won Michigan?', embedding, ['a', 'b'], 'Answer from a and b')
+    cache.put('Who won Michigan?', embedding, ['c'], 'Answer from c')
+
+    assert cache.get(embedding, ['b', 'a']) == 'Answer from a and b'
+    assert cache.get(embedding, ['c']) == 'Answer from c'
+    assert cache.get(embedding, ['a']) is None
@@ -0,0 +1,68 @@
+from util.bm25 import BM25Index, tokenize
+
+DOCUMENTS = {
+    'michigan': 'Polls in Michigan show a tight senate race',
+    'ohio': 'Ohio voters head to the polls for the primary',
+    'debate': 'The presidential debate focused on the economy',
+    'economy': 'Economy and inflation top the concerns of voters in Michigan',
+}
+
+
+def index_of(documents=DOCUMENTS, **kwargs):
+    index = BM25Index(**kwargs)
+    index.add(list(documents), list(documents.values()),
+              [['entity:michigan'] if 'Michigan' in text else [] for text in documents.values()])
+    return index
+
+
+def test_tokenize_drops_stopwords_and_case():
+    assert tokenize('The Polls in Michigan') == ['polls', 'michigan']
+
+
+def test_search_ranks_documents_by_the_query_terms():
+    index = index_of()
+    results = index.search('michigan polls', k=5)
+    assert [document_id for document_id, _ in results][0] == 'michigan'
+    assert {document_id for document_id, _ in results} == {'michigan', 'economy', 'ohio'}
+    assert results == sorted(results, key=lambda result: result[1], reverse=True)
+    assert len(index.search('michigan polls', k=2)) == 2
+    assert index.search('weather', k=5) == []
+
+
+def test_search_restricted_to_tags():
+    index = index_of()
+    assert index.count(['entity:michigan']) == 2
+    assert {document_id for document_id, _ in index.search('voters', k=5, tags=['entity:michigan'])} == {'economy'}
+
+
+def test_add_skips_indexed_ids():
+    index = index_of()
+    index.add(['ohio'], ['a different text about michigan'])
+    assert len(index) == 4
+    assert [document_id for document_id, _ in index.search('ohio', k=5)] == ['ohio']
+
+
+def test_removed_documents_are_not_found():
+    index = index_of(compact_ratio=0.9)
+    index.remove(['michigan', 'unknown'])
+
+    assert 'michigan' not in index
+    assert len(index) == 3
+    assert {document_id for document_id, _ in index.search('michigan polls', k=5)} == {'economy', 'ohio'}
+    assert index.count(['entity:michigan']) == 1
+
+
+def test_compaction_keeps_the_live_documents_searchable():
+    index = index_of()
+    index.remove(['michigan', 'debate'])
+
+    # half of the documents were removed, above the default ratio: the index now scores like a fresh one
+    assert index._removed == set()
+    assert sorted(index.ids()) == ['economy', 'ohio']
+    assert index.count(['entity:michigan']) == 1
+    fresh = index_of({document_id: DOCUMENTS[document_id] for document_id in ('ohio', 'economy')})
+    assert index.search('voters economy', k=5) == fresh.search('voters economy', k=5)
+
+    index.add(['michigan'], [DOCUMENTS['michigan']], [['entity:michigan']])
+    assert index.search('senate', k=1)[0][0] == 'michigan'
+    assert index.count(['entity:michigan']) == 2
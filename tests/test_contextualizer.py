@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip('langchain_core')
+
+from util.contextualizer import is_self_contained  # noqa: E402
+
+
+def test_standalone_questions_are_self_contained():
+    assert is_self_contained('Who won the 2020 presidential election in Georgia?', min_words=4)
+    assert is_self_contained("What is Kamala Harris' position on immigration?", min_words=4)
+
+
+def test_follow_ups_need_a_rewrite():
+    assert not is_self_contained('And in Pennsylvania, who won the senate race?', min_words=4)
+    assert not is_self_contained('What about   the house of representatives?', min_words=4)
+    assert not is_self_contained('When did he announce his campaign for president?', min_words=4)
+    assert not is_self_contained("What was that candidate's final vote count?", min_words=4)
+
+
+def test_short_questions_need_a_rewrite():
+    assert not is_self_contained('Why not Ohio?', min_words=4)
+    assert not is_self_contained('Biden polls', min_words=4)
+    assert is_self_contained('Biden polls', min_words=2)
@@ -0,0 +1,50 @@
+import random
+from dbservices.redisservice import RedisService
+from scraper.neardup import NearDuplicateIndex, simhash
+from tests.fake_redis import FakeRedis
+
+words = random.Random(7).choices([f'word{i}' for i in range(500)], k=300)
+STORY = ' '.join(words)
+UPDATED_STORY = ' '.join(words[:150] + ['updated'] + words[151:])
+OTHER_STORY = ' '.join(random.Random(8).choices([f'word{i}' for i in range(500)], k=300))
+
+
+def distance(a, b):
+    return (simhash(a)[0] ^ simhash(b)[0]).bit_count()
+
+
+def test_simhash_of_near_duplicates_differs_in_few_bits():
+    assert simhash(STORY) == simhash(STORY.upper())
+    assert simhash(STORY)[1] == 297
+    assert distance(STORY, UPDATED_STORY) <= 6
+    assert distance(STORY, OTHER_STORY) > 6
+
+
+def test_fingerprints_within_max_distance_share_a_band():
+    index = NearDuplicateIndex(max_distance=6)
+    fingerprint = simhash(STORY)[0]
+    # flip one bit in each of 6 of the 7 bands
+    flipped = fingerprint ^ sum(1 << offset for offset, _ in index._bands[:6])
+
+    assert set(index._band_keys(fingerprint)) & set(index._band_keys(flipped))
+    assert len(index._band_keys(fingerprint)) == 7
+
+
+def test_links_copies_to_the_first_stored_article(monkeypatch):
+    monkeypatch.setattr(RedisService, 'redis_client', FakeRedis())
+    index = NearDuplicateIndex()
+
+    first = [{'raw_content': STORY, 'url_fingerprint': 'a'}, {'raw_content': UPDATED_STORY, 'url_fingerprint': 'b'}]
+    index.link(first)
+    index.add(first)
+    assert 'duplicate_of' not in first[0]
+    assert first[1]['duplicate_of'] == 'a'
+
+    later = [{'raw_content': UPDATED_STORY, 'url_fingerprint': 'c'},
+             {'raw_content': OTHER_STORY, 'url_fingerprint': 'd'},
+             {'raw_content': 'too short', 'url_fingerprint': 'e'}]
+    index.link(later)
+    assert later[0]['duplicate_of'] == 'a'
+    assert 'duplicate_of' not in later[1]
+    assert 'simhash' not in later[2]
+    assert index.stats == {'indexed': 1, 'near_duplicates': 2, 'too_short': 1}
@@ -0,0 +1,20 @@
+from util.passages import merge_passages
+
+TEXT = 'The senate passed the bill. The house will vote next week. The president is expected to sign it.'
+
+
+def span(start, end):
+    return start, end, TEXT[start:end]
+
+
+def test_overlapping_passages_merge_back_into_the_text():
+    assert merge_passages([span(50, 97), span(0, 40), span(25, 60)]) == TEXT[:97]
+
+
+def test_contained_and_adjacent_passages_are_not_repeated():
+    assert merge_passages([span(0, 60), span(10, 30), span(60, 97)]) == TEXT[:60] + ' ... ' + TEXT[60:97]
+
+
+def test_gaps_between_passages_are_marked():
+    assert merge_passages([span(59, 97), span(0, 27)]) == TEXT[:27] + ' ... ' + TEXT[59:97]
+    assert merge_passages([]) == ''
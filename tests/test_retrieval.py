@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip('langchain_core')
+
+from util.retrieval import reciprocal_rank_fusion  # noqa: E402
+
+
+def test_fusion_favours_ids_ranked_well_by_both_rankings():
+    dense = ['a', 'b', 'c', 'd']
+    sparse = ['c', 'a', 'e']
+    assert reciprocal_rank_fusion([dense, sparse]) == ['a', 'c', 'b', 'e', 'd']
+
+
+def test_fusion_of_a_single_ranking_keeps_its_order():
+    assert reciprocal_rank_fusion([['x', 'y', 'z']]) == ['x', 'y', 'z']
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+def test_lower_k_weighs_the_top_ranks_more():
+    # 'top' is first in one ranking, 'steady' fourth in both
+    rankings = [['top', 'a', 'b', 'steady'], ['c', 'd', 'e', 'steady']]
+    fused = reciprocal_rank_fusion(rankings, k=1)
+    assert fused.index('top') < fused.index('steady')
+    fused = reciprocal_rank_fusion(rankings, k=60)
+    assert fused.index('steady') < fused.index('top')
@@ -0,0 +1,38 @@
+from datetime import date, timedelta
+from scraper.urlclassifier import UrlClassifier, UrlRule
+
+
+def classifier(max_age_days=None):
+    return UrlClassifier(
+        hosts=['www.example.com'],
+        rules=[UrlRule('dated', '/20', r'/(?P<year>\d{4})/(?P<month>\d{2})/(?P<day>\d{2})/politics/[\w-]+'),
+               UrlRule('story', '/story/', r'/story/[\w-]+')],
+        max_age_days=max_age_days)
+
+
+def dated_url(published):
+    return f'https://www.example.com/{published:%Y/%m/%d}/politics/senate-vote'
+
+
+def test_accepts_article_urls_by_rule():
+    urls = classifier()
+    assert urls.classify(dated_url(date.today())) == (True, 'dated')
+    assert urls.classify('https://www.example.com/story/debate-recap') == (True, 'story')
+
+
+def test_rejects_with_the_reason():
+    urls = classifier(max_age_days=30)
+    assert urls.classify('https://other.com/story/debate-recap') == (False, 'host')
+    assert urls.classify('https://www.example.com/video/debate-recap') == (False, 'prefix')
+    assert urls.classify('https://www.example.com/story/debate/recap') == (False, 'pattern')
+    assert urls.classify('https://www.example.com/2024/02/30/politics/senate-vote') == (False, 'date')
+    assert urls.classify(dated_url(date.today() + timedelta(days=5))) == (False, 'future')
+    assert urls.classify(dated_url(date.today() - timedelta(days=60))) == (False, 'too_old')
+
+
+def test_counts_decisions_by_reason():
+    urls = classifier()
+    urls.accepts('https://www.example.com/story/debate-recap')
+    urls.accepts('https://www.example.com/story/debate-recap')
+    urls.accepts('https://other.com/story/debate-recap')
+    assert urls.stats == {'accepted/story': 2, 'rejected/host': 1}
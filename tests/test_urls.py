@@ -0,0 +1,18 @@
+from scraper.urls import canonicalize_url, url_fingerprint
+
+
+def test_canonical_url_drops_tracking_fragment_default_port_and_trailing_slash():
+    url = 'http://Edition.CNN.com:80/politics//live-news/?utm_source=x&b=2&fbclid=abc&a=1#comments'
+    assert canonicalize_url(url) == 'https://edition.cnn.com/politics/live-news?a=1&b=2'
+
+
+def test_canonical_url_keeps_other_ports_and_the_root_path():
+    assert canonicalize_url('https://example.com:8443') == 'https://example.com:8443/'
+    assert canonicalize_url('https://example.com/?q=') == 'https://example.com/?q='
+
+
+def test_fingerprint_is_shared_by_variants_of_an_article():
+    fingerprint = url_fingerprint('https://www.npr.org/2024/05/01/story?ref=home')
+    assert len(fingerprint) == 16
+    assert fingerprint == url_fingerprint('http://npr.org/2024/05/01/story/#top')
+    assert fingerprint != url_fingerprint('https://www.npr.org/2024/05/01/other-story')
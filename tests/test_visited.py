@@ -0,0 +1,28 @@
+from scraper.visited import BloomFilter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    values = [f'https://www.example.com/story/{i}' for i in range(1000)]
+    for value in values:
+        bloom.add(value)
+
+    assert all(value in bloom for value in values)
+    assert bloom.count == 1000
+
+
+def test_bloom_filter_false_positive_rate_stays_near_the_target():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f'added-{i}')
+
+    false_positives = sum(f'missing-{i}' in bloom for i in range(10_000))
+    assert false_positives / 10_000 < 0.03
+    assert 0.005 < bloom.estimated_error_rate < 0.02
+
+
+def test_bloom_filter_size_is_capped_by_max_bytes():
+    bloom = BloomFilter(capacity=1_000_000, error_rate=0.001, max_bytes=1024)
+    assert bloom.size_bytes == 1024
+    bloom.add(b'\x00' * 16)
+    assert b'\x00' * 16 in bloom
@@ -0,0 +1,148 @@
+import time
+import math
+import hashlib
+import logging
+from array import array
+from typing import Optional
+from redis import RedisError
+from config import config
+from dbservices.redisservice import RedisService
+from util.ingest import LATEST_INGEST_KEY
+
+logging.basicConfig(level=logging.INFO)
+
+
+def document_ids(documents) -> list[str]:
+    """
+    Ids of retrieved documents: their parent article or chroma id, else a hash of their text
+    :param documents: list of langchain Document
+    :return: list of str
+    """
+    return [document.metadata.get('parent_id') or document.metadata.get('id')
+            or hashlib.blake2b(document.page_content.encode('utf-8'), digest_size=16).hexdigest()
+            for document in documents]
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SemanticAnswerCache:
+    """
+    Redis cache of chat answers, matched on the meaning of the standalone question and the documents it
+    retrieved. A cached answer is reused when its documents are the same and the cosine similarity of the
+    question embeddings is at least `threshold`.
+
+    Entries live in a generation named after the latest ingest time, so answers are retired as soon as new
+    articles are stored, and expire after `ttl` seconds at most. A generation holds up to `max_entries`
+    answers, the least recently used ones are evicted first. Keys, under `<redis_key>:<generation>`:
+        docs:<doc set hash>  set of the entry ids answered from a set of documents
+        entry:<entry id>     hash of the question embedding and the answer
+        lru                  sorted set of entry ids by last use
+    Failing redis calls count as cache misses.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, threshold: float = config.ANSWER_CACHE_THRESHOLD, ttl: int = config.ANSWER_CACHE_TTL,
+                 max_entries: int = config.ANSWER_CACHE_MAX_ENTRIES, redis_key: str = 'answer-cache'):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.redis_key = redis_key
+        self.stats = {'lookups': 0, 'hits': 0, 'stores': 0, 'evictions': 0}
+
+    def get(self, embedding: list[float], doc_ids: list[str]) -> Optional[str]:
+        """
+        Cached answer of a question
+        :param embedding: embedding of the standalone question
+        :param doc_ids: ids of the documents retrieved for the question
+        :return: str or None
+        """
+        self.stats['lookups'] += 1
+        try:
+            client = RedisService.get_client()
+            prefix = self._prefix(client)
+            entry_ids = client.smembers(f'{prefix}:docs:{self._docs_hash(doc_ids)}')
+            if not entry_ids:
+                return None
+
+            pipe = client.pipeline(transaction=False)
+            entry_ids = [entry_id.decode() for entry_id in entry_ids]
+            for entry_id in entry_ids:
+                pipe.hmget(f'{prefix}:entry:{entry_id}', 'embedding', 'answer')
+            candidates = [(entry_id, array('f', packed).tolist(), answer.decode('utf-8'))
+                          for entry_id, (packed, answer) in zip(entry_ids, pipe.execute()) if packed and answer]
+
+            scored = [(_cosine(embedding, vector), entry_id, answer) for entry_id, vector, answer in candidates]
+            similarity, entry_id, answer = max(scored, default=(0.0, None, None))
+            if similarity < self.threshold:
+                return None
+
+            client.zadd(f'{prefix}:lru', {entry_id: time.time()})
+            self.stats['hits'] += 1
+            self.logger.info(f"Answer cache hit, similarity {similarity:.3f}")
+            return answer
+        except RedisError as e:
+            self.logger.warning(f"Answer cache unavailable: {e}")
+            return None
+
+    def put(self, question: str, embedding: list[float], doc_ids: list[str], answer: str) -> None:
+        """
+        Cache the answer of a question
+        :param question: standalone question
+        :param embedding: embedding of the standalone question
+        :param doc_ids: ids of the documents the answer was generated from
+        :param answer:
+        :return: None
+        """
+        try:
+            client = RedisService.get_client()
+            prefix = self._prefix(client)
+            # an entry is the answer to a question from one set of documents, the same question answered from
+            # other documents is another entry
+            docs_hash = self._docs_hash(doc_ids)
+            entry_id = hashlib.blake2b(f'{question}|{docs_hash}'.encode('utf-8'), digest_size=8).hexdigest()
+            docs_key, entry_key, lru_key = (f'{prefix}:docs:{docs_hash}', f'{prefix}:entry:{entry_id}',
+                                            f'{prefix}:lru')
+
+            pipe = client.pipeline(transaction=False)
+            pipe.hset(entry_key, mapping={'embedding': array('f', embedding).tobytes(), 'answer': answer,
+                                          'docs': docs_key})
+            pipe.sadd(docs_key, entry_id)
+            pipe.zadd(lru_key, {entry_id: time.time()})
+            for key in (entry_key, docs_key, lru_key):
+                pipe.expire(key, self.ttl)
+            pipe.zcard(lru_key)
+            size = pipe.execute()[-1]
+            self.stats['stores'] += 1
+
+            if size > self.max_entries:
+                self._evict(client, prefix, size - self.max_entries)
+        except RedisError as e:
+            self.logger.warning(f"Answer cache unavailable: {e}")
+
+    def _evict(self, client, prefix, count):
+        evicted = [entry_id.decode() for entry_id, _ in client.zpopmin(f'{prefix}:lru', count)]
+        pipe = client.pipeline(transaction=False)
+        for entry_id in evicted:
+            pipe.hget(f'{prefix}:entry:{entry_id}', 'docs')
+        docs_keys = pipe.execute()
+
+        pipe = client.pipeline(transaction=False)
+        for entry_id, docs_key in zip(evicted, docs_keys):
+            pipe.delete(f'{prefix}:entry:{entry_id}')
+            if docs_key:
+                pipe.srem(docs_key.decode(), entry_id)
+        pipe.execute()
+        self.stats['evictions'] += len(evicted)
+
+    def _prefix(self, client):
+        generation = client.get(LATEST_INGEST_KEY)
+        return f"{self.redis_key}:{generation.decode() if generation else '0'}"
+
+    @staticmethod
+    def _docs_hash(doc_ids):
+        return hashlib.blake2b('\n'.join(sorted(set(doc_ids))).encode('utf-8'), digest_size=16).hexdigest()
@@ -0,0 +1,153 @@
+import re
+import math
+import heapq
+from collections import Counter, defaultdict
+from threading import Lock
+
+WORD = re.compile(r'\w+')
+
+STOPWORDS = frozenset('''
+a an and are as at be been but by for from has have he her his i in is it its of on or our she that the their
+them they this to was we were what when where which who will with would you your
+'''.split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [word for word in WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory inverted index of documents scored with Okapi BM25. Only the postings of the query terms are
+    visited. Documents can carry tags, e.g. the entities they mention, and a search can be restricted to the
+    documents having one of a set of tags. Removed documents are skipped until they make up a quarter of the
+    index, which is then compacted.
+
+    Usage:
+        index = BM25Index()
+        index.add(ids, texts, tags)
+        index.search('polls in michigan', k=20, tags=['entity:michigan'])
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, compact_ratio: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self._ids, self._lengths = [], []
+        self._positions = {}
+        self._postings = defaultdict(list)
+        self._tagged = defaultdict(set)
+        self._removed = set()
+        self._total_length = 0
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self._positions
+
+    def ids(self) -> list[str]:
+        """
+        Ids of the indexed documents
+        """
+        with self._lock:
+            return list(self._positions)
+
+    def add(self, ids: list[str], texts: list[str], tags: list[list[str]] = None) -> None:
+        """
+        Index documents, skipping the ids already indexed
+        :param ids:
+        :param texts:
+        :param tags: tags of every document
+        :return: None
+        """
+        with self._lock:
+            for document_id, text, document_tags in zip(ids, texts, tags or [()] * len(ids)):
+                if document_id in self._positions:
+                    continue
+                terms = tokenize(text or '')
+                position = len(self._ids)
+                self._positions[document_id] = position
+                self._ids.append(document_id)
+                self._lengths.append(len(terms))
+                self._total_length += len(terms)
+                for term, frequency in Counter(terms).items():
+                    self._postings[term].append((position, frequency))
+                for tag in document_tags:
+                    self._tagged[tag].add(position)
+
+    def remove(self, ids: list[str]) -> None:
+        """
+        Remove documents from the index, ignoring the ids that are not indexed
+        :param ids:
+        :return: None
+        """
+        with self._lock:
+            for document_id in ids:
+                position = self._positions.pop(document_id, None)
+                if position is not None:
+                    self._removed.add(position)
+                    self._total_length -= self._lengths[position]
+            if len(self._removed) > self.compact_ratio * len(self._ids):
+                self._compact()
+
+    def count(self, tags: list[str]) -> int:
+        """
+        Number of documents having one of the tags
+        """
+        with self._lock:
+            return len(self._allowed(tags))
+
+    def search(self, query: str, k: int, tags: list[str] = None) -> list[tuple[str, float]]:
+        """
+        Best matching documents of a query
+        :param query:
+        :param k: number of results
+        :param tags: when given, only the documents having one of these tags are searched
+        :return: list of (id, score), best first
+        """
+        with self._lock:
+            if not self._positions:
+                return []
+
+            allowed = self._allowed(tags) if tags is not None else None
+            n_documents = len(self._positions)
+            average_length = self._total_length / n_documents or 1
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                for position, frequency in postings:
+                    if position in self._removed or (allowed is not None and position not in allowed):
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[position] / average_length)
+                    scores[position] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [(self._ids[position], score) for position, score in best]
+
+    def _allowed(self, tags):
+        allowed = set()
+        for tag in tags:
+            allowed |= self._tagged.get(tag, set())
+        return allowed - self._removed
+
+    def _compact(self):
+        # renumber the live documents and drop the removed ones from every posting list
+        kept = [position for position in range(len(self._ids)) if position not in self._removed]
+        renumbered = {old: new for new, old in enumerate(kept)}
+        self._ids = [self._ids[position] for position in kept]
+        self._lengths = [self._lengths[position] for position in kept]
+        self._positions = {document_id: position for position, document_id in enumerate(self._ids)}
+        self._postings = defaultdict(list, {
+            term: postings for term, postings in (
+                (term, [(renumbered[position], frequency) for position, frequency in postings
+                        if position in renumbered]) for term, postings in self._postings.items()) if postings})
+        self._tagged = defaultdict(set, {
+            tag: positions for tag, positions in (
+                (tag, {renumbered[position] for position in positions if position in renumbered})
+                for tag, positions in self._tagged.items()) if positions})
+        self._removed = set()
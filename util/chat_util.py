@@ -1,18 +1,27 @@
 import os
+from operator import itemgetter
+from typing import AsyncIterator, Iterator
 from config import config
 from chromadb import HttpClient
-from chromadb.utils import embedding_functions
 from langchain.globals import set_debug
 from langchain_core.embeddings import Embeddings
-from chromadb.api.types import EmbeddingFunction
+from util.embeddings import EmbeddingService
+from util.retrieval import SmallToBigRetriever, HybridRetriever
+from util.entities import QueryEntities
+from util.reranker import CrossEncoderReranker
+from util.answer_cache import SemanticAnswerCache, document_ids
+from util.contextualizer import QuestionContextualizer
+from dbservices.chromaservice import ChromaService
 from langchain_community.llms import LlamaCpp
 from langchain.prompts import MessagesPlaceholder, ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda, RunnableConfig, RunnablePassthrough
+from langchain_core.runnables.config import run_in_executor
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_mistralai.chat_models import ChatMistralAI
 from langchain_community.vectorstores import Chroma
 from langchain_community.chat_message_histories import RedisChatMessageHistory
-from langchain.chains import create_retrieval_chain, create_history_aware_retriever
 
 from dotenv import load_dotenv, find_dotenv
 
@@ -22,19 +31,18 @@ set_debug(bool(os.getenv('LANGCHAIN_DEBUG')))
 
 
 class ChromaEmbeddingsAdapter(Embeddings):
-    def __init__(self, ef: EmbeddingFunction):
+    def __init__(self, ef: EmbeddingService):
         self.ef = ef
 
     def embed_documents(self, texts):
-        return self.ef(texts)
+        return self.ef.embed(texts)
 
     def embed_query(self, query):
-        return self.ef([query])[0]
+        return self.ef.embed_query(query)
 
 
 class LLMUtil:
-    embedding_fn = ChromaEmbeddingsAdapter(
-        embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2"))
+    embedding_fn = ChromaEmbeddingsAdapter(EmbeddingService.get())
 
     vector_store = Chroma(client=HttpClient(os.getenv('CHROMA_DB_URL')),
                           collection_name=os.getenv('DB_NAME'),
@@ -72,12 +80,45 @@ class LLMUtil:
     )
 
     rag_llm = None
+    contextualizer = None
 
     @classmethod
     def init_llm(cls):
         if not cls.rag_llm:
-            # get chromadb retriever from vector store
-            retriever = cls.vector_store.as_retriever(search_kwargs={"k": 3})
+            # load the embedding model at startup rather than on the first question
+            cls.embedding_fn.ef.load()
+
+            # get chromadb retriever, searching passages and expanding them to their articles in passages mode
+            passages = config.VECTOR_INDEX_MODE == 'passages'
+            # over-fetch candidates for the cross-encoder, which keeps the best ones
+            reranker = CrossEncoderReranker() if config.RERANK_ENABLED else None
+            k = config.RERANK_CANDIDATES if reranker else config.RETRIEVAL_PASSAGES if passages else 3
+            if reranker:
+                reranker.load()
+
+            if config.RETRIEVAL_HYBRID:
+                query_entities = QueryEntities() if config.RETRIEVAL_ENTITY_FILTER else None
+                collection_name = config.PASSAGE_COLLECTION if passages else config.DB_NAME
+                retriever = HybridRetriever(
+                    collection=ChromaService.get_client().get_or_create_collection(collection_name),
+                    embeddings=cls.embedding_fn.ef,
+                    query_entities=query_entities,
+                    k=k,
+                    reranker=reranker,
+                    small_to_big=passages,
+                    top_k=3)
+                # load the NER model and build the BM25 index at startup rather than on the first question
+                if query_entities:
+                    query_entities.load()
+                retriever.refresh()
+            elif passages:
+                retriever = SmallToBigRetriever(
+                    collection=ChromaService.get_client().get_or_create_collection(config.PASSAGE_COLLECTION),
+                    embeddings=cls.embedding_fn.ef,
+                    k=k,
+                    reranker=reranker)
+            else:
+                retriever = cls.vector_store.as_retriever(search_kwargs={"k": 3})
 
             # create template for user history prompt
             chat_history_context_prompt = ChatPromptTemplate.from_messages(
@@ -87,12 +128,9 @@ class LLMUtil:
                  ]
             )
 
-            # create history aware retriever using chromadb retriever
-            history_aware_retriever = create_history_aware_retriever(
-                cls.model,
-                retriever,
-                chat_history_context_prompt
-            )
+            # standalone question, rewritten by the LLM from the chat history only when the question needs it
+            cls.contextualizer = QuestionContextualizer(chat_history_context_prompt | cls.model | StrOutputParser())
+            standalone_question = RunnableLambda(cls.contextualizer, name='standalone_question')
 
             # New question/answer prompt
             chat_prompt = ChatPromptTemplate.from_messages(
@@ -104,9 +142,15 @@ class LLMUtil:
 
             # create document chain
             question_answer_chain = create_stuff_documents_chain(cls.model, chat_prompt)
-
-            # create rag_chain using system and user prompts
-            rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+            if config.ANSWER_CACHE_ENABLED:
+                question_answer_chain = cls.cached_answers(question_answer_chain, SemanticAnswerCache())
+
+            # create rag_chain: rewrite the question, retrieve its documents from chromadb and answer
+            rag_chain = (
+                RunnablePassthrough.assign(question=standalone_question)
+                .assign(context=itemgetter('question') | retriever)
+                .assign(answer=question_answer_chain)
+            )
 
             # create runnable llm with message history
             rag_chain_llm = RunnableWithMessageHistory(
@@ -121,6 +165,57 @@ class LLMUtil:
 
         return cls.rag_llm
 
+    @classmethod
+    def cached_answers(cls, question_answer_chain, cache: SemanticAnswerCache) -> RunnableLambda:
+        """
+        Wraps the question/answer chain so that a question whose standalone form is close to an answered one and
+        which retrieved the same documents gets the cached answer, without calling the LLM. Answers are streamed
+        token by token, a cached answer comes as a single chunk.
+        :param question_answer_chain: runnable answering the `input` from the `context` documents
+        :param cache:
+        :return: RunnableLambda
+        """
+        def cache_key(inputs):
+            # the retriever embedded the question already, this hits the embedding cache
+            return cls.embedding_fn.ef.embed_query(inputs['question']), document_ids(inputs['context'])
+
+        def answer(inputs: dict, run_config: RunnableConfig) -> Iterator[str]:
+            embedding, doc_ids = cache_key(inputs)
+            cached = cache.get(embedding, doc_ids)
+            if cached is not None:
+                yield cached
+                return
+
+            chunks = []
+            for chunk in question_answer_chain.stream(inputs, config=run_config):
+                chunks.append(chunk)
+                yield chunk
+            cache.put(inputs['question'], embedding, doc_ids, ''.join(chunks))
+
+        async def aanswer(inputs: dict, run_config: RunnableConfig) -> AsyncIterator[str]:
+            embedding, doc_ids = await run_in_executor(run_config, cache_key, inputs)
+            cached = await run_in_executor(run_config, cache.get, embedding, doc_ids)
+            if cached is not None:
+                yield cached
+                return
+
+            chunks = []
+            async for chunk in question_answer_chain.astream(inputs, config=run_config):
+                chunks.append(chunk)
+                yield chunk
+            await run_in_executor(run_config, cache.put, inputs['question'], embedding, doc_ids, ''.join(chunks))
+
+        # RunnableLambda only hands the runnable config to a parameter named `config`, which would shadow the
+        # config module in the functions above, so these adapters rename it
+        def stream_answer(inputs: dict, config: RunnableConfig) -> Iterator[str]:
+            yield from answer(inputs, config)
+
+        async def astream_answer(inputs: dict, config: RunnableConfig) -> AsyncIterator[str]:
+            async for chunk in aanswer(inputs, config):
+                yield chunk
+
+        return RunnableLambda(stream_answer, afunc=astream_answer, name='cached_answer')
+
     @staticmethod
     def get_message_history(session_id: str) -> RedisChatMessageHistory:
         return RedisChatMessageHistory(session_id, url=f"{config.REDIS_CONNECTION_STRING}")
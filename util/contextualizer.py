@@ -0,0 +1,120 @@
+import re
+import hashlib
+import logging
+from redis import RedisError
+from langchain_core.runnables import RunnableConfig
+from config import config
+from dbservices.redisservice import RedisService
+
+logging.basicConfig(level=logging.INFO)
+
+WORD = re.compile(r"[\w']+")
+
+# words of a question that refer to something said earlier in the conversation
+REFERENCES = frozenset('''
+he him his she her hers they them their theirs it its this that these those there then
+former latter same such other others else one ones
+'''.split())
+
+# openings of a follow-up question, e.g. "and in Texas?" or "what about the senate?"
+FOLLOW_UPS = ('and ', 'but ', 'also ', 'so ', 'or ', 'what about ', 'how about ', 'what else', 'why not', 'more ')
+
+
+def is_self_contained(question: str, min_words: int = config.QUESTION_REWRITE_MIN_WORDS) -> bool:
+    """
+    Whether a question can be understood without the chat history: it has at least `min_words` words, does not
+    open like a follow-up and has no pronoun or determiner pointing back at the conversation. The check is
+    conservative, a question it rejects is rewritten by the LLM.
+    :param question:
+    :param min_words:
+    :return: bool
+    """
+    normalized = ' '.join(question.lower().split())
+    words = WORD.findall(normalized)
+    if len(words) < min_words or normalized.startswith(FOLLOW_UPS):
+        return False
+    return not any(word.split("'")[0] in REFERENCES for word in words)
+
+
+class QuestionContextualizer:
+    """
+    Turns the latest question of a chat into a standalone question for retrieval, calling the rewrite LLM only
+    when it is needed: a question without chat history, or that `is_self_contained`, is used as it is.
+
+    Rewrites are cached in redis for `cache_ttl` seconds per session, turn and question, so a replayed turn
+    does not call the LLM again. `stats` counts the questions by how they were contextualized, and `saved` the
+    LLM calls avoided.
+
+    Usage:
+        contextualizer = QuestionContextualizer(prompt | llm | StrOutputParser())
+        chain = RunnablePassthrough.assign(question=RunnableLambda(contextualizer))
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, rewrite_chain, heuristic: bool = config.QUESTION_REWRITE_HEURISTIC,
+                 cache_ttl: int = config.QUESTION_REWRITE_CACHE_TTL, redis_key: str = 'question-rewrite'):
+        self.rewrite_chain = rewrite_chain
+        self.heuristic = heuristic
+        self.cache_ttl = cache_ttl
+        self.redis_key = redis_key
+        self.stats = {'no_history': 0, 'self_contained': 0, 'cached': 0, 'rewritten': 0}
+
+    @property
+    def saved(self) -> int:
+        """
+        Number of rewrite LLM calls avoided
+        """
+        return self.stats['no_history'] + self.stats['self_contained'] + self.stats['cached']
+
+    def __call__(self, inputs: dict, config: RunnableConfig) -> str:
+        # RunnableLambda only hands the runnable config to a parameter named `config`
+        return self.contextualize(inputs, config)
+
+    def contextualize(self, inputs: dict, run_config: RunnableConfig) -> str:
+        """
+        Standalone question of a chat turn
+        :param inputs: dict with the `input` question and the `chat_history` messages
+        :param run_config: runnable config, whose `configurable` holds the `session_id`
+        :return: str
+        """
+        question, history = inputs['input'], inputs.get('chat_history') or []
+        if not history:
+            return self._count('no_history', question)
+        if self.heuristic and is_self_contained(question):
+            return self._count('self_contained', question)
+
+        session_id = run_config.get('configurable', {}).get('session_id')
+        key = self._cache_key(session_id, len(history), question) if session_id else None
+        rewritten = self._cached(key) if key else None
+        if rewritten is not None:
+            return self._count('cached', rewritten)
+
+        rewritten = self.rewrite_chain.invoke(inputs, config=run_config)
+        if key:
+            self._cache(key, rewritten)
+        return self._count('rewritten', rewritten)
+
+    def _count(self, outcome, question):
+        self.stats[outcome] += 1
+        if outcome != 'rewritten':
+            self.logger.info(f"Skipped the question rewrite ({outcome}), {self.saved} LLM calls saved")
+        return question
+
+    def _cache_key(self, session_id, turn, question):
+        digest = hashlib.blake2b(question.encode('utf-8'), digest_size=8).hexdigest()
+        return f'{self.redis_key}:{session_id}:{turn}:{digest}'
+
+    def _cached(self, key):
+        try:
+            rewritten = RedisService.get_client().get(key)
+            return rewritten.decode('utf-8') if rewritten is not None else None
+        except RedisError as e:
+            self.logger.warning(f"Question rewrite cache unavailable: {e}")
+            return None
+
+    def _cache(self, key, rewritten):
+        try:
+            RedisService.get_client().set(key, rewritten, ex=self.cache_ttl)
+        except RedisError as e:
+            self.logger.warning(f"Question rewrite cache unavailable: {e}")
@@ -0,0 +1,189 @@
+import hashlib
+import logging
+from array import array
+from collections import OrderedDict
+from threading import Lock
+from redis import RedisError
+from config import config
+from dbservices.redisservice import RedisService
+
+logging.basicConfig(level=logging.INFO)
+
+
+class EmbeddingService:
+    """
+    Sentence-transformers embeddings shared by the enrichment pipeline and the chat API, so documents and
+    queries are embedded by the same model with the same settings.
+
+    Texts are embedded in batches sorted by length, truncated to `max_seq_length` tokens, with the torch
+    backend or an ONNX export of the model (`backend='onnx'`, `onnx_file` picking e.g. a quantized export)
+    on CPU nodes. Embeddings are cached by a hash of the model settings and the text, in an in-process LRU
+    of `cache_size` entries and in redis under `<redis_key>:<hash>` for `cache_ttl` seconds, so identical
+    texts and repeated queries are embedded once. The service keeps working without the redis cache when
+    redis is unavailable.
+
+    Usage:
+        embeddings = EmbeddingService.get().embed(texts)
+    """
+
+    _instances = {}
+    _instances_lock = Lock()
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, model_name: str = config.EMBEDDING_MODEL, batch_size: int = config.EMBEDDING_BATCH_SIZE,
+                 max_seq_length: int = config.EMBEDDING_MAX_SEQ_LENGTH, backend: str = config.EMBEDDING_BACKEND,
+                 onnx_file: str = config.EMBEDDING_ONNX_FILE, device: str = None,
+                 cache_size: int = config.EMBEDDING_CACHE_SIZE, cache_ttl: int = config.EMBEDDING_CACHE_TTL,
+                 redis_key: str = 'embedding-cache'):
+        if backend not in ('torch', 'onnx'):
+            raise ValueError(f"Unknown embedding backend '{backend}'")
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_seq_length = max_seq_length
+        self.backend = backend
+        self.onnx_file = onnx_file
+        self.device = device
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.redis_key = redis_key
+        self.stats = {'texts': 0, 'lru_hits': 0, 'redis_hits': 0, 'embedded': 0}
+
+        self._model = None
+        self._lru = OrderedDict()
+        self._lock = Lock()
+
+    @classmethod
+    def get(cls, model_name: str = config.EMBEDDING_MODEL, **kwargs) -> 'EmbeddingService':
+        """
+        Returns the shared service of a model, creating it if it does not exist yet
+        :param model_name:
+        :param kwargs: settings of the service when it is created
+        :return: EmbeddingService
+        """
+        with cls._instances_lock:
+            if model_name not in cls._instances:
+                cls._instances[model_name] = cls(model_name, **kwargs)
+            return cls._instances[model_name]
+
+    def load(self) -> None:
+        """
+        Load the model, once
+        :return: None
+        """
+        with self._lock:
+            if self._model is not None:
+                return
+
+            from sentence_transformers import SentenceTransformer
+
+            if self.backend == 'onnx':
+                model_kwargs = {'file_name': self.onnx_file} if self.onnx_file else None
+                model = SentenceTransformer(self.model_name, device=self.device, backend='onnx',
+                                            model_kwargs=model_kwargs)
+            else:
+                model = SentenceTransformer(self.model_name, device=self.device)
+            model.max_seq_length = min(self.max_seq_length, model.max_seq_length or self.max_seq_length)
+            self._model = model
+
+    @property
+    def tokenizer(self):
+        """
+        tokenizer of the model, e.g. to split texts into passages the model sees whole
+        """
+        self.load()
+        return self._model.tokenizer
+
+    def __call__(self, texts: list[str]) -> list[list[float]]:
+        return self.embed(texts)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed many texts, the cached ones from the cache
+        :param texts:
+        :return: list of embeddings in the order of `texts`
+        """
+        keys = [self._cache_key(text) for text in texts]
+        embeddings = [self._lru_get(key) for key in keys]
+        self.stats['texts'] += len(texts)
+        self.stats['lru_hits'] += sum(embedding is not None for embedding in embeddings)
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        for i, embedding in zip(missing, self._redis_get([keys[i] for i in missing])):
+            if embedding is not None:
+                embeddings[i] = embedding
+                self._lru_put(keys[i], embedding)
+                self.stats['redis_hits'] += 1
+
+        # unique texts still missing, longest first so every batch holds texts of similar lengths
+        missing = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(keys[i], texts[i])
+        if missing:
+            computed = self._encode(sorted(missing.items(), key=lambda item: len(item[1]), reverse=True))
+            self._redis_put(computed)
+            for key, embedding in computed.items():
+                self._lru_put(key, embedding)
+            embeddings = [embedding if embedding is not None else computed[key]
+                          for key, embedding in zip(keys, embeddings)]
+
+        return embeddings
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed([text])[0]
+
+    def _encode(self, items):
+        self.load()
+        computed = {}
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            vectors = self._model.encode([text for _, text in batch], batch_size=self.batch_size,
+                                         convert_to_numpy=True)
+            computed.update((key, vector.tolist()) for (key, _), vector in zip(batch, vectors))
+        self.stats['embedded'] += len(items)
+        return computed
+
+    def _cache_key(self, text):
+        # a quantized ONNX export gives slightly different vectors than the torch model, each has its own entries
+        settings = f"{self.model_name}|{self.max_seq_length}|{self.backend}|{self.onnx_file or ''}|"
+        digest = hashlib.blake2b(settings.encode('utf-8'), digest_size=16)
+        digest.update(text.encode('utf-8'))
+        return f'{self.redis_key}:{digest.hexdigest()}'
+
+    def _lru_get(self, key):
+        with self._lock:
+            embedding = self._lru.get(key)
+            if embedding is not None:
+                self._lru.move_to_end(key)
+            return embedding
+
+    def _lru_put(self, key, embedding):
+        if not self.cache_size:
+            return
+        with self._lock:
+            self._lru[key] = embedding
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.cache_size:
+                self._lru.popitem(last=False)
+
+    def _redis_get(self, keys):
+        if not self.cache_ttl or not keys:
+            return [None] * len(keys)
+        try:
+            values = RedisService.get_client().mget(keys)
+        except RedisError as e:
+            self.logger.warning(f"Embedding cache unavailable: {e}")
+            return [None] * len(keys)
+        return [array('f', value).tolist() if value else None for value in values]
+
+    def _redis_put(self, embeddings):
+        if not self.cache_ttl or not embeddings:
+            return
+        try:
+            pipe = RedisService.get_client().pipeline(transaction=False)
+            for key, embedding in embeddings.items():
+                pipe.set(key, array('f', embedding).tobytes(), ex=self.cache_ttl)
+            pipe.execute()
+        except RedisError as e:
+            self.logger.warning(f"Embedding cache unavailable: {e}")
@@ -0,0 +1,85 @@
+from collections import defaultdict
+from threading import Lock
+from config import config
+
+# named entity labels kept as article metadata
+REQUIRED_FIELDS = ['PERSON', 'GPE', 'NORP', 'EVENT', 'ORG']
+
+# named entity labels of a question that narrow the retrieval candidates
+QUERY_FIELDS = ['PERSON', 'GPE', 'ORG']
+
+# components of the spaCy English pipelines whose output the entity recognizer does not use
+DISABLED = ['tagger', 'parser', 'attribute_ruler', 'lemmatizer', 'senter']
+
+ENTITY_KEY_PREFIX = 'entity:'
+
+
+def load_nlp(model_name: str = config.ENRICHMENT_NER_MODEL, disabled: list[str] = DISABLED):
+    """
+    Load a spaCy pipeline with the components named entity recognition does not need disabled
+    """
+    import spacy
+
+    nlp = spacy.load(model_name)
+    nlp.select_pipes(disable=[name for name in disabled if name in nlp.pipe_names])
+    return nlp
+
+
+def postprocess_entities(entities: list[tuple[str, str]], fields: list[str] = REQUIRED_FIELDS) -> dict[str, list[str]]:
+    """
+    Group named entities by label, keeping the `fields` labels only
+    :param entities: list of (text, label)
+    :param fields: labels to keep
+    :return: dict of label to unique entity texts
+    """
+    processed_entities = defaultdict(set)
+    for entity, label in entities:
+        if label in fields:
+            processed_entities[label].add(entity)
+    return {key: list(value) for key, value in processed_entities.items()}
+
+
+def entity_key(entity: str) -> str:
+    """
+    Metadata key flagging a document that mentions an entity, whatever its label, e.g. `entity:joe biden`.
+    Chroma metadata values are scalars, so every entity is a boolean field that `where` filters can match.
+    """
+    return ENTITY_KEY_PREFIX + ' '.join(entity.lower().split())
+
+
+def entity_fields(entities: dict[str, list[str]]) -> dict[str, bool]:
+    """
+    Filterable metadata fields of the entities of a document
+    :param entities: dict of label to entity texts
+    :return: dict of entity key to True
+    """
+    return {entity_key(entity): True for values in entities.values() for entity in values}
+
+
+class QueryEntities:
+    """
+    Extracts the `QUERY_FIELDS` entities of questions, loading the spaCy model on first use
+
+    Usage:
+        keys = QueryEntities()('Who leads the polls in Texas?')  # ['entity:texas']
+    """
+
+    def __init__(self, model_name: str = config.ENRICHMENT_NER_MODEL):
+        self.model_name = model_name
+        self._nlp = None
+        self._lock = Lock()
+
+    def load(self) -> None:
+        with self._lock:
+            if self._nlp is None:
+                self._nlp = load_nlp(self.model_name)
+
+    def __call__(self, query: str) -> list[str]:
+        """
+        Entity keys of a question
+        :param query:
+        :return: list of unique entity keys
+        """
+        self.load()
+        entities = postprocess_entities([(ent.text, ent.label_) for ent in self._nlp(query).ents], QUERY_FIELDS)
+        return sorted(entity_fields(entities))
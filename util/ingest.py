@@ -0,0 +1,47 @@
+import time
+from typing import Optional
+from dbservices.redisservice import RedisService
+
+# timestamp of the last enrichment batch stored in the vector database, which names the ingest generation
+LATEST_INGEST_KEY = 'latest-ingest'
+
+# sorted set of the vector database ids stored by the enrichment, scored by the time they were stored
+INGESTED_IDS_KEY = 'ingested-ids'
+
+# how long the stored ids are kept for the readers that catch up on them
+INGESTED_IDS_RETENTION = 7 * 24 * 3600
+
+
+def mark_ingest(ids: list[str]) -> None:
+    """
+    Record that documents were stored in the vector database, which starts a new ingest generation
+    :param ids: vector database ids of the documents stored, new or updated
+    :return: None
+    """
+    now = time.time()
+    pipe = RedisService.get_client().pipeline(transaction=False)
+    if ids:
+        pipe.zadd(INGESTED_IDS_KEY, {document_id: now for document_id in ids})
+        pipe.zremrangebyscore(INGESTED_IDS_KEY, '-inf', now - INGESTED_IDS_RETENTION)
+    pipe.set(LATEST_INGEST_KEY, now)
+    pipe.execute()
+
+
+def latest_ingest() -> Optional[str]:
+    """
+    Current ingest generation, None before the first ingest
+    :return: str or None
+    """
+    generation = RedisService.get_client().get(LATEST_INGEST_KEY)
+    return generation.decode() if generation is not None else None
+
+
+def ingested_since(generation: Optional[str]) -> set[str]:
+    """
+    Ids of the documents stored after an ingest generation
+    :param generation: generation returned by `latest_ingest`, None for all the retained ids
+    :return: set of ids
+    """
+    minimum = f'({generation}' if generation is not None else '-inf'
+    return {document_id.decode() for document_id in
+            RedisService.get_client().zrangebyscore(INGESTED_IDS_KEY, minimum, '+inf')}
@@ -0,0 +1,50 @@
+from typing import NamedTuple
+
+
+class Passage(NamedTuple):
+    # character span of the passage in the article text
+    start: int
+    end: int
+    # number of tokens of the passage
+    tokens: int
+
+
+def split_passages(tokenizer, text: str, max_tokens: int, overlap: int) -> list[Passage]:
+    """
+    Split a text into passages of at most `max_tokens` tokens, every passage repeating the last `overlap`
+    tokens of the previous one. Passages are exact character spans of the text, so overlapping neighbours can
+    be merged back with `merge_passages`.
+    :param tokenizer: fast HuggingFace tokenizer of the embedding model
+    :param text: article text
+    :param max_tokens: longest passage in tokens, at most the model sequence length less its special tokens
+    :param overlap: tokens shared by consecutive passages
+    :return: list of Passage
+    """
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+    step = max(1, max_tokens - overlap)
+
+    passages = []
+    for first in range(0, len(offsets), step):
+        window = offsets[first:first + max_tokens]
+        passages.append(Passage(window[0][0], window[-1][1], len(window)))
+        if first + max_tokens >= len(offsets):
+            break
+    return passages
+
+
+def merge_passages(passages: list[tuple[int, int, str]]) -> str:
+    """
+    Merge passages of the same text back into one text, dropping what overlapping neighbours repeat
+    :param passages: list of (start, end, text) in any order
+    :return: str
+    """
+    merged, merged_end = '', None
+    for start, end, text in sorted(passages):
+        if merged_end is None:
+            merged = text
+        elif start < merged_end:
+            merged += text[merged_end - start:]
+        else:
+            merged += ' ... ' + text
+        merged_end = max(end, merged_end or end)
+    return merged
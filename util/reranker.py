@@ -0,0 +1,115 @@
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from config import config
+
+logging.basicConfig(level=logging.INFO)
+
+
+class CrossEncoderReranker:
+    """
+    Reorders retrieved documents by the score a cross-encoder gives to each (question, document) pair.
+
+    The pairs not in the score cache are scored in one batch on one of `workers` background threads. When
+    scoring takes longer than `time_budget` seconds the documents are returned in their retrieval order
+    instead, and the scores are still cached once computed. An overrunning batch leaves the other threads to
+    the next requests, and a batch whose budget ran out while it was queued is dropped without being scored.
+    Scores are cached by a hash of the normalized question and the document id, in an LRU of `cache_size`
+    entries.
+
+    Usage:
+        reranker = CrossEncoderReranker()
+        hits = reranker.rerank(question, hits)
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, model_name: str = config.RERANK_MODEL, max_length: int = config.RERANK_MAX_LENGTH,
+                 batch_size: int = config.RERANK_BATCH_SIZE, time_budget: float = config.RERANK_TIME_BUDGET,
+                 cache_size: int = config.RERANK_CACHE_SIZE, workers: int = 2):
+        self.model_name = model_name
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.cache_size = cache_size
+        self.stats = {'requests': 0, 'scored': 0, 'cached': 0, 'fallbacks': 0, 'expired': 0}
+
+        self._model = None
+        self._cache = OrderedDict()
+        self._lock = Lock()
+        # few scoring threads, the cross-encoder already uses every core for a batch
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reranker')
+
+    def load(self) -> None:
+        """
+        Load the model, once
+        :return: None
+        """
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name, max_length=self.max_length, device='cpu')
+
+    def rerank(self, query: str, hits: list[dict]) -> list[dict]:
+        """
+        Reorder documents by relevance to the question
+        :param query:
+        :param hits: dicts with the `id` and `text` of a document, in retrieval order
+        :return: the hits, most relevant first, or in retrieval order when the time budget is exceeded
+        """
+        if not hits:
+            return hits
+        self._count('requests')
+        deadline = time.monotonic() + self.time_budget
+
+        query_hash = hashlib.blake2b(' '.join(query.lower().split()).encode('utf-8'), digest_size=16).hexdigest()
+        scores = {hit['id']: self._cached((query_hash, hit['id'])) for hit in hits}
+        missing = [hit for hit in hits if scores[hit['id']] is None]
+        self._count('cached', len(hits) - len(missing))
+
+        if missing:
+            future = self._executor.submit(self._score, query, query_hash, missing, deadline)
+            try:
+                scores.update(future.result(timeout=self.time_budget))
+            except TimeoutError:
+                self._count('fallbacks')
+                self.logger.warning(f"Reranking {len(missing)} documents exceeded {self.time_budget}s, "
+                                    f"keeping the retrieval order")
+                return hits
+
+        # stable sort, ties keep their retrieval order
+        return sorted(hits, key=lambda hit: scores[hit['id']], reverse=True)
+
+    def _score(self, query, query_hash, hits, deadline):
+        if time.monotonic() > deadline:
+            # the request fell back to the retrieval order while this batch was queued
+            self._count('expired')
+            return {}
+
+        self.load()
+        values = self._model.predict([(query, hit['text']) for hit in hits], batch_size=self.batch_size,
+                                     show_progress_bar=False)
+        scores = {hit['id']: float(value) for hit, value in zip(hits, values)}
+
+        with self._lock:
+            self.stats['scored'] += len(hits)
+            for document_id, score in scores.items():
+                self._cache[(query_hash, document_id)] = score
+                self._cache.move_to_end((query_hash, document_id))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return scores
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _cached(self, key):
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
@@ -0,0 +1,262 @@
+import time
+import logging
+from typing import Any, Callable, Optional
+from threading import Lock, Thread
+from redis import RedisError
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from config import config
+from util.bm25 import BM25Index
+from util.passages import merge_passages
+from util.entities import ENTITY_KEY_PREFIX
+from util.ingest import latest_ingest, ingested_since
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# metadata of a passage that does not describe its parent article
+PASSAGE_FIELDS = ('passage', 'start', 'end', 'tokens', 'parent_tokens', 'n_passages')
+
+
+class SmallToBigRetriever(BaseRetriever):
+    """
+    Small-to-big retrieval over the passage collection: the question is matched against short passages, which
+    the embedding model represents whole, and the best passages are expanded into bigger context.
+
+    With a `reranker`, the `k` retrieved passages are reordered by the cross-encoder before being expanded, so
+    `k` is the number of reranking candidates. Passages are taken in rank order, one per parent article. A passage
+    is expanded to its whole parent article when the article fits in the remaining `context_tokens`, else to as
+    many of its `neighbours` passages on either side as fit. Retrieval stops once the budget is spent.
+    """
+
+    collection: Any
+    embeddings: Any
+    k: int = config.RETRIEVAL_PASSAGES
+    context_tokens: int = config.RETRIEVAL_CONTEXT_TOKENS
+    neighbours: int = 2
+    reranker: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        return self.expand(self.rerank(query, self.search(query)))
+
+    def rerank(self, query: str, hits: list[dict]) -> list[dict]:
+        """
+        Reorder the retrieved documents with the reranker, if any
+        :param query:
+        :param hits: documents returned by `search`
+        :return: list of hits
+        """
+        return self.reranker.rerank(query, hits) if self.reranker is not None else hits
+
+    def search(self, query: str) -> list[dict]:
+        """
+        Passages nearest to the query
+        :param query:
+        :return: list of dicts with the id, text, metadata and distance of a passage, nearest first
+        """
+        result = self.collection.query(query_embeddings=[self.embeddings.embed_query(query)], n_results=self.k,
+                                       include=['documents', 'metadatas', 'distances'])
+        return [{'id': passage_id, 'text': text, 'metadata': metadata, 'distance': distance}
+                for passage_id, text, metadata, distance in zip(result['ids'][0], result['documents'][0],
+                                                                  result['metadatas'][0], result['distances'][0])]
+
+    def expand(self, hits: list[dict]) -> list[Document]:
+        """
+        Expand passages, nearest first, to their parent article or neighbouring passages within the budget
+        :param hits: passages returned by `search`
+        :return: list of Document, one per parent article
+        """
+        budget, documents, parents = self.context_tokens, [], set()
+        for hit in hits:
+            metadata = hit['metadata']
+            if metadata['parent_id'] in parents:
+                continue
+            parents.add(metadata['parent_id'])
+
+            if metadata['parent_tokens'] <= budget:
+                text, tokens = self._parent(metadata['parent_id']), metadata['parent_tokens']
+            else:
+                text, tokens = self._neighbourhood(hit, budget)
+            if text is None:
+                break
+
+            budget -= tokens
+            documents.append(Document(page_content=text, metadata={
+                **self._document_metadata(metadata),
+                'distance': hit['distance']
+            }))
+        return documents
+
+    @staticmethod
+    def _document_metadata(metadata):
+        return {key: value for key, value in metadata.items()
+                if key not in PASSAGE_FIELDS and not key.startswith(ENTITY_KEY_PREFIX)}
+
+    def _parent(self, parent_id):
+        passages = self.collection.get(where={'parent_id': parent_id}, include=['documents', 'metadatas'])
+        return merge_passages([(metadata['start'], metadata['end'], text)
+                               for metadata, text in zip(passages['metadatas'], passages['documents'])])
+
+    def _neighbourhood(self, hit, budget):
+        metadata = hit['metadata']
+        if metadata['tokens'] > budget:
+            return None, 0
+
+        index = metadata['passage']
+        ids = [f"{metadata['parent_id']}:{i}" for i in range(max(0, index - self.neighbours),
+                                                             min(metadata['n_passages'], index + self.neighbours + 1))
+               if i != index]
+        found = self.collection.get(ids=ids, include=['documents', 'metadatas'])
+
+        spans, tokens = [(metadata['start'], metadata['end'], hit['text'])], metadata['tokens']
+        # closest neighbours first
+        for neighbour, text in sorted(zip(found['metadatas'], found['documents']),
+                                      key=lambda item: abs(item[0]['passage'] - index)):
+            if tokens + neighbour['tokens'] <= budget:
+                spans.append((neighbour['start'], neighbour['end'], text))
+                tokens += neighbour['tokens']
+        return merge_passages(spans), tokens
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """
+    Fuse rankings of document ids, scoring every id with the sum of 1 / (k + rank) over the rankings
+    :param rankings: lists of ids, best first
+    :param k: damping constant, higher values flatten the weight of the top ranks
+    :return: list of ids, best first
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, document_id in enumerate(ranking, start=1):
+            scores[document_id] = scores.get(document_id, 0.0) + 1 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(SmallToBigRetriever):
+    """
+    Hybrid retrieval over a chroma collection of passages or articles: dense kNN and a local BM25 index each
+    rank `candidates` documents, and the two rankings are fused with reciprocal-rank fusion into the top `k`.
+
+    The PERSON, GPE and ORG entities of the question narrow both searches to the documents mentioning one of
+    them: the dense query filters on the `entity:<name>` metadata fields and the BM25 index, which tags its
+    documents with their entities, on the tags. The filter is dropped when fewer than `k` indexed documents
+    mention the entities.
+
+    The BM25 index is built from the collection at startup. Every `refresh_interval` seconds a search checks the
+    ingest generation, and when the enrichment stored documents since, a background thread adds the new ones,
+    re-indexes the updated ones and removes the ones no longer in the collection. With `small_to_big` the fused
+    passages are reranked and expanded as in SmallToBigRetriever, otherwise the first `top_k` reranked
+    documents are returned as they are.
+    """
+
+    index: Any = None
+    query_entities: Optional[Callable[[str], list[str]]] = None
+    candidates: int = config.RETRIEVAL_CANDIDATES
+    rrf_k: int = config.RETRIEVAL_RRF_K
+    refresh_interval: float = config.RETRIEVAL_BM25_REFRESH
+    small_to_big: bool = True
+    top_k: Optional[int] = None
+    refreshed_at: float = 0.0
+    checked_at: float = 0.0
+    generation: Optional[str] = None
+    refresh_lock: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.index = self.index if self.index is not None else BM25Index()
+        self.refresh_lock = Lock()
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        hits = self.rerank(query, self.search(query))
+        if self.small_to_big:
+            return self.expand(hits)
+        return [Document(page_content=hit['text'],
+                         metadata={**self._document_metadata(hit['metadata']), 'id': hit['id']})
+                for hit in hits[:self.top_k]]
+
+    def refresh(self, page_size: int = 1000) -> int:
+        """
+        Bring the BM25 index up to date with the collection: index the documents stored since the last refresh,
+        new or updated, and remove the ones that were deleted
+        :param page_size: documents fetched from chroma at a time
+        :return: number of documents indexed
+        """
+        with self.refresh_lock:
+            try:
+                generation = latest_ingest()
+                updated = ingested_since(self.generation) if self.generation is not None else set()
+            except RedisError as e:
+                logger.warning(f"Ingest generation unavailable, only indexing new documents: {e}")
+                generation, updated = self.generation, set()
+
+            stored = set(self.collection.get(include=[])['ids'])
+            removed = [i for i in self.index.ids() if i not in stored or i in updated]
+            self.index.remove(removed)
+
+            ids = [i for i in stored if i not in self.index]
+            for start in range(0, len(ids), page_size):
+                page = self.collection.get(ids=ids[start:start + page_size], include=['documents', 'metadatas'])
+                self.index.add(page['ids'], page['documents'],
+                               [[key for key, value in (metadata or {}).items()
+                                 if key.startswith(ENTITY_KEY_PREFIX) and value] for metadata in page['metadatas']])
+            self.generation, self.refreshed_at = generation, time.monotonic()
+        if ids or removed:
+            logger.info(f"Refreshed the BM25 index: {len(ids)} documents indexed, {len(removed)} removed or updated, "
+                        f"{len(self.index)} indexed")
+        return len(ids)
+
+    def _refresh_if_stale(self):
+        if time.monotonic() - self.checked_at < self.refresh_interval:
+            return
+        self.checked_at = time.monotonic()
+        try:
+            stale = latest_ingest() != self.generation
+        except RedisError as e:
+            logger.warning(f"Ingest generation unavailable, keeping the BM25 index: {e}")
+            return
+        if stale and not self.refresh_lock.locked():
+            Thread(target=self._refresh_in_background, name='bm25-refresh', daemon=True).start()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Refreshing the BM25 index failed: {str(e)}")
+
+    def search(self, query: str) -> list[dict]:
+        """
+        Documents of the fused dense and BM25 rankings of the query
+        :param query:
+        :return: list of dicts with the id, text, metadata and distance (None when only BM25 found it) of a
+            document, best first
+        """
+        self._refresh_if_stale()
+
+        where, tags = self._entity_filter(query)
+        dense = self.collection.query(query_embeddings=[self.embeddings.embed_query(query)],
+                                      n_results=self.candidates, where=where,
+                                      include=['documents', 'metadatas', 'distances'])
+        hits = {passage_id: {'id': passage_id, 'text': text, 'metadata': metadata, 'distance': distance}
+                for passage_id, text, metadata, distance in zip(dense['ids'][0], dense['documents'][0],
+                                                                  dense['metadatas'][0], dense['distances'][0])}
+        sparse = [document_id for document_id, _ in self.index.search(query, self.candidates, tags)]
+
+        fused = reciprocal_rank_fusion([list(hits), sparse], self.rrf_k)[:self.k]
+        missing = [document_id for document_id in fused if document_id not in hits]
+        if missing:
+            found = self.collection.get(ids=missing, include=['documents', 'metadatas'])
+            for document_id, text, metadata in zip(found['ids'], found['documents'], found['metadatas']):
+                hits[document_id] = {'id': document_id, 'text': text, 'metadata': metadata, 'distance': None}
+        return [hits[document_id] for document_id in fused if document_id in hits]
+
+    def _entity_filter(self, query):
+        keys = self.query_entities(query) if self.query_entities else []
+        if not keys:
+            return None, None
+
+        if self.index.count(keys) < self.k:
+            # too few documents mention the entities, search everything
+            return None, None
+        where = {keys[0]: True} if len(keys) == 1 else {'$or': [{key: True} for key in keys]}
+        return where, keys